@@ -0,0 +1,97 @@
+# REF: stefan.mastilak@visma.com
+
+"""
+Windows cmd.exe stand-in interpreting the cmd files generated by MigrationTool, so cmd execution can be
+benchmarked on hosts without cmd.exe. Supported commands: chcp, md, mkdir, 'if not exist <path> mkdir <path>'
+and move. Output mimics cmd.exe with echo on (command line followed by its result).
+"""
+import os
+import re
+import shutil
+import subprocess
+
+_QUOTED = re.compile(r'"(.*?)"')
+
+
+def _paths(line):
+    return [os.path.normpath(i) for i in _QUOTED.findall(line)]
+
+
+def run_cmd_file(cmd_file):
+    """
+    Execute cmd file.
+    :param cmd_file: cmd file path
+    :return: cmd output
+    :rtype: str
+    """
+    out = []
+    prompt = f'{os.path.dirname(cmd_file)}>'
+    with open(cmd_file, encoding='utf-8') as commands:
+        for line in commands:
+            line = line.strip()
+            if not line:
+                continue
+            out.append(f'{prompt}{line}')
+            command = line.split(' ', 1)[0].lower()
+            paths = _paths(line)
+
+            if command == 'chcp':
+                out.append(f'Active code page: {line.split()[-1]}')
+            elif command in ('md', 'mkdir') or (command == 'if' and 'mkdir' in line):
+                if paths:
+                    os.makedirs(paths[-1], exist_ok=True)
+            elif command == 'move' and len(paths) == 2:
+                try:
+                    shutil.move(paths[0], paths[1])
+                    out.append('        1 file(s) moved.')
+                except FileNotFoundError:
+                    out.append('The system cannot find the file specified.')
+            else:
+                out.append(f"'{command}' is not recognized as an internal or external command.")
+    return '\n'.join(out) + '\n'
+
+
+class CmdPopen(object):
+    """
+    subprocess.Popen stand-in running .cmd files with run_cmd_file() (other commands are run by subprocess).
+    """
+
+    def __init__(self, args, stdout=None, stderr=None, encoding=None, **kwargs):
+        self.args = args
+        self.encoding = encoding
+        self.returncode = None
+        self.process = None
+        if not (isinstance(args, str) and args.lower().endswith('.cmd')):
+            self.process = subprocess.Popen(args, stdout=stdout, stderr=stderr, encoding=encoding, **kwargs)
+
+    def communicate(self, input=None, timeout=None):
+        if self.process:
+            result = self.process.communicate(input=input, timeout=timeout)
+            self.returncode = self.process.returncode
+            return result
+        out = run_cmd_file(self.args)
+        self.returncode = 0
+        return (out if self.encoding else out.encode('utf-8')), None
+
+    def wait(self, timeout=None):
+        if self.process:
+            return self.process.wait(timeout=timeout)
+        return self.returncode
+
+    def poll(self):
+        return self.process.poll() if self.process else self.returncode
+
+    def kill(self):
+        if self.process:
+            self.process.kill()
+
+    @property
+    def pid(self):
+        return self.process.pid if self.process else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.process:
+            self.process.__exit__(exc_type, exc_value, traceback)
@@ -0,0 +1,163 @@
+# REF: stefan.mastilak@visma.com
+
+"""
+Pentaho Carte server stand-in for benchmarks and tests of the Carte execution backend (lib/pentaho_handler.py).
+It serves the Carte servlets used by the robot (status, executeJob, jobStatus, stopJob, stopCarte) and executes
+jobs asynchronously (like Carte) in-process with the MigrationTool stand-in (bench/fake_migration_tool.py), so only the first job pays the startup.
+
+Usage (same arguments as Carte.bat, see CARTE_SCRIPT in config.py):
+    python fake_carte.py <host> <port>
+Tuning (environment variables):
+    MIG_ROOT                  MigVisma root folder (config.py - MIG_ROOT by default)
+    FAKE_CARTE_START_DELAY    server startup delay in seconds (emulates JVM and plugins start)
+    FAKE_MIGTOOL_*            job tuning and failure injection (see bench/fake_migration_tool.py)
+"""
+import base64
+import gzip
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+# script is started as a standalone process, robot root folder needs to be importable:
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config as cfg  # noqa: E402
+from bench import fake_migration_tool  # noqa: E402
+
+JOB_IDS = fake_migration_tool.JOB_IDS
+
+
+class FakeCarte(object):
+    """
+    Jobs executed by the Carte stand-in (job id >> job status).
+    """
+
+    def __init__(self, mig_root):
+        self.mig_root = mig_root
+        self.jobs = {}
+        self.stops = {}
+        self.lock = threading.Lock()
+
+    def execute(self, job_file, mig_id):
+        """
+        Start job in the background (like Carte executeJob servlet, job status is polled by jobStatus).
+        :return: (result, message, carte job id)
+        :rtype: tuple
+        """
+        name = re.split(r'[\\/]', job_file)[-1]
+        if name not in JOB_IDS:
+            return 'ERROR', f'Unable to load job {job_file}', None
+        carte_id = str(uuid.uuid4())
+        stop = threading.Event()
+        with self.lock:
+            self.jobs[carte_id] = (name[:-4], 'Running', [], 0, '')
+            self.stops[carte_id] = stop
+        threading.Thread(target=self.__run, args=(carte_id, name, mig_id, stop), daemon=True).start()
+        return 'OK', f'Job {name} started', carte_id
+
+    def __run(self, carte_id, name, mig_id, stop):
+        fail = os.environ.get('FAKE_MIGTOOL_FAIL') or None
+        status = 'Finished'
+        try:
+            lines = fake_migration_tool.run_job(mig_root=self.mig_root,
+                                                mig_id=mig_id,
+                                                job_id=JOB_IDS[name],
+                                                row_delay=float(os.environ.get('FAKE_MIGTOOL_ROW_DELAY', 0)),
+                                                fail=fail,
+                                                stop=stop)
+            errors = 1 if fail in ('error', 'crash') else 0
+            error_desc = 'Simulated Pentaho error' if errors else ''
+        except fake_migration_tool.JobStopped as err:
+            lines, errors, error_desc, status = [], 1, str(err), 'Stopped'
+        except Exception as err:
+            lines, errors, error_desc = [], 1, str(err)
+        if errors and status == 'Finished':
+            status = 'Finished (with errors)'
+        with self.lock:
+            self.jobs[carte_id] = (name[:-4], status, lines, errors, error_desc)
+
+    def stop(self, carte_id):
+        with self.lock:
+            stop = self.stops.get(carte_id)
+        if stop:
+            stop.set()
+        return stop is not None
+
+    def status(self, carte_id):
+        with self.lock:
+            return self.jobs.get(carte_id)
+
+
+def _web_result(result, message, carte_id=None):
+    return (f'<?xml version="1.0" encoding="UTF-8"?>\n<webresult><result>{result}</result>'
+            f'<message>{escape(message)}</message><id>{carte_id or ""}</id></webresult>')
+
+
+class _Handler(BaseHTTPRequestHandler):
+    carte = None
+
+    def __reply(self, body, code=200):
+        content = body.encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'text/xml')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        servlet = url.path.strip('/').split('/')[-1]
+
+        if servlet == 'status':
+            self.__reply('<?xml version="1.0" encoding="UTF-8"?>\n<serverstatus><statusdesc>Online</statusdesc>'
+                         '</serverstatus>')
+        elif servlet == 'executeJob':
+            self.__reply(_web_result(*self.carte.execute(job_file=query.get('job', ''),
+                                                         mig_id=query.get('MIG_ID', ''))))
+        elif servlet == 'jobStatus':
+            job = self.carte.status(query.get('id'))
+            if not job:
+                self.__reply(_web_result('ERROR', f'Job {query.get("name")} not found'), code=404)
+                return
+            name, status, lines, errors, error_desc = job
+            log = base64.b64encode(gzip.compress('\n'.join(lines).encode('utf-8'))).decode('ascii')
+            self.__reply(f'<?xml version="1.0" encoding="UTF-8"?>\n<jobstatus><jobname>{escape(name)}</jobname>'
+                         f'<id>{query.get("id")}</id><status_desc>{status}</status_desc>'
+                         f'<error_desc>{escape(error_desc)}</error_desc>'
+                         f'<logging_string><![CDATA[{log}]]></logging_string>'
+                         f'<result><nr_errors>{errors}</nr_errors><result>{"N" if errors else "Y"}</result></result>'
+                         f'</jobstatus>')
+        elif servlet == 'stopJob':
+            if self.carte.stop(query.get('id')):
+                self.__reply(_web_result('OK', f'Job {query.get("name")} stopped'))
+            else:
+                self.__reply(_web_result('ERROR', f'Job {query.get("name")} not found'), code=404)
+        elif servlet == 'stopCarte':
+            self.__reply(_web_result('OK', 'Shutting down'))
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        else:
+            self.__reply(_web_result('ERROR', f'Unknown servlet {servlet}'), code=404)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main(argv):
+    host, port = argv[0], int(argv[1])
+    time.sleep(float(os.environ.get('FAKE_CARTE_START_DELAY', 0)))
+    _Handler.carte = FakeCarte(mig_root=os.environ.get('MIG_ROOT', cfg.MIG_ROOT))
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.serve_forever()
+    server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,204 @@
+# REF: stefan.mastilak@visma.com
+
+"""
+Pentaho MigrationTool (Kitchen) stand-in for benchmarks and load tests.
+It reads the unpacked customer documents and creates what the real migration job creates:
+the cmd file with 'move' rows into the e-dossier target folder, SQL and BulkInsert files (PDOL, SDOL),
+Counters.csv (SDOL) and Log/MigrationTool{N}.log with Pentaho-like progress lines.
+
+Usage (same arguments as MigrationTool_Robot.bat or Kitchen, see MIG_TOOL_SCRIPT in config.py):
+    python fake_migration_tool.py <MIG_ID> <JOB_ID>
+    python fake_migration_tool.py -file:<job .kjb> -param:MIG_ID=<MIG_ID> [-level:<level>] [-logfile:<logfile>]
+Tuning (environment variables):
+    MIG_ROOT                  MigVisma root folder (config.py - MIG_ROOT by default)
+    FAKE_MIGTOOL_DELAY        job startup delay in seconds (emulates Kitchen/JVM start)
+    FAKE_MIGTOOL_ROW_DELAY    delay per migrated document in seconds
+    FAKE_MIGTOOL_FAIL         failure injection: 'error' (stderr output, exit code 1 with Kitchen arguments),
+                              'crash' (exit code 1),
+                              'missing:<N>' (N cmd rows with missing source file), 'counters' (wrong Counters.csv),
+                              'fatal' (Pentaho ERROR line in the job log, then the job hangs),
+                              'hang' (the job hangs without any output)
+"""
+import os
+import re
+import sys
+import time
+from datetime import datetime
+
+# script is started as a standalone process, robot root folder needs to be importable:
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config as cfg  # noqa: E402
+from lib.params_handler import read_parameters  # noqa: E402
+
+JOB_TYPES = {'5': 'MLM', '6': 'SDOL', '7': 'PDOL'}
+JOB_IDS = {getattr(cfg, f'MIG_JOB_{mig_type}'): job_id for job_id, mig_type in JOB_TYPES.items()}
+
+
+def _source_documents(type_dir, mig_type):
+    """
+    Get documents which are migrated by the job (relative employee folder, document path).
+    :return: list of (employee, document path) tuples
+    :rtype: list
+    """
+    documents = []
+    if mig_type == 'PDOL':
+        docs = os.path.join(type_dir, 'DOCS')
+        for entry in sorted(os.scandir(docs), key=lambda x: x.name):
+            if entry.is_file():
+                documents.append((f'E{len(documents) % 100:03d}', entry.path))
+    elif mig_type == 'SDOL':
+        docs = os.path.join(type_dir, 'DOCS')
+        for group in sorted(os.scandir(docs), key=lambda x: x.name):
+            if group.is_dir():
+                for entry in os.scandir(group.path):
+                    if entry.is_file() and not entry.name.endswith('.xml'):
+                        documents.append((group.name, entry.path))
+    elif mig_type == 'MLM':
+        for root, dirs, files in os.walk(os.path.join(type_dir, 'Bestanden')):
+            for name in sorted(files):
+                documents.append((os.path.basename(root), os.path.join(root, name)))
+    return documents
+
+
+class _JobLog(object):
+    """
+    Pentaho-like MigrationTool{N}.log writer.
+    """
+
+    def __init__(self, path, job):
+        self.path = path
+        self.job = job
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def write(self, msg, step=None):
+        with open(self.path, 'a', encoding='utf-8') as log:
+            log.write(f'{datetime.now().strftime("%Y/%m/%d %H:%M:%S")} - {step or self.job} - {msg}\n')
+
+
+class JobStopped(Exception):
+    """Job stopped by the Carte stand-in (stopJob servlet)."""
+
+
+def _sleep(seconds, stop=None):
+    if stop is None:
+        time.sleep(seconds)
+    elif stop.wait(seconds):
+        raise JobStopped('Job stopped')
+
+
+def run_job(mig_root, mig_id, job_id, delay=0.0, row_delay=0.0, fail=None, stop=None):
+    """
+    Run migration job stand-in for the customer.
+    :param mig_root: MigVisma root folder
+    :param mig_id: migration ID (customer directory name)
+    :param job_id: MigrationTool job ID (7 for PDOL, 6 for SDOL, 5 for MLM)
+    :param delay: job startup delay in seconds
+    :param row_delay: delay per migrated document in seconds
+    :param fail: failure injection mode (see module docstring)
+    :param stop: threading.Event stopping the job (JobStopped is raised)
+    :return: Kitchen-like stdout lines
+    :rtype: list
+    """
+    mig_type = JOB_TYPES[str(job_id)]
+    job = getattr(cfg, f'MIG_JOB_{mig_type}')[:-4]
+    type_dir = os.path.join(mig_root, mig_id, mig_type)
+    log = _JobLog(os.path.join(mig_root, mig_id, 'Log', getattr(cfg, f'MIG_LOG_{mig_type}')), job)
+    log.write(f'Start of job execution (MIG_ID={mig_id})')
+    _sleep(delay, stop)
+
+    params = read_parameters(os.path.join(type_dir, f'{mig_type}_parameters.xlsx'))
+    target = os.path.normpath(params.target_path)
+    documents = _source_documents(type_dir, mig_type)
+    log.write(f'Finished reading index (I={len(documents)}, O=0, R=0, W={len(documents)}, U=0, E=0)',
+              step='Read index.0')
+    if fail == 'fatal':
+        log.write('ERROR (version 9.1.0.0-324, build 9.1.0.0-324 from 2020-09-07) : '
+                  'java.lang.OutOfMemoryError: Java heap space', step='Write cmd.0')
+        _sleep(3600, stop)
+    if fail == 'hang':
+        _sleep(3600, stop)
+
+    missing = int(fail.split(':')[1]) if fail and fail.startswith('missing:') else 0
+    for idx in range(missing):
+        documents.append(('E999', os.path.join(type_dir, 'DOCS', f'missing_{idx:04d}.pdf')))
+
+    os.makedirs(target, exist_ok=True)
+    if mig_type in ('PDOL', 'SDOL'):
+        # SQL and BulkInsert files are created by the job inside the e-dossier folder:
+        with open(os.path.join(target, f'{mig_id}_{mig_type}.sql'), 'w') as sql:
+            sql.write(f'-- {len(documents)} documents\n')
+        with open(os.path.join(target, f'{mig_id}_BulkInsert.txt'), 'w') as bulk:
+            bulk.writelines(f'{os.path.basename(i[1])}\n' for i in documents)
+    if mig_type == 'SDOL':
+        with open(os.path.join(type_dir, 'Counters.csv'), 'w') as counters:
+            migrated = len(documents) + 1 if fail == 'counters' else len(documents)
+            counters.write(f'SDOL_Migrated_TotalFiles;{migrated}\n')
+
+    with open(os.path.join(type_dir, f'{mig_id}_{mig_type}.cmd'), 'w', encoding='utf-8') as cmd:
+        if mig_type == 'SDOL':
+            cmd.write(f'md "{target}" 2>nul\n')
+        else:
+            cmd.write(f'if not exist "{target}" mkdir "{target}"\n')
+        created = set()
+        for row, (employee, document) in enumerate(documents, start=1):
+            employee_dir = os.path.join(target, employee)
+            if employee_dir not in created:
+                cmd.write(f'if not exist "{employee_dir}" mkdir "{employee_dir}"\n')
+                created.add(employee_dir)
+            cmd.write(f'move "{document}" "{os.path.join(employee_dir, os.path.basename(document))}"\n')
+            if row_delay or stop:
+                _sleep(row_delay, stop)
+            if row % 1000 == 0:
+                log.write(f'linenr {row}', step='Write cmd.0')
+
+    log.write(f'Finished processing (I=0, O={len(documents)}, R={len(documents)}, W={len(documents)}, U=0, E=0)',
+              step='Write cmd.0')
+    log.write('Job execution finished')
+    stamp = datetime.now().strftime('%Y/%m/%d %H:%M:%S')
+    return [f'{stamp} - Kitchen - Start of run.',
+            f'{stamp} - {job} - Start of job execution',
+            f'{stamp} - {job} - {len(documents)} documents prepared for migration',
+            f'{stamp} - {job} - Job execution finished',
+            f'{stamp} - Kitchen - Finished!']
+
+
+def _kitchen_args(argv):
+    """
+    Get MIG_ID and JOB_ID from Kitchen arguments (-file:<job>, -param:MIG_ID=<id>).
+    :return: (MIG_ID, JOB_ID) or None if argv are batch script arguments
+    :rtype: tuple
+    """
+    options = dict(arg[1:].split(':', 1) for arg in argv if arg.startswith('-') and ':' in arg)
+    if 'file' not in options:
+        return None
+    params = dict(arg[len('-param:'):].split('=', 1) for arg in argv if arg.startswith('-param:'))
+    return params.get('MIG_ID'), JOB_IDS[re.split(r'[\\/]', options['file'])[-1]]
+
+
+def main(argv):
+    kitchen = _kitchen_args(argv)
+    mig_id, job_id = kitchen or (argv[0], argv[1])
+    fail = os.environ.get('FAKE_MIGTOOL_FAIL') or None
+    print(f'Start migration {mig_id} type {job_id}')
+    lines = run_job(mig_root=os.environ.get('MIG_ROOT', cfg.MIG_ROOT),
+                    mig_id=mig_id,
+                    job_id=job_id,
+                    delay=float(os.environ.get('FAKE_MIGTOOL_DELAY', 0)),
+                    row_delay=float(os.environ.get('FAKE_MIGTOOL_ROW_DELAY', 0)),
+                    fail=fail)
+    print('\n'.join(lines))
+    print(f'Finished migration {mig_id} type {job_id}')
+
+    if fail == 'error':
+        sys.stderr.write('ERROR: Simulated Pentaho error\n')
+        if kitchen:
+            return 1
+    if fail == 'crash':
+        sys.stderr.write('ERROR: Simulated Kitchen crash\n')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,186 @@
+# REF: stefan.mastilak@visma.com
+
+"""
+Synthetic MigVisma customer folder generator for PDOL, SDOL and MLM benchmarks.
+Generated customer folder contains everything the robot expects before the migration:
+config.properties, MigVisma_parameters.xlsx, <TYPE>/PW.txt, <TYPE>/<TYPE>_parameters.xlsx and password protected
+archives (SFX archive for PDOL/SDOL, split archive for MLM) with documents and index.xml files.
+"""
+import os
+import shutil
+import tempfile
+from lib.lazy_import import lazy_import
+
+openpyxl = lazy_import('openpyxl')
+py7zr = lazy_import('py7zr')
+
+# archive names used by the robot to find customer archives (lib/zip_handler.py):
+ARCHIVE_NAMES = {'PDOL': 'ExportPersonnelFile.exe', 'SDOL': 'ExportPayrollFile.exe', 'MLM': 'ExportMedicalLeave.zip'}
+
+
+def target_path(mig_root, customer, mig_type):
+    """
+    Get e-dossier migration target path of the generated customer (stored in <TYPE>_parameters.xlsx).
+    :return: target folder path
+    :rtype: str
+    """
+    return os.path.join(mig_root, customer, mig_type, 'Edossier', 'Elektronisch Dossier')
+
+
+def _write_xlsx(path, header, rows):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(header)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+
+
+def _write_documents(folder, count, file_size, prefix):
+    """
+    Write synthetic documents and index.xml describing them.
+    :return: list of document names
+    :rtype: list
+    """
+    os.makedirs(folder, exist_ok=True)
+    content = (os.urandom(min(file_size, 4096)) * (file_size // 4096 + 1))[:file_size]
+    names = []
+    for i in range(count):
+        name = f'{prefix}_{i:07d}.pdf'
+        with open(os.path.join(folder, name), 'wb') as document:
+            document.write(content)
+        names.append(name)
+    with open(os.path.join(folder, 'index.xml'), 'w', encoding='utf-8') as index:
+        index.write('<?xml version="1.0" encoding="utf-8"?>\n<documents>\n')
+        for i, name in enumerate(names):
+            index.write(f'  <document employee="{prefix}{i % 100:03d}" file="{name}"/>\n')
+        index.write('</documents>\n')
+    return names
+
+
+def _make_archive(source, archive, password):
+    """
+    Create password protected 7z archive (with encrypted header) from the source folder content.
+    :param source: folder to be archived
+    :param archive: archive path
+    :param password: archive password
+    :return: archive path
+    """
+    with py7zr.SevenZipFile(archive, 'w', password=password, header_encryption=True) as seven_zip:
+        for name in sorted(os.listdir(source)):
+            seven_zip.writeall(os.path.join(source, name), arcname=name)
+    return archive
+
+
+def _make_split_archive(source, archive_name, folder, password, volume_size):
+    """
+    Create password protected split archive (<archive_name>.001, .002, ...) from the source folder content.
+    :return: list of volume paths
+    :rtype: list
+    """
+    whole = _make_archive(source, os.path.join(folder, f'{archive_name}.tmp'), password)
+    volumes = []
+    with open(whole, 'rb') as data:
+        index = 1
+        while True:
+            chunk = data.read(volume_size)
+            if not chunk:
+                break
+            volume = os.path.join(folder, f'{archive_name}.{index:03d}')
+            with open(volume, 'wb') as volume_file:
+                volume_file.write(chunk)
+            volumes.append(volume)
+            index += 1
+    os.remove(whole)
+    return volumes
+
+
+def _make_sfx(archive, sfx_path, seven_zip_dir):
+    """
+    Create 7-Zip SFX exe file (SFX module + archive) if 7-Zip SFX module is available, otherwise plain 7z archive
+    with exe name is created (7z extracts SFX exe files as regular archives, see bench/stand_ins.py).
+    :return: sfx path
+    """
+    sfx_module = os.path.join(seven_zip_dir, '7zCon.sfx') if seven_zip_dir else ''
+    with open(sfx_path, 'wb') as sfx:
+        if os.path.isfile(sfx_module):
+            with open(sfx_module, 'rb') as module:
+                shutil.copyfileobj(module, sfx)
+        with open(archive, 'rb') as data:
+            shutil.copyfileobj(data, sfx)
+    os.remove(archive)
+    return sfx_path
+
+
+def generate_customer(mig_root, customer, mig_type, files, file_size=2048, groups=10, password='bench',
+                      volume_size=64 * 1024 * 1024, seven_zip_dir=None):
+    """
+    Generate synthetic customer folder for the migration type.
+    :param mig_root: MigVisma root folder
+    :param customer: customer folder name (used as CustomerID)
+    :param mig_type: migration type (PDOL, SDOL, MLM)
+    :param files: number of documents
+    :param file_size: size of every document in bytes
+    :param groups: number of inner zip files (SDOL) or employee folders (MLM)
+    :param password: archive password (stored in PW.txt)
+    :param volume_size: size of split archive volumes (MLM)
+    :param seven_zip_dir: 7-Zip installation folder (used for SFX module)
+    :return: customer folder path
+    :rtype: str
+    """
+    customer_dir = os.path.join(mig_root, customer)
+    type_dir = os.path.join(customer_dir, mig_type)
+    os.makedirs(type_dir)
+
+    # customer files needed by robot checks:
+    with open(os.path.join(customer_dir, 'config.properties'), 'w') as props:
+        props.write(f'MIG_ID={customer}\n')
+    _write_xlsx(os.path.join(customer_dir, 'MigVisma_parameters.xlsx'), ['CustomerID', 'Name'],
+                [[customer, f'Benchmark customer {customer}']])
+    _write_xlsx(os.path.join(type_dir, f'{mig_type}_parameters.xlsx'), ['CustomerID', 'TargetPath'],
+                [[customer, target_path(mig_root, customer, mig_type)]])
+    with open(os.path.join(type_dir, 'PW.txt'), 'w') as pwd:
+        pwd.write(password)
+
+    staging = tempfile.mkdtemp(prefix=f'{customer}_', dir=mig_root)
+    try:
+        if mig_type == 'PDOL':
+            # flat documents + one index.xml in the archive root:
+            _write_documents(staging, files, file_size, prefix='P')
+            archive = _make_archive(staging, os.path.join(type_dir, 'export.7z'), password)
+            _make_sfx(archive, os.path.join(type_dir, f'{customer}_{ARCHIVE_NAMES[mig_type]}'), seven_zip_dir)
+
+        elif mig_type == 'SDOL':
+            # inner zip files, each with documents and one index.xml:
+            import zipfile
+            per_group = max(files // groups, 1)
+            for group in range(groups):
+                count = per_group if group < groups - 1 else files - per_group * (groups - 1)
+                group_dir = os.path.join(staging, f'.group_{group:04d}')
+                _write_documents(group_dir, max(count, 0), file_size, prefix=f'S{group:04d}')
+                with zipfile.ZipFile(os.path.join(staging, f'Employees_{group:04d}.zip'), 'w') as inner:
+                    for name in os.listdir(group_dir):
+                        inner.write(os.path.join(group_dir, name), arcname=name)
+                shutil.rmtree(group_dir)
+            archive = _make_archive(staging, os.path.join(type_dir, 'export.7z'), password)
+            _make_sfx(archive, os.path.join(type_dir, f'{customer}_{ARCHIVE_NAMES[mig_type]}'), seven_zip_dir)
+
+        elif mig_type == 'MLM':
+            # Export/Bestanden/<employee>/<documents> + Export/index.xml, packed as split archive:
+            export = os.path.join(staging, 'Export')
+            per_group = max(files // groups, 1)
+            for group in range(groups):
+                count = per_group if group < groups - 1 else files - per_group * (groups - 1)
+                _write_documents(os.path.join(export, 'Bestanden', f'E{group:04d}'), max(count, 0), file_size,
+                                 prefix=f'M{group:04d}')
+                os.remove(os.path.join(export, 'Bestanden', f'E{group:04d}', 'index.xml'))
+            with open(os.path.join(export, 'index.xml'), 'w', encoding='utf-8') as index:
+                index.write(f'<?xml version="1.0" encoding="utf-8"?>\n<export documents="{files}"/>\n')
+            _make_split_archive(staging, ARCHIVE_NAMES[mig_type], type_dir, password, volume_size)
+
+        else:
+            raise NotImplementedError(f' Unsupported migration type: {mig_type}')
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    return customer_dir
@@ -0,0 +1,107 @@
+# REF: stefan.mastilak@visma.com
+
+"""
+Robot startup benchmark based on 'python -X importtime'.
+Guards the common "no unprocessed folders" path: every main script is executed against the benchmark stand-ins
+(bench/stand_ins.py) with empty MIG_ROOT folder, the whole run must stay under STARTUP_TARGET_SECONDS (config.py)
+and heavy dependencies must not be imported before they are used.
+Usage: python -m bench.import_time
+"""
+import config as cfg
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# heavy dependencies which must be imported lazily (lib/lazy_import.py):
+LAZY_MODULES = ['pandas', 'google.cloud.bigquery', 'grpc', 'slack', 'pysftp', 'paramiko', 'openpyxl']
+
+# main scripts of the robot:
+MAIN_SCRIPTS = ['main_pdol.py', 'main_sdol.py', 'main_mlm.py']
+
+# code executed in new interpreter - robot run from its start until it finds out there is nothing to migrate:
+STARTUP_CODE = ('import time; start = time.perf_counter(); '
+                'from bench.import_time import run_idle; run_idle(script={script!r}, bench_root={root!r}, start=start)')
+
+
+def run_idle(script, bench_root, start):
+    """
+    Execute main script against the benchmark stand-ins with no unprocessed folders and print the run duration.
+    :param script: main script file name
+    :param bench_root: benchmark root folder (empty MIG_ROOT folder is created inside)
+    :param start: perf_counter value at the interpreter start
+    :return: None
+    """
+    import runpy
+    from bench.stand_ins import FakeNotifier, install
+    from lib import credentials_handler, slack_handler
+
+    script = os.path.join(cfg.ROOT_DIR, script)
+    install(bench_root=bench_root)
+
+    # all credentials items required at the robot start:
+    creds_path = os.path.join(cfg.ROOT_DIR, cfg.CREDENTIALS)
+    items = (cfg.SLACK_PROD_CREDS, cfg.SLACK_TEST_CREDS, cfg.SFTP_CREDS, cfg.GCP_SECRET)
+    with open(creds_path, 'w', encoding='utf-8') as creds_file:
+        json.dump({i: {'url': '', 'notes': ''} for i in items}, creds_file)
+    credentials_handler._STORE = credentials_handler.CredentialsStore(file_path=creds_path)
+    slack_handler.SlackNotifier = lambda logger: FakeNotifier()
+
+    sys.argv = [script]
+    runpy.run_path(script, run_name='__main__')
+    print(json.dumps({'duration': time.perf_counter() - start}))
+
+
+def measure_imports(code):
+    """
+    Run the code in new interpreter with -X importtime and parse its report.
+    :param code: python code to measure (it prints JSON with 'duration' of the run as the last line of output)
+    :return: (dict {module name: cumulative import time in microseconds}, top level import time in seconds,
+              run duration in seconds)
+    :rtype: tuple
+    """
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=cfg.ROOT_DIR, encoding='utf-8')
+    if process.returncode:
+        raise RuntimeError(f' Run failed: {process.stderr.splitlines()[-1] if process.stderr else ""}')
+
+    modules = {}
+    total = 0
+    for line in process.stderr.splitlines():
+        # line format: "import time:   self [us] |  cumulative | imported package" (nested imports are indented)
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative)
+        if not name[1:].startswith(' '):
+            total += int(cumulative)
+    duration = json.loads(process.stdout.splitlines()[-1])['duration']
+    return modules, total / 1e6, duration
+
+
+def check_startup(target=cfg.STARTUP_TARGET_SECONDS):
+    """
+    Check robot run without unprocessed folders (duration and eagerly imported heavy dependencies) of all main scripts.
+    :param target: maximum allowed run duration in seconds
+    :return: True if all runs are within the target and no heavy dependency is imported eagerly
+    :rtype: bool
+    """
+    success = True
+    for script in MAIN_SCRIPTS:
+        with tempfile.TemporaryDirectory() as root:
+            modules, total, duration = measure_imports(code=STARTUP_CODE.format(script=script, root=root))
+        eager = [i for i in LAZY_MODULES if i in modules]
+
+        print(f'{script}: run {duration:.3f}s (target {target}s), imports {total:.3f}s')
+        for name, us in sorted(modules.items(), key=lambda x: -x[1])[:15]:
+            print(f'  {us / 1e3:10.1f} ms  {name}')
+        if eager:
+            print(f'Heavy modules imported eagerly: {", ".join(eager)}')
+        success = success and duration <= target and not eager
+    return success
+
+
+if __name__ == '__main__':
+    sys.exit(0 if check_startup() else 1)
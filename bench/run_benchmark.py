@@ -0,0 +1,131 @@
+# REF: stefan.mastilak@visma.com
+
+"""
+End-to-end migration benchmark on synthetic customer folders.
+Generates PDOL, SDOL and MLM customer folders (bench/generator.py), runs the migration classes against them
+with stand-ins for Kitchen/Carte, SFTP, BigQuery and Slack (bench/stand_ins.py) and reports per-stage timings.
+Usage: python -m bench.run_benchmark --types PDOL SDOL MLM --customers 1 --files 1000 [--backend carte]
+"""
+import argparse
+import config as cfg
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from bench import generator, stand_ins
+from lib import scheduler_handler as scheduler
+from lib.kpi_handler import Kpi
+from lib.timing_handler import log_timings_summary, reset_timings
+from lib.watchdog_handler import set_watchdog_context
+from lib.zip_handler import get_archives_size
+
+MIGRATIONS = {'PDOL': ('mig.pdol_migration', 'PdolMigration'),
+              'SDOL': ('mig.sdol_migration', 'SdolMigration'),
+              'MLM': ('mig.mlm_migration', 'MlmMigration')}
+
+
+def _migration_class(mig_type):
+    module, name = MIGRATIONS[mig_type]
+    return getattr(__import__(module, fromlist=[name]), name)
+
+
+def run_customers(mig_type, customers, kpi, notifier, workers=1):
+    """
+    Run migration of the customers the same way the main scripts do.
+    :return: list of (customer, outcome, duration) tuples
+    :rtype: list
+    """
+    results = []
+
+    def migrate(index):
+        customer = customers[index]
+        mig_start_time = datetime.now()
+        start = time.perf_counter()
+        set_watchdog_context(archive_bytes=get_archives_size(customer_dir=customer, mig_type=mig_type))
+        current = _migration_class(mig_type)(customer_dir=customer)
+        try:
+            outcome = 'SUCCESS' if current.run_migration(sftp_prod=False) else 'BUSINESS EXCEPTION'
+        except Exception as error:
+            logging.critical(f' Exception while processing {customer}: {error}')
+            outcome = 'APPLICATION EXCEPTION'
+        if outcome == 'SUCCESS':
+            current.rename_if_success_migration()
+        else:
+            current.rename_if_failed_migration()
+        duration = time.perf_counter() - start
+        kpi.insert(start=mig_start_time, end=datetime.now(), inp=mig_type, out=f'CustomerID: {customer}',
+                   status='DONE', mark=outcome, db_prod=False)
+        notifier.upload_message(msg=f'*{mig_type} migration:* `{customer}: {outcome}`')
+        results.append((customer, outcome, duration))
+
+    scheduler.run_customers(migrate=migrate, customers=customers, workers=workers)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Migration robot end-to-end benchmark')
+    parser.add_argument('--types', nargs='+', default=['PDOL', 'SDOL', 'MLM'], choices=sorted(MIGRATIONS))
+    parser.add_argument('--customers', type=int, default=1, help='customers per migration type')
+    parser.add_argument('--files', type=int, default=1000, help='documents per customer (1k - 1M)')
+    parser.add_argument('--file-size', type=int, default=2048, help='document size in bytes')
+    parser.add_argument('--groups', type=int, default=10, help='inner zips (SDOL) / employee folders (MLM)')
+    parser.add_argument('--root', default=None, help='benchmark folder (temporary folder by default)')
+    parser.add_argument('--keep', action='store_true', help='keep generated files after the benchmark')
+    parser.add_argument('--backend', default='kitchen', choices=['kitchen', 'carte'],
+                        help='migration job execution backend (config.py - MIG_BACKEND)')
+    parser.add_argument('--launcher', default='native', choices=['native', 'batch'],
+                        help='MigrationTool launcher of the kitchen backend (config.py - KITCHEN_LAUNCHER)')
+    parser.add_argument('--workers', type=int, default=1, help='customers migrated concurrently')
+    args = parser.parse_args(argv)
+
+    bench_root = args.root or tempfile.mkdtemp(prefix='MigVisma_bench_')
+    os.makedirs(bench_root, exist_ok=True)
+    logging.basicConfig(filename=os.path.join(bench_root, 'bench.log'), filemode='w', level=logging.INFO,
+                        force=True)
+    mig_root = stand_ins.install(bench_root, carte=args.backend == 'carte')
+    cfg.KITCHEN_LAUNCHER = args.launcher
+    report = {'files': args.files, 'customers': args.customers, 'backend': args.backend, 'launcher': args.launcher,
+              'workers': args.workers, 'types': {}}
+
+    try:
+        kpi = Kpi()
+        notifier = stand_ins.FakeNotifier()
+        for mig_type in args.types:
+            customers = [f'BENCH{mig_type}{i:03d}' for i in range(args.customers)]
+            generate_start = time.perf_counter()
+            for customer in customers:
+                generator.generate_customer(mig_root, customer, mig_type, files=args.files,
+                                            file_size=args.file_size, groups=args.groups,
+                                            seven_zip_dir=cfg.SEVEN_ZIP_PATH)
+            generated = time.perf_counter() - generate_start
+
+            reset_timings(mig_type=mig_type)
+            results = run_customers(mig_type, customers, kpi, notifier, workers=args.workers)
+            stages = log_timings_summary(mig_type=mig_type)
+            report['types'][mig_type] = {'generated': round(generated, 3), 'results': results, 'stages': stages}
+
+            print(f'\n{mig_type}: {args.customers} customer(s) x {args.files} files '
+                  f'(generated in {generated:.1f}s)')
+            for customer, outcome, duration in results:
+                print(f'  {customer:<20} {outcome:<22} {duration:9.2f}s')
+            for name, stage in sorted(stages.items(), key=lambda x: -x[1]['wall']):
+                print(f'  {name:<30} total {stage["wall"]:9.2f}s  mean {stage["wall"] / stage["count"]:8.2f}s  '
+                      f'cpu {stage["cpu"]:8.2f}s  failed {stage["failed"]}')
+        kpi.flush(timeout=10)
+    finally:
+        with open(os.path.join(bench_root, 'bench_results.json'), 'w') as results_file:
+            json.dump(report, results_file, indent=2)
+        print(f'\nResults: {os.path.join(bench_root, "bench_results.json")}')
+        if not args.keep and not args.root:
+            shutil.rmtree(bench_root, ignore_errors=True)
+
+    failed = [r for t in report['types'].values() for r in t['results'] if r[1] != 'SUCCESS']
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
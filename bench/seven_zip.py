@@ -0,0 +1,89 @@
+# REF: stefan.mastilak@visma.com
+
+"""
+Minimal 7-Zip command line stand-in (py7zr based) for running benchmarks on hosts without 7-Zip.
+Supported commands (as used by lib/zip_handler.py):
+    7z x <archive> -y -r -p<password> -o<output dir>   (split archives: <archive>.001)
+    7z a <archive>.7z <folder> -p<password> -mhe=on
+    7z l <archive> -slt -p<password>                      (technical listing, used by lib/disk_handler.py)
+"""
+import os
+import shutil
+import sys
+import tempfile
+import py7zr
+
+
+def _join_volumes(first_volume):
+    """
+    Join split archive volumes (.001, .002, ...) into one temporary archive.
+    :return: joined archive path
+    """
+    base = first_volume[:-4]
+    joined = tempfile.NamedTemporaryFile(suffix='.7z', delete=False)
+    index = 1
+    with joined:
+        while os.path.isfile(f'{base}.{index:03d}'):
+            with open(f'{base}.{index:03d}', 'rb') as volume:
+                shutil.copyfileobj(volume, joined)
+            index += 1
+    return joined.name
+
+
+def extract(archive, out_dir, password):
+    joined = _join_volumes(archive) if archive.endswith('.001') else None
+    try:
+        with py7zr.SevenZipFile(joined or archive, 'r', password=password) as seven_zip:
+            seven_zip.extractall(path=out_dir)
+    finally:
+        if joined:
+            os.remove(joined)
+
+
+def list_technical(archive, password):
+    joined = _join_volumes(archive) if archive.endswith('.001') else None
+    try:
+        with py7zr.SevenZipFile(joined or archive, 'r', password=password) as seven_zip:
+            entries = seven_zip.list()
+    finally:
+        if joined:
+            os.remove(joined)
+    lines = [f'Path = {archive}', 'Type = 7z', f'Physical Size = {os.path.getsize(archive)}', '', '----------']
+    for entry in entries:
+        lines += [f'Path = {entry.filename}', f'Folder = {"+" if entry.is_directory else "-"}',
+                  f'Size = {entry.uncompressed}', '']
+    sys.stdout.write('\n'.join(lines) + '\n')
+
+
+def add(archive, folder, password):
+    with py7zr.SevenZipFile(archive, 'w', password=password, header_encryption=True) as seven_zip:
+        seven_zip.writeall(folder, arcname=os.path.basename(folder))
+
+
+def main(argv):
+    command, archive = argv[0], argv[1]
+    options = [i for i in argv[2:] if i.startswith('-')]
+    operands = [i for i in argv[2:] if not i.startswith('-')]
+    password = next((i[2:] for i in options if i.startswith('-p')), None)
+    out_dir = next((i[2:] for i in options if i.startswith('-o')), os.getcwd())
+
+    try:
+        if command == 'x':
+            extract(archive=archive, out_dir=out_dir, password=password)
+        elif command == 'a':
+            add(archive=archive, folder=operands[0], password=password)
+        elif command == 'l':
+            list_technical(archive=archive, password=password)
+            return 0
+        else:
+            sys.stderr.write(f'Unsupported command: {command}\n')
+            return 7
+    except Exception as err:
+        sys.stderr.write(f'ERROR: {archive}: {err}\n')
+        return 2
+    sys.stdout.write('Everything is Ok\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,142 @@
+# REF: stefan.mastilak@visma.com
+
+"""
+Stand-ins for external systems used by the robot (Kitchen, Carte, 7-Zip, cmd.exe, SFTP, BigQuery, Slack),
+so the migration classes can be benchmarked outside of the production server.
+"""
+import config as cfg
+import logging
+import os
+import shutil
+import socket
+import stat
+import subprocess
+import sys
+import types
+from bench.cmd_shell import CmdPopen
+from lib import base_actions
+from lib.zip_handler import Zipper
+
+_BENCH_DIR = os.path.dirname(os.path.abspath(__file__))  # stand-in scripts are executed as separate processes
+
+
+class FakeSftpHandle(object):
+    """
+    SftpHandle stand-in storing uploaded files in local folder (config.py - SFTP_DIR inside benchmark root).
+    """
+    ROOT = None
+
+    def __init__(self):
+        self.root = FakeSftpHandle.ROOT
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def __local(self, remote_path):
+        return os.path.join(self.root, *[i for i in remote_path.split('/') if i])
+
+    def ls_dir(self, remote_path):
+        return os.listdir(self.__local(remote_path))
+
+    def mk_dir(self, remote_path, mode=777):
+        if os.path.exists(self.__local(remote_path)):
+            raise AssertionError(f' Remote dir {remote_path} already exists')
+        os.makedirs(self.__local(remote_path))
+
+    def upload(self, local_path, remote_path):
+        shutil.copyfile(local_path, self.__local(remote_path))
+        return True
+
+
+class FakeNotifier(object):
+    """
+    SlackNotifier stand-in collecting notifications in memory.
+    """
+
+    def __init__(self):
+        self.messages = []
+        self.files = []
+
+    def upload_message(self, msg):
+        self.messages.append(msg)
+        return True
+
+    def upload_file(self, filepath):
+        self.files.append(filepath)
+        return True
+
+    def close(self, timeout=None):
+        return True
+
+
+def _run_sfx_with_7z(self, sfx_path, out_dir, pwd, check_progress):
+    """Zipper.__run_sfx stand-in: SFX exe files can't be executed outside Windows, 7z extracts them instead."""
+    return self._Zipper__run_7zip_file(file_path=sfx_path, out_dir=out_dir, pwd=pwd, check_progress=check_progress)
+
+
+def _install_seven_zip(bin_dir):
+    """
+    Create '7z' launcher of the py7zr based 7-Zip stand-in (bench/seven_zip.py).
+    :return: folder with the launcher
+    """
+    os.makedirs(bin_dir, exist_ok=True)
+    launcher = os.path.join(bin_dir, '7z')
+    with open(launcher, 'w') as script:
+        script.write(f'#!/bin/sh\nPYTHONPATH="{cfg.ROOT_DIR}" exec "{sys.executable}" -m bench.seven_zip "$@"\n')
+    os.chmod(launcher, os.stat(launcher).st_mode | stat.S_IEXEC | stat.S_IXGRP | stat.S_IXOTH)
+    return bin_dir
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+def install(bench_root, kitchen=True, carte=False):
+    """
+    Point the robot configuration to the benchmark root folder and install stand-ins.
+    :param bench_root: benchmark root folder
+    :param kitchen: True to replace Kitchen/MigrationTool with the MigrationTool stand-in script
+    :param carte: True to execute migration jobs on the Carte stand-in (bench/fake_carte.py)
+    :return: MigVisma root folder of the benchmark
+    :rtype: str
+    """
+    repo_root = cfg.ROOT_DIR
+    mig_root = os.path.join(bench_root, 'MigVisma')
+    work_dir = os.path.join(bench_root, 'robot')
+    pentaho_dir = os.path.join(bench_root, 'pentaho')
+    for folder in (mig_root, work_dir, pentaho_dir):
+        os.makedirs(folder, exist_ok=True)
+    open(os.path.join(pentaho_dir, 'Kitchen.bat'), 'a').close()
+
+    cfg.MIG_ROOT = mig_root
+    cfg.PENTAHO_DIR = pentaho_dir
+    cfg.KPI_BACKEND = 'local'
+    FakeSftpHandle.ROOT = os.path.join(bench_root, 'sftp')
+    os.makedirs(os.path.join(FakeSftpHandle.ROOT, cfg.SFTP_TEST_DIR), exist_ok=True)
+    base_actions.SftpHandle = FakeSftpHandle
+
+    if kitchen:
+        cfg.MIG_TOOL_SCRIPT = os.path.join(_BENCH_DIR, 'fake_migration_tool.py')
+    if carte:
+        cfg.MIG_BACKEND = 'carte'
+        cfg.CARTE_SCRIPT = os.path.join(_BENCH_DIR, 'fake_carte.py')
+        cfg.CARTE_PORT = _free_port()
+        cfg.CARTE_POLL_INTERVAL = 0.1
+
+    if os.name != 'nt':
+        # no SFX exe, cmd.exe or (possibly) 7-Zip outside Windows:
+        Zipper._Zipper__run_sfx = _run_sfx_with_7z
+        base_actions.subprocess = types.SimpleNamespace(Popen=CmdPopen, PIPE=subprocess.PIPE,
+                                                        STDOUT=subprocess.STDOUT)
+        if not shutil.which('7z', path=cfg.SEVEN_ZIP_PATH):
+            cfg.SEVEN_ZIP_PATH = _install_seven_zip(os.path.join(bench_root, 'bin'))
+
+    # robot state files (timings, spool, health) are kept in the benchmark folder:
+    cfg.ROOT_DIR = work_dir
+    logging.info(msg=f' Benchmark stand-ins installed (robot root {repo_root} >> {work_dir})')
+    return mig_root
@@ -13,6 +13,26 @@ PDOL_LOGFILE = 'robot_log_pdol.log'
 SDOL_LOGFILE = 'robot_log_sdol.log'
 MLM_LOGFILE = 'robot_log_mlm.log'
 
+# STRUCTURED LOGS (formatted with migration type):
+LOG_JSON_FILE = 'robot_log_{}.jsonl'  # JSON lines with customer_dir, mig_type and stage of every record
+LOG_CUSTOMER_DIR = 'robot_logs_{}'  # per-customer logfiles folder
+LOG_CUSTOMER_MAX_OPEN = 8  # maximum number of open per-customer logfiles
+
+# STAGE TIMINGS (JSON lines, formatted with migration type):
+TIMINGS_FILE = 'robot_timings_{}.jsonl'
+
+# PROFILING (main scripts --profile switch, folder name formatted with migration type):
+PROFILE_DIR = 'robot_profile_{}'
+PROFILE_TOP = 25  # number of hotspots and allocations in profile summaries
+PROFILE_TRACE_FRAMES = 5  # tracemalloc traceback depth
+
+# METRICS (Prometheus textfile and JSON snapshot, formatted with migration type):
+METRICS_PROM_FILE = 'robot_metrics_{}.prom'
+METRICS_JSON_FILE = 'robot_metrics_{}.json'
+METRICS_DIR = None  # node_exporter textfile collector folder for the .prom file, robot root folder if None
+METRICS_INTERVAL = 300  # snapshot interval during long runs in seconds
+METRICS_BUCKETS = (1, 5, 15, 30, 60, 300, 900, 1800, 3600, 7200)  # stage duration histogram buckets in seconds
+
 # DELIMITER:
 DELIMITER = '#'*100
 
@@ -26,11 +46,47 @@ TABLE_TEST = 'prod-amkpi-cm.transaction_items_kpi.TEST_TRANSACTION_ITEMS'
 TABLE_PROD = 'prod-amkpi-cm.transaction_items_kpi.TRANSACTION_ITEMS'
 TABLE_MONITORING = 'prod-amkpi-cm.automate_monitoring.monitoring'
 SCOPE = 'https://www.googleapis.com/auth/cloud-platform'
+KPI_BATCH_SIZE = 50  # KPI/monitoring rows streamed to BigQuery in one request
+KPI_BACKEND = 'bigquery'  # 'bigquery' or 'local' (local BigQuery stand-in for tests and benchmarks)
+
+# KPI SPOOL:
+SPOOL_FILE = 'kpi_spool.sqlite'  # durable local spool of KPI and monitoring events
+SPOOL_FLUSH_INTERVAL = 5  # seconds between background flushes
+SPOOL_MAX_BACKOFF = 60  # maximum seconds between retries when BigQuery is unreachable
+SPOOL_DRAIN_TIMEOUT = 60  # maximum seconds to wait for the spool to be shipped at the end of the run
+SPOOL_MAX_ATTEMPTS = 5  # rejections by BigQuery before the event is moved to the dead_events table
+
+# MIGRATION HISTORY (duration estimates):
+HISTORY_FILE = 'robot_history.sqlite'  # local history of customer migrations
+HISTORY_SAMPLES = 50  # number of latest migrations used for duration estimates
+HISTORY_MIN_SAMPLES = 5  # minimum samples for fitting duration on archive size and documents count
+HISTORY_SHORTEST_FIRST = True  # process customers with the shortest estimated duration first
+
+# ROBOT SCHEDULE (mig-robot-pipeline Jenkins job, used for batch duration warnings):
+SCHEDULE_DAYS = (0, 1, 2, 3, 4)  # Monday to Friday
+SCHEDULE_TIMES = ('07:00', '17:00')
+
+# MONITORING HEALTH:
+HEALTH_FILE = 'monitoring_health.json'  # local rolling window of the latest monitoring statuses
+HEALTH_WINDOW = 9  # number of latest statuses considered for the HEALTH value
+HEALTH_RECONCILE_HOURS = 24  # local window is reconciled with the monitoring table if older than this
+HEALTH_RECONCILE_TIMEOUT = 30  # seconds the monitoring insert waits for running reconciliation
+
+# LOG UPLOAD:
+LOG_UPLOAD_MAX_BYTES = 2 * 1024 * 1024  # logfile content uploaded to Slack is capped to this size (head + tail)
+LOG_DIGEST_LINES = 200  # maximum number of CRITICAL/ERROR/WARNING lines in the uploaded error digest
 
 # ROBOT SLACK CHANNELS:
 SLACK_PROD_CHANNEL = '#ipa-mig-raet-reports'
 SLACK_TEST_CHANNEL = '#ipa-test-reports'
 
+# SLACK NOTIFIER:
+SLACK_QUEUE_SIZE = 100  # maximum number of queued slack notifications
+SLACK_COALESCE_CHARS = 3000  # queued messages are merged into one post up to this length
+SLACK_RETRIES = 5  # attempts per notification (rate-limited requests wait for Retry-After)
+SLACK_CLOSE_TIMEOUT = 120  # maximum seconds to wait for queued notifications at the end of the run
+SLACK_CUSTOMER_UPDATES = True  # post result of each customer migration as soon as it's finished
+
 # PENTAHO PATH:
 PENTAHO_DIR = 'C:\\Pentaho\\data-integration'
 
@@ -40,6 +96,78 @@ MIG_ROOT = 'D:\\MigVisma'
 # ROBOT MIGRATION BATCH SCRIPT:
 MIG_BATCH_SCRIPT = 'MigrationTool_Robot.bat'
 
+# MIGRATIONTOOL LAUNCHER:
+KITCHEN_LAUNCHER = 'native'  # 'native' (Kitchen launched directly with MIG_JOB_* job) or 'batch' (MIG_BATCH_SCRIPT)
+KITCHEN_LOG_LEVEL = 'Basic'  # Kitchen logging level (-level option)
+KITCHEN_ERROR_LINES = 20  # last stderr lines reported when Kitchen exits with error
+KITCHEN_PUMP_TIMEOUT = 30  # seconds the job output is read after the job process exited
+
+# MIGRATION TOOL STAND-IN (python script called instead of Kitchen or MIG_BATCH_SCRIPT, None in production):
+MIG_TOOL_SCRIPT = None  # e.g. os.path.join(ROOT_DIR, 'bench', 'fake_migration_tool.py')
+
+# PENTAHO EXECUTION BACKEND:
+MIG_BACKEND = 'kitchen'  # 'kitchen' (Kitchen job per customer) or 'carte' (Carte server, Kitchen as fallback)
+MIG_JOBS_DIR = 'D:\\MigVisma\\Transformations'  # MigrationTool .kjb jobs folder
+CARTE_HOST = 'localhost'
+CARTE_PORT = 8081
+CARTE_CREDS = None  # LastPass item with Carte user and password (Carte defaults if None)
+CARTE_START_TIMEOUT = 180  # maximum seconds to wait for Carte server start
+CARTE_JOB_TIMEOUT = 6 * 3600  # maximum seconds of one migration job
+CARTE_POLL_INTERVAL = 5  # seconds between job status checks
+CARTE_STOP_TIMEOUT = 120  # maximum seconds to wait for stopped job (fatal error or CARTE_JOB_TIMEOUT)
+CARTE_SCRIPT = None  # python Carte stand-in (e.g. os.path.join(ROOT_DIR, 'bench', 'fake_carte.py'))
+
+# CONCURRENT MIGRATIONS:
+MIG_CUSTOMER_WORKERS = 1  # customers migrated concurrently (1 = one customer after another)
+MIG_JOB_CONCURRENCY = 2  # maximum number of Pentaho (Kitchen/Carte) jobs running at once
+MIG_JOB_WORK_ROOT = None  # folder of isolated job workspaces (KETTLE_HOME, temp), ROOT_DIR\jobs if None
+KETTLE_HOME = None  # shared KETTLE_HOME with '.kettle' configuration copied into job workspaces (user home if None)
+KITCHEN_JAVA_OPTIONS = '-Xms1024m -Xmx2048m'  # Kitchen JVM options (PENTAHO_DI_JAVA_OPTIONS of every job)
+
+# RENAMES BLOCKED BY OPEN HANDLES (lib/rename_handler.py):
+RENAME_RETRIES = 8  # retries of rename blocked by handle of another process (other errors are not retried)
+RENAME_BACKOFF_START = 0.1  # seconds before the first retry (doubled with every retry)
+RENAME_BACKOFF_MAX = 5  # maximum seconds between retries
+HANDLE_EXE = None  # Sysinternals handle.exe reporting processes locking renamed folder (psutil is used if None)
+
+# BULK FILE MOVES (lib/move_handler.py):
+MOVE_WORKERS = 8  # threads renaming files and copying files between volumes
+
+# CLEANUP AFTER VERIFIED UPLOAD (retention policy: True = removed, False = kept):
+CLEANUP_POLICY = {'docs': True,  # DOCS folder (extracted customer archives, MLM unpacked files)
+                  'index': True,  # index files (PDOL index.xml, SDOL index folder)
+                  'dossier': False,  # e-dossier folder (uploaded as .7z archive)
+                  'dossier_archive': False}  # uploaded e-dossier .7z archive
+CLEANUP_WORKERS = 4  # threads deleting files (1 = one file after another)
+
+# DISK SPACE ADMISSION (checked before unpacking, lib/disk_handler.py):
+DISK_UNPACK_RATIO = 1.1  # unpacked size = archive size x ratio (only if archive headers can't be read)
+DISK_UNPACK_COPIES = {'SDOL': 2}  # unpacked copies on MIG_ROOT volume (SDOL unzips nested zip files too)
+DISK_ARCHIVE_RATIO = 1.0  # zipped e-dossier size = unpacked size x ratio (documents are already compressed)
+DISK_RESERVE_BYTES = 10 * 1024 ** 3  # free space always kept on every volume
+DISK_DEFER_POLL = 60  # seconds between free space checks of deferred customer
+DISK_DEFER_TIMEOUT = 6 * 3600  # seconds the customer is deferred before it's rejected
+DISK_LIST_TIMEOUT = 5 * 60  # seconds for reading archive headers (7z l -slt)
+
+# MIGRATIONTOOL LOGFILES FOLLOWING (Log/MigrationTool{N}.log and .doslog during the migration job):
+MIG_LOG_POLL_INTERVAL = 1  # seconds between logfiles reads
+MIG_LOG_PROGRESS_INTERVAL = 30  # minimum seconds between progress entries in the robot log
+MIG_LOG_FATAL_PATTERNS = (r' - ERROR \(version ',  # Pentaho step/job error
+                          r'OutOfMemoryError',
+                          r'Errors detected!',
+                          r'Unable to open transformation',
+                          r'Unable to load the job')
+
+# SUBPROCESS WATCHDOG (hung Kitchen, cmd file, 7-Zip and SFX processes are killed, the customer fails):
+WATCHDOG_TIMEOUT_FACTOR = 3  # stage timeout = predicted stage duration (migration history) x factor
+WATCHDOG_MIN_THROUGHPUT = 256 * 1024  # archive bytes per second (timeout of stages without history)
+WATCHDOG_MIN_TIMEOUT = 30 * 60  # minimum stage timeout in seconds
+WATCHDOG_MAX_TIMEOUT = 6 * 3600  # maximum stage timeout in seconds (also used if archive size isn't known)
+WATCHDOG_STALL_TIMEOUT = 30 * 60  # seconds without progress (output, logfile or file growth) before kill
+WATCHDOG_STALL_TIMEOUTS = {'execute_migration_job': 60 * 60}  # stage specific stall timeouts
+WATCHDOG_POLL_INTERVAL = 10  # seconds between process checks
+WATCHDOG_RESCAN_INTERVAL = 5 * 60  # minimum seconds between full scans of extraction folder (below stall timeout)
+
 # SFTP FOLDERS:
 SFTP_TEST_DIR = 'robot_test_files'
 SFTP_DIR = 'robot_files'
@@ -65,6 +193,9 @@ SEVEN_ZIP_PATH = 'C:\\Program Files\\7-Zip'
 # RESERVED DIRECTORIES:
 RESERVED_DIRS = ['Templates', 'Transformations', 'MappingFixedAllowances']
 
+# STARTUP BENCHMARK (bench/import_time.py):
+STARTUP_TARGET_SECONDS = 1.0  # maximum duration of robot run without unprocessed folders (bench stand-ins)
+
 # CREDENTIALS:
 CREDENTIALS = 'credentials.json'
 
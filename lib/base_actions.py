@@ -4,11 +4,18 @@ import config as cfg
 import glob
 import logging
 import os
-import pandas as pd
 import re
 import subprocess
-import time
+import sys
+import threading
 from lib.base_migration import Migration
+from lib.cleanup_handler import cleanup
+from lib.kitchen_handler import job_slot, kitchen_command, run_kitchen_job
+from lib.miglog_handler import MigLogTailer
+from lib.watchdog_handler import Watchdog
+from lib.params_handler import read_parameters
+from lib.pentaho_handler import CarteUnavailable, disable_carte, get_carte
+from lib.rename_handler import rename_path
 from lib.sftp_handler import SftpHandle
 
 
@@ -101,20 +108,55 @@ class Actions(Migration):
 
     def __call_migration_bat(self):
         """
-        Method for calling the MigrationTool_Robot.bat script stored in D:/MigVisma root folder.
-        This is a batch script dedicated for the robot to run migration tasks defined by CustomerID and JobID.
-        Script takes two parameters:
+        Method for running the MigrationTool job of the customer.
+        If KITCHEN_LAUNCHER is 'native', Kitchen is launched directly with the job, logfile and MIG_ID parameter
+        mapped from config.py (MIG_JOB_*, MIG_LOG_*), stderr is written into MIG_DOSLOG_* file and the result
+        is given by Kitchen exit code (lib/kitchen_handler.py).
+        If KITCHEN_LAUNCHER is 'batch', the MigrationTool_Robot.bat script stored in D:/MigVisma root folder
+        is called. Script takes two parameters:
             1) customer directory name: which is also used as Migration ID
             2) job_type: 1=Customer, 2=Servicetime, 3=Sickness, 4=MappingDossier, 5=MLM, 6=SDOL, 7=PDOL
+        NOTE: If MIG_TOOL_SCRIPT is set in config.py, the python MigrationTool stand-in is called instead
+        (load testing outside the production server, see bench/fake_migration_tool.py).
+        NOTE: If MIG_BACKEND is 'carte', the job is executed on the Carte server started once per run
+        (lib/pentaho_handler.py). Kitchen is used if Carte isn't available.
+        NOTE: Kitchen jobs run in isolated workspaces, up to MIG_JOB_CONCURRENCY at once (lib/kitchen_handler.py).
         :return: stdout, stderr
         """
         batch_path = os.path.join(cfg.MIG_ROOT, cfg.MIG_BATCH_SCRIPT)
 
-        if os.path.isfile(batch_path):
+        if cfg.MIG_BACKEND == 'carte':
+            carte = get_carte()
+            if carte:
+                job_file = os.path.join(cfg.MIG_JOBS_DIR, getattr(cfg, f'MIG_JOB_{self.mig_type}'))
+                stop = threading.Event()
+                try:
+                    # fatal MigrationTool error stops the Carte job (stopJob servlet):
+                    with job_slot(self.customer_dir), \
+                            MigLogTailer(customer_dir=self.customer_dir, mig_type=self.mig_type,
+                                         on_fatal=stop.set) as tailer:
+                        out, err = carte.execute_job(job_file=job_file, params={'MIG_ID': self.customer_dir},
+                                                     stop=stop)
+                    return out, f'Fatal MigrationTool error: {tailer.fatal}' if tailer.fatal else err
+                except CarteUnavailable as err:
+                    logging.warning(msg=f'{err} - falling back to Kitchen')
+                    disable_carte()
+            else:
+                logging.warning(msg=f' Carte server not available - falling back to Kitchen')
+
+        if cfg.KITCHEN_LAUNCHER == 'native':
+            doslog = os.path.join(cfg.MIG_ROOT, self.customer_dir, 'Log', getattr(cfg, f'MIG_DOSLOG_{self.mig_type}'))
+            return run_kitchen_job(cmd=kitchen_command(customer_dir=self.customer_dir, mig_type=self.mig_type),
+                                   customer_dir=self.customer_dir, mig_type=self.mig_type, job_id=self.job_id,
+                                   env=dict(os.environ, MIG_ROOT=cfg.MIG_ROOT), doslog=doslog)
+        elif cfg.MIG_TOOL_SCRIPT:
+            cmd = [sys.executable, cfg.MIG_TOOL_SCRIPT, self.customer_dir, self.job_id]
+            return run_kitchen_job(cmd=cmd, customer_dir=self.customer_dir, mig_type=self.mig_type,
+                                   job_id=self.job_id, env=dict(os.environ, MIG_ROOT=cfg.MIG_ROOT))
+        elif os.path.isfile(batch_path):
             cmd = [batch_path, self.customer_dir, self.job_id]
-            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=cfg.PENTAHO_DIR)
-            stdout, stderr = process.communicate()
-            return stdout.decode('utf-8').splitlines(), stderr.decode('utf-8')
+            return run_kitchen_job(cmd=cmd, customer_dir=self.customer_dir, mig_type=self.mig_type,
+                                   job_id=self.job_id)
         else:
             logging.critical(msg=f' {cfg.MIG_BATCH_SCRIPT} not found in {cfg.MIG_ROOT} folder')
             raise FileNotFoundError(f' Path {batch_path} doesnt exist')
@@ -237,7 +279,13 @@ class Actions(Migration):
                                    stdout=subprocess.PIPE,
                                    stderr=subprocess.STDOUT,
                                    encoding='utf-8')
-        stdout, stderr = process.communicate()
+        # cmd output is read at the end, so the cmd file is watched for its timeout only:
+        with Watchdog(process=process) as watchdog:
+            stdout, stderr = process.communicate()
+
+        if watchdog.expired:
+            logging.critical(msg=f' Cmd file {file_name} execution stopped by the watchdog: {watchdog.expired}')
+            return False
 
         out = [line for line in stdout.split("\n") if line != '']
         nf_errs = [out[idx - 1] + f' {out[idx]}' for idx, i in enumerate(out) if 'cannot find the file' in i]
@@ -311,14 +359,8 @@ class Actions(Migration):
         target_path = None
 
         if os.path.exists(mig_target):
-            # try to find target path in parameters file:
-            data = pd.read_excel(mig_target).to_dict()
-            for key in data.keys():
-                if not target_path:
-                    if 'target' in key.lower():  # there should be a TargetPath column in parameters excel file
-                        for item in data.get(key).values():
-                            if 'migvisma' in item.lower():  # MigVisma should be in the path for e-dossier target folder
-                                target_path = item
+            # try to find target path in parameters file (there should be a TargetPath column):
+            target_path = read_parameters(mig_target).target_path
             if target_path:
                 logging.info(msg=f" Target path fetched from {self.mig_type}_parameters.xlsx file")
                 logging.info(msg=f" Target folder: {target_path}")
@@ -397,6 +439,24 @@ class Actions(Migration):
             logging.info(msg=f' Uploading process finished')
             return True
 
+    def cleanup_after_upload(self, dossier=None, archive=None, unpacked=None):
+        """
+        Remove intermediate files of the customer after verified upload of the e-dossier archive
+        (DOCS, index files, e-dossier folder and archive according to CLEANUP_POLICY in config.py).
+        NOTE: Cleanup errors are only logged, uploaded migration is not failed because of them.
+        :param dossier: e-dossier folder path
+        :param archive: uploaded e-dossier archive path
+        :param unpacked: unpacked customer files outside DOCS folder (MLM)
+        :return: (files, bytes) reclaimed or None if cleanup failed
+        :rtype: tuple
+        """
+        type_dir = os.path.join(cfg.MIG_ROOT, self.customer_dir, self.mig_type)
+        index = os.path.join(type_dir, 'index')
+        return cleanup(items={'docs': [getattr(self, 'docs_dir', None)] + list(unpacked or []),
+                              'index': index if os.path.isdir(index) else os.path.join(type_dir, 'index.xml'),
+                              'dossier': dossier,
+                              'dossier_archive': archive})
+
     def rename_dossier_folder(self, cmd_file):
         """
         Rename e-dossier migration target folder according to:
@@ -413,21 +473,13 @@ class Actions(Migration):
         new_name = os.path.join(original_root_path, f'{self.customer_dir}_{self.mig_type[0]}')
 
         if os.path.isdir(original_name):
-            retry = 5
-            while retry:
-                time.sleep(0.5)
-                try:
-                    os.rename(src=original_name, dst=new_name)
-                    retry = 0
-                    logging.info(msg=f" Dossier folder {original_name} renamed to {new_name}")
-                    return new_name
-                except Exception as err:
-                    if retry:
-                        retry = retry - 1
-                    else:
-                        logging.critical(
-                            msg=f' Renaming process failed for {original_name} >> {new_name}. Error: {err}')
-                        raise PermissionError(f' Renaming of {original_name} to {new_name} failed')
+            try:
+                rename_path(src=original_name, dst=new_name, folder='dossier')
+            except OSError as err:
+                logging.critical(msg=f' Renaming process failed for {original_name} >> {new_name}. Error: {err}')
+                raise PermissionError(f' Renaming of {original_name} to {new_name} failed')
+            logging.info(msg=f" Dossier folder {original_name} renamed to {new_name}")
+            return new_name
         else:
             logging.critical(msg=f" Directory {original_name} doesn't exist")
             raise NotADirectoryError(f" Directory {original_name} doesn't exist")
@@ -441,19 +493,12 @@ class Actions(Migration):
         new = os.path.join(cfg.MIG_ROOT, f'{self.customer_dir}_success_robot')
 
         if os.path.isdir(old):
-            retry = 10
-            while retry:
-                time.sleep(1)
-                try:
-                    os.rename(src=old, dst=new)
-                    retry = 0
-                    logging.info(msg=f' {old} folder renamed to {new}')
-                except Exception as err:
-                    if retry:
-                        retry = retry - 1
-                    else:
-                        logging.critical(msg=f' Renaming failed for directory {self.customer_dir}\n Error: {err}')
-                        raise PermissionError(f' Renaming failed for directory {self.customer_dir}')
+            try:
+                rename_path(src=old, dst=new, folder='success')
+            except OSError as err:
+                logging.critical(msg=f' Renaming failed for directory {self.customer_dir}\n Error: {err}')
+                raise PermissionError(f' Renaming failed for directory {self.customer_dir}')
+            logging.info(msg=f' {old} folder renamed to {new}')
         else:
             raise NotADirectoryError(f" Directory {self.customer_dir} doesn't exist")
 
@@ -466,18 +511,11 @@ class Actions(Migration):
         new = os.path.join(cfg.MIG_ROOT, f'{self.customer_dir}_failed_robot')
 
         if os.path.isdir(old):
-            retry = 10
-            while retry:
-                time.sleep(1)
-                try:
-                    os.rename(src=old, dst=new)
-                    retry = 0
-                    logging.info(msg=f' {old} folder renamed to {new}')
-                except Exception as err:
-                    if retry:
-                        retry = retry - 1
-                    else:
-                        logging.critical(msg=f' Renaming failed for directory {self.customer_dir}\n Error: {err}')
-                        raise PermissionError(f' Renaming failed for directory {self.customer_dir}')
+            try:
+                rename_path(src=old, dst=new, folder='failed')
+            except OSError as err:
+                logging.critical(msg=f' Renaming failed for directory {self.customer_dir}\n Error: {err}')
+                raise PermissionError(f' Renaming failed for directory {self.customer_dir}')
+            logging.info(msg=f' {old} folder renamed to {new}')
         else:
             raise NotADirectoryError(f" Directory {self.customer_dir} doesn't exist")
@@ -133,3 +133,48 @@ class Checks(Migration):
         else:
             logging.critical(msg=f" File {self.mig_type}_parameters.xlsx doesn't exist in {self.customer_dir} folder")
             return False
+
+    def run_checks(self, props_mandatory=False):
+        """
+        Run all pre-migration checks.
+        :param props_mandatory: True if config.properties file is mandatory for the migration type (MLM)
+        :return: True if all checks passed
+        :rtype: bool
+        """
+        # check if Pentaho is installed in the provided path:
+        if not self.pentaho_check():
+            return False
+
+        # check is MigVisma root folder exists:
+        if not self.mig_root_check():
+            return False
+
+        # check if Kitchen.bat script exists in pentaho dir:
+        if not self.kitchen_check():
+            return False
+
+        # check if customer folder path exists:
+        if not self.customer_dir_check():
+            return False
+
+        # check if customer folder is not in reserved list:
+        if not self.not_reserved_check():
+            return False
+
+        # check if properties file exists in customer folder:
+        if not self.props_check() and props_mandatory:
+            return False
+
+        # check if parameters file exists in customer folder:
+        if not self.params_check():
+            return False
+
+        # check if {migration_type} folder exists in customer folder:
+        if not self.mig_type_dir_check():
+            return False
+
+        # check if {migration_type}_parameters.xlsx file exists in customer folder:
+        if not self.mig_params_xlsx_check():
+            return False
+
+        return True
@@ -2,6 +2,7 @@
 
 import config as cfg
 import os
+from lib.timing_handler import StageTimer
 
 
 def get_unprocessed_dirs(mig_type: str):
@@ -41,3 +42,4 @@ class Migration(object):
         self.customer_dir = customer_dir
         self.mig_type = mig_type
         self.job_id = job_id
+        self.timer = StageTimer(customer_dir=customer_dir, mig_type=mig_type)
@@ -0,0 +1,114 @@
+# REF: stefan.mastilak@visma.com
+
+import config as cfg
+import logging
+import os
+import stat
+from concurrent.futures import ThreadPoolExecutor
+
+MIB = 1024 * 1024
+
+
+def _scan(path, files, dirs):
+    """
+    Collect files (with their sizes) and folders of the tree in one scandir pass.
+    Folders are collected bottom-up (sub-folders before their parent).
+    :param path: folder path
+    :param files: list collecting (file path, size)
+    :param dirs: list collecting folder paths
+    """
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                _scan(entry.path, files, dirs)
+            else:
+                files.append((entry.path, entry.stat(follow_symlinks=False).st_size))
+    dirs.append(path)
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except PermissionError:
+        # read-only files (e.g. extracted from archives) can't be deleted on Windows:
+        os.chmod(path, stat.S_IWRITE)
+        os.unlink(path)
+
+
+def remove_tree(path, workers=None):
+    """
+    Remove file or folder tree: one scandir pass, files deleted (by the thread pool if CLEANUP_WORKERS > 1 -
+    config.py), then folders removed bottom-up.
+    :param path: file or folder path
+    :param workers: number of threads deleting files (CLEANUP_WORKERS by default)
+    :return: (files, bytes) removed
+    :rtype: tuple
+    """
+    if not os.path.isdir(path):
+        size = os.path.getsize(path)
+        _unlink(path)
+        return 1, size
+
+    files, dirs = [], []
+    _scan(path, files, dirs)
+    workers = workers or cfg.CLEANUP_WORKERS
+    if workers > 1 and len(files) > 1:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='cleanup') as pool:
+            for _ in pool.map(_unlink, [file for file, _ in files]):
+                pass
+    else:
+        for file, _ in files:
+            _unlink(file)
+    for folder in dirs:
+        os.rmdir(folder)
+    return len(files), sum(size for _, size in files)
+
+
+def remove_empty_tree(path):
+    """
+    Remove folder tree containing no files (folders removed bottom-up in one scandir pass).
+    :param path: folder path
+    :return: number of removed folders
+    :rtype: int
+    """
+    files, dirs = [], []
+    _scan(path, files, dirs)
+    if files:
+        raise FileExistsError(f' {path} folder is not empty - {len(files)} files found, e.g. {files[0][0]}')
+    for folder in dirs:
+        os.rmdir(folder)
+    return len(dirs)
+
+
+def cleanup(items):
+    """
+    Remove intermediate files and folders of the customer migration according to the retention policy
+    (config.py - CLEANUP_POLICY). Items which fail to be removed (any error) are logged and skipped, cleanup never
+    raises (it runs after the verified upload).
+    :param items: {item name: path or list of paths} (e.g. {'docs': DOCS folder, 'index': index folder})
+    :return: (files, bytes) reclaimed or None if any item failed to be removed (failed cleanup stage)
+    :rtype: tuple
+    """
+    total_files, total_bytes, failed = 0, 0, []
+    paths = [(name, path) for name, value in items.items()
+             for path in (value if isinstance(value, (list, tuple)) else [value])]
+    for name, path in paths:
+        if not path or not os.path.exists(path):
+            continue
+        if not cfg.CLEANUP_POLICY.get(name):
+            logging.info(msg=f' Cleanup: {path} kept (retention policy)')
+            continue
+        try:
+            files, size = remove_tree(path)
+        except Exception as err:
+            logging.warning(msg=f' Cleanup: unable to remove {path}. Error: {err}')
+            failed.append(path)
+            continue
+        logging.info(msg=f' Cleanup: {path} removed ({files} files, {size / MIB:.1f} MiB)')
+        total_files += files
+        total_bytes += size
+    logging.info(msg=f' Cleanup reclaimed {total_bytes / MIB:.1f} MiB ({total_files} files)')
+    if failed:
+        logging.warning(msg=f' Cleanup failed for {len(failed)} items, they have to be removed manually')
+        return None
+    return total_files, total_bytes
@@ -3,15 +3,86 @@
 import config as cfg
 import json
 import logging
-from os import path
+import os
+import threading
+
+
+class CredentialsStore(object):
+    """
+    Credentials stored in the credentials.json file locally on the runtime server (LastPass not used anymore).
+    The file is loaded once per process and cached in memory, it's reloaded only when its modification time changes.
+    """
+
+    def __init__(self, file_path=None):
+        """
+        :param file_path: credentials file path (CREDENTIALS in robot root folder by default)
+        """
+        self.path = file_path or os.path.join(cfg.ROOT_DIR, cfg.CREDENTIALS)
+        self.items = {}
+        self.mtime = None
+        self.lock = threading.Lock()
+
+    def __load(self):
+        """
+        Load credentials file if it wasn't loaded yet or it was changed since the last load.
+        :return: None
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            logging.critical(msg=f' Credentials file doesnt exist in path: {self.path}!')
+            raise FileNotFoundError(f' Credentials file doesnt exist in path: {self.path}')
+
+        with self.lock:
+            if mtime != self.mtime:
+                with open(self.path, encoding='utf-8') as creds_file:
+                    items = json.load(creds_file)
+                if not isinstance(items, dict):
+                    logging.critical(msg=f' Invalid credentials file: {self.path}')
+                    raise ValueError(f' Invalid credentials file: {self.path}')
+                self.items = items
+                self.mtime = mtime
+
+    def get(self, item):
+        """
+        Get credentials item.
+        :param item: credentials item name (config.py - CREDENTIAL ITEMS)
+        :return: credentials item
+        :rtype: dict
+        """
+        self.__load()
+        if item not in self.items:
+            logging.critical(msg=f' Credentials item {item} not found in {self.path}')
+            raise KeyError(f' Credentials item {item} not found in {self.path}')
+        return self.items[item]
+
+    def require(self, *items):
+        """
+        Validate that all credentials items needed by the robot are present (to be called at robot start).
+        :param items: credentials item names
+        :return: True if all items are present
+        :rtype: bool
+        """
+        self.__load()
+        missing = [i for i in items if not isinstance(self.items.get(i), dict)]
+        if missing:
+            logging.critical(msg=f' Missing or invalid credentials items: {", ".join(missing)}')
+            raise KeyError(f' Missing or invalid credentials items: {", ".join(missing)}')
+        return True
+
+
+_STORE = CredentialsStore()
 
 
 def get_credentials(item):
     """
     Get credentials stored in the credentials.json file locally on the runtime server (LastPass not used anymore)
     """
-    if path.isfile(path.join(cfg.ROOT_DIR, cfg.CREDENTIALS)):
-        with open(path.join(cfg.ROOT_DIR, cfg.CREDENTIALS), encoding='utf-8') as creds_file:
-            return json.load(creds_file).get(item)
-    else:
-        logging.critical(msg=f' Credentials file doesnt exist in path: {path.join(cfg.ROOT_DIR, cfg.CREDENTIALS)}!')
+    return _STORE.get(item)
+
+
+def require_credentials(*items):
+    """
+    Fail at robot start if any of the needed credentials items is missing in the credentials.json file.
+    """
+    return _STORE.require(*items)
@@ -0,0 +1,175 @@
+# REF: stefan.mastilak@visma.com
+
+import config as cfg
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import time
+from lib.metrics_handler import inc
+
+MIB = 1024 * 1024
+
+
+def archive_uncompressed_size(archive, pwd=None):
+    """
+    Get uncompressed size of the archive from its headers (7z technical listing, no data is extracted).
+    :param archive: archive path (SFX exe, 7z, zip or first volume of split archive)
+    :param pwd: archive password (needed for encrypted headers)
+    :return: uncompressed size in bytes or None if the headers can't be read
+    :rtype: int
+    """
+    cmd = [os.path.join(cfg.SEVEN_ZIP_PATH, '7z'), 'l', archive, '-slt', f'-p{pwd or ""}']
+    try:
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=cfg.DISK_LIST_TIMEOUT)
+    except (OSError, subprocess.SubprocessError) as err:
+        logging.warning(msg=f' Unable to read headers of {archive}. Error: {err}')
+        return None
+    if result.returncode:
+        logging.warning(msg=f' Unable to read headers of {archive}. Error: {result.stderr.decode("utf-8").strip()}')
+        return None
+
+    # archive properties are listed before '----------' line, entries after it:
+    entries = result.stdout.decode('utf-8', errors='replace').split('\n----------', 1)[-1]
+    return sum(int(line.split('=', 1)[1]) for line in entries.splitlines()
+               if line.startswith('Size = ') and line.split('=', 1)[1].strip().isdecimal())
+
+
+def _volume(path):
+    """
+    Get existing path and device of the volume the path is (or will be) on.
+    :param path: file or folder path (doesn't need to exist yet)
+    :return: (existing path, device)
+    :rtype: tuple
+    """
+    path = os.path.abspath(path)
+    while not os.path.exists(path) and os.path.dirname(path) != path:
+        path = os.path.dirname(path)
+    return path, os.stat(path).st_dev
+
+
+def disk_footprint(archives, mig_type, target_path=None, pwd=None):
+    """
+    Estimate disk space needed by the customer migration (config.py - DISK_*):
+     1) unpacked DOCS: uncompressed size from archive headers (archive size x DISK_UNPACK_RATIO if the headers
+        can't be read), DISK_UNPACK_COPIES times for types unzipping nested archives (SDOL)
+     2) e-dossier: copy of the documents made by cmd file moves, only if the target is on another volume
+        (moves are renames on the same volume)
+     3) output .7z archive of the e-dossier (DISK_ARCHIVE_RATIO of the e-dossier size)
+    :param archives: customer archive paths
+    :param mig_type: migration type (PDOL, SDOL, MLM, etc..)
+    :param target_path: e-dossier target path (MIG_ROOT volume is assumed if None)
+    :param pwd: archive password
+    :return: {device: [volume path, bytes]}
+    :rtype: dict
+    """
+    unpacked = 0
+    for archive in archives:
+        size = archive_uncompressed_size(archive, pwd=pwd)
+        unpacked += size if size is not None else int(os.path.getsize(archive) * cfg.DISK_UNPACK_RATIO)
+
+    root, root_device = _volume(cfg.MIG_ROOT)
+    target, target_device = _volume(target_path) if target_path else (root, root_device)
+    need = {root_device: [root, unpacked * cfg.DISK_UNPACK_COPIES.get(mig_type, 1)]}
+    need.setdefault(target_device, [target, 0])
+    if target_device != root_device:
+        need[target_device][1] += unpacked
+    need[target_device][1] += int(unpacked * cfg.DISK_ARCHIVE_RATIO)
+    return need
+
+
+class DiskAdmission(object):
+    """
+    Admission control of customer migrations by free disk space (config.py - DISK_*).
+    Customer is admitted if its disk footprint fits into free space of the volumes (minus DISK_RESERVE_BYTES and
+    the rest of footprints reserved by the customers being migrated), deferred while other customers hold
+    reservations and rejected if it doesn't fit even when no other customer is migrated (or after DISK_DEFER_TIMEOUT).
+    NOTE: Bytes written to the volume since the last check are deducted from the reservations (in proportion to
+    their rest), so space already used by running customers isn't counted twice - as used and as reserved.
+    Footprints stay reserved until the customers finish (release), so concurrently migrated customers
+    (lib/scheduler_handler.py) never need more space than the volumes have.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.reserved = {}  # customer_dir: {device: [volume path, bytes still to be written]}
+        self.free = {}  # device: free bytes at the last check
+
+    def __settle(self, device, volume):
+        """
+        Deduct bytes written to the volume since the last check from the reservations.
+        :return: current free bytes of the volume
+        :rtype: int
+        """
+        free = shutil.disk_usage(volume).free
+        written = self.free.get(device, free) - free
+        self.free[device] = free
+        reservations = [other[device] for other in self.reserved.values() if device in other]
+        rest = sum(i[1] for i in reservations)
+        if written > 0 and rest:
+            for reservation in reservations:
+                reservation[1] = max(0, reservation[1] - written * reservation[1] // rest)
+        return free
+
+    def __shortage(self, need):
+        """
+        Get the first volume the footprint doesn't fit to.
+        :return: (volume path, needed bytes, available bytes) or None if the footprint fits
+        """
+        for device, (volume, size) in need.items():
+            free = self.__settle(device, volume)
+            reserved = sum(other[device][1] for other in self.reserved.values() if device in other)
+            available = free - reserved - cfg.DISK_RESERVE_BYTES
+            if size > available:
+                return volume, size, available
+        return None
+
+    def admit(self, customer_dir, need):
+        """
+        Admit customer migration (waits while the customer is deferred).
+        :param customer_dir: customer directory
+        :param need: disk footprint {device: [volume path, bytes]} (disk_footprint)
+        :return: True if admitted, False if rejected
+        :rtype: bool
+        """
+        deadline = time.monotonic() + cfg.DISK_DEFER_TIMEOUT
+        deferred = False
+        with self.cond:
+            while True:
+                shortage = self.__shortage(need)
+                if not shortage:
+                    self.reserved[customer_dir] = {device: list(i) for device, i in need.items()}
+                    logging.info(msg=f' Disk space admitted: ' + ', '.join(
+                        f'{volume} {size / MIB:.1f} MiB' for volume, size in need.values()))
+                    inc('robot_disk_admissions_total', result='admitted')
+                    return True
+
+                volume, size, available = shortage
+                if not self.reserved or time.monotonic() >= deadline:
+                    logging.critical(msg=f' Not enough disk space on {volume}: {size / MIB:.1f} MiB needed, '
+                                         f'{max(available, 0) / MIB:.1f} MiB available')
+                    inc('robot_disk_admissions_total', result='rejected')
+                    return False
+                if not deferred:
+                    deferred = True
+                    logging.warning(msg=f' Deferred until other customers finish: {size / MIB:.1f} MiB needed on '
+                                        f'{volume}, {max(available, 0) / MIB:.1f} MiB available')
+                    inc('robot_disk_admissions_total', result='deferred')
+                # free space is checked again when any customer finishes (or by DISK_DEFER_POLL):
+                self.cond.wait(timeout=cfg.DISK_DEFER_POLL)
+
+    def release(self, customer_dir):
+        """
+        Release disk space reservation of the finished customer.
+        :param customer_dir: customer directory
+        :return: None
+        """
+        with self.cond:
+            if self.reserved.pop(customer_dir, None) is not None:
+                if not self.reserved:
+                    self.free.clear()
+                self.cond.notify_all()
+
+
+DISK = DiskAdmission()  # admission control of the robot run
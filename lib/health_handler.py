@@ -0,0 +1,100 @@
+# REF: stefan.mastilak@visma.com
+
+import config as cfg
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+
+
+class HealthWindow(object):
+    """
+    Local rolling window of the latest monitoring statuses of the robot process.
+    It's persisted on the disk (config.py - HEALTH_FILE), so monitoring table HEALTH value can be computed
+    without querying BigQuery before every monitoring insert.
+    """
+
+    def __init__(self, path=None, size=cfg.HEALTH_WINDOW):
+        """
+        :param path: health state file path (HEALTH_FILE in robot root folder by default)
+        :param size: number of latest statuses considered for the HEALTH value
+        """
+        self.path = path or os.path.join(cfg.ROOT_DIR, cfg.HEALTH_FILE)
+        self.size = size
+        self.statuses = []  # latest status first
+        self.recorded = 0  # statuses recorded by this process
+        self.reconciled = None
+        self.loaded = self.load()
+
+    def load(self):
+        """
+        Load health state from the disk.
+        :return: True if health state file was loaded
+        :rtype: bool
+        """
+        if not os.path.isfile(self.path):
+            return False
+        try:
+            with open(self.path, encoding='utf-8') as state_file:
+                state = json.load(state_file)
+            self.statuses = [str(i) for i in state.get('statuses', [])][:self.size]
+            self.reconciled = datetime.fromisoformat(state['reconciled']) if state.get('reconciled') else None
+            return True
+        except (ValueError, KeyError, OSError) as err:
+            logging.warning(msg=f' Unable to read health state file {self.path}. Error: {err}')
+            return False
+
+    def save(self):
+        """
+        Persist health state to the disk (written to temporary file first and replaced, so it's never half-written).
+        :return: None
+        """
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as state_file:
+            json.dump({'statuses': self.statuses,
+                       'reconciled': self.reconciled.isoformat() if self.reconciled else None}, state_file)
+        os.replace(tmp_path, self.path)
+
+    def needs_reconcile(self):
+        """
+        Check if local health state should be reconciled with the monitoring table.
+        :return: True if state file is missing or it wasn't reconciled within HEALTH_RECONCILE_HOURS
+        :rtype: bool
+        """
+        if not self.loaded or not self.reconciled:
+            return True
+        return datetime.now() - self.reconciled > timedelta(hours=cfg.HEALTH_RECONCILE_HOURS)
+
+    def reconcile(self, statuses, since=None):
+        """
+        Replace local statuses with the ones fetched from the monitoring table.
+        :param statuses: latest statuses from the monitoring table (latest first)
+        :param since: value of .recorded when the statuses were fetched (statuses recorded later are kept on top)
+        :return: None
+        """
+        recent = self.statuses[:self.recorded - since] if since is not None else []
+        self.statuses = (recent + [str(i) for i in statuses])[:self.size]
+        self.reconciled = datetime.now()
+        self.loaded = True
+        self.save()
+        logging.info(msg=f' Local health state reconciled with the monitoring table')
+
+    def health(self, status):
+        """
+        Compute HEALTH value for the new status: green statuses in the window, plus one if new status is green.
+        :param status: new monitoring status (GREEN, YELLOW, RED)
+        :return: health value
+        :rtype: int
+        """
+        last_health = len([i for i in self.statuses if i.lower() == 'green'])
+        return last_health + 1 if status.lower() == 'green' else last_health
+
+    def record(self, status):
+        """
+        Add new status to the window and persist it.
+        :param status: new monitoring status (GREEN, YELLOW, RED)
+        :return: None
+        """
+        self.statuses = [status] + self.statuses[:self.size - 1]
+        self.recorded += 1
+        self.save()
@@ -0,0 +1,296 @@
+# REF: stefan.mastilak@visma.com
+
+import config as cfg
+import heapq
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from statistics import mean
+
+MIB = 1024 * 1024
+
+
+def _solve(matrix, vector):
+    """
+    Solve linear system by Gaussian elimination with partial pivoting.
+    :param matrix: square matrix (list of rows)
+    :param vector: right side
+    :return: solution or None if the system is singular
+    :rtype: list
+    """
+    size = len(vector)
+    rows = [list(row) + [value] for row, value in zip(matrix, vector)]
+    for col in range(size):
+        pivot = max(range(col, size), key=lambda r: abs(rows[r][col]))
+        if abs(rows[pivot][col]) < 1e-12:
+            return None
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        for r in range(col + 1, size):
+            factor = rows[r][col] / rows[col][col]
+            for c in range(col, size + 1):
+                rows[r][c] -= factor * rows[col][c]
+    solution = [0.0] * size
+    for r in reversed(range(size)):
+        solution[r] = (rows[r][size] - sum(rows[r][c] * solution[c] for c in range(r + 1, size))) / rows[r][r]
+    return solution
+
+
+def _fit(features, targets, ridge=1e-6):
+    """
+    Least squares fit of targets = features . weights (small ridge term keeps the system well conditioned).
+    :param features: list of feature vectors (first feature should be the constant 1)
+    :param targets: list of target values
+    :return: weights or None if the fit is not possible
+    :rtype: list
+    """
+    size = len(features[0])
+    xtx = [[sum(f[i] * f[j] for f in features) + (ridge if i == j else 0.0) for j in range(size)]
+           for i in range(size)]
+    xty = [sum(f[i] * t for f, t in zip(features, targets)) for i in range(size)]
+    return _solve(xtx, xty)
+
+
+def _predict(weights, feature):
+    return max(0.0, sum(w * f for w, f in zip(weights, feature)))
+
+
+def next_scheduled_run(now=None):
+    """
+    Get start of the next scheduled robot run (config.py - SCHEDULE_DAYS, SCHEDULE_TIMES).
+    :param now: reference datetime (now by default)
+    :return: next scheduled run datetime
+    :rtype: datetime
+    """
+    now = now or datetime.now()
+    for days in range(8):
+        day = now.date() + timedelta(days=days)
+        if day.weekday() not in cfg.SCHEDULE_DAYS:
+            continue
+        for slot in sorted(cfg.SCHEDULE_TIMES):
+            hour, minute = (int(i) for i in slot.split(':'))
+            start = datetime(day.year, day.month, day.day, hour, minute)
+            if start > now:
+                return start
+
+
+def batch_duration(durations, workers=None):
+    """
+    Get duration of the batch of customer migrations run by the pool of workers (lib/scheduler_handler.py).
+    Every customer is started in the given order by the first free worker (like the worker pool does).
+    :param durations: customer durations in seconds (in the order they are started)
+    :param workers: number of workers (MIG_CUSTOMER_WORKERS by default)
+    :return: batch duration in seconds
+    :rtype: float
+    """
+    workers = max(1, min(workers or cfg.MIG_CUSTOMER_WORKERS, len(durations)))
+    finish = [0.0] * workers
+    for duration in durations:
+        heapq.heappush(finish, heapq.heappop(finish) + duration)
+    return max(finish) if durations else 0.0
+
+
+def format_duration(seconds):
+    """
+    Format duration in seconds like H:MM:SS.
+    :param seconds: duration in seconds
+    :return: formatted duration
+    :rtype: str
+    """
+    return str(timedelta(seconds=int(seconds)))
+
+
+class History(object):
+    """
+    Local history of customer migrations (SQLite file in robot root folder - config.py HISTORY_FILE).
+    Every migration is stored with its archive size, documents count, per-stage durations and outcome.
+    History is used for prediction of stage durations of new customers (ETA, ordering and schedule warnings).
+    """
+
+    def __init__(self, path=None):
+        """
+        :param path: history database path (HISTORY_FILE in robot root folder by default)
+        """
+        self.path = path or os.path.join(cfg.ROOT_DIR, cfg.HISTORY_FILE)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS migrations ('
+                          'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                          'mig_type TEXT NOT NULL, '
+                          'customer_dir TEXT NOT NULL, '
+                          'start TEXT NOT NULL, '
+                          'end TEXT NOT NULL, '
+                          'archive_bytes INTEGER, '
+                          'documents INTEGER, '
+                          'outcome TEXT NOT NULL)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS stages ('
+                          'migration_id INTEGER NOT NULL REFERENCES migrations(id), '
+                          'stage TEXT NOT NULL, '
+                          'wall REAL NOT NULL, '
+                          'cpu REAL NOT NULL, '
+                          'files INTEGER, '
+                          'bytes INTEGER, '
+                          'outcome TEXT NOT NULL)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS migrations_type ON migrations (mig_type, id)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS stages_migration ON stages (migration_id)')
+
+    def record(self, timer, outcome, start, end, archive_bytes=None):
+        """
+        Store finished customer migration.
+        NOTE: Documents count is taken from the files moved by cmd file ('execute_cmd_file' stage).
+        :param timer: StageTimer of the customer migration (lib/timing_handler.py)
+        :param outcome: migration outcome (success, failed)
+        :param start: migration start datetime
+        :param end: migration end datetime
+        :param archive_bytes: size of customer archives
+        :return: migration id (None if the migration couldn't be stored)
+        :rtype: int
+        """
+        documents = next((r.files for r in timer.records if r.stage == 'execute_cmd_file' and r.files), None)
+        with self.lock:
+            try:
+                self.conn.execute('BEGIN')
+                cursor = self.conn.execute(
+                    'INSERT INTO migrations (mig_type, customer_dir, start, end, archive_bytes, documents, outcome) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (timer.mig_type, timer.customer_dir, start.isoformat(), end.isoformat(), archive_bytes,
+                     documents, outcome))
+                self.conn.executemany(
+                    'INSERT INTO stages (migration_id, stage, wall, cpu, files, bytes, outcome) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    [(cursor.lastrowid, r.stage, r.wall, r.cpu, r.files, r.bytes, r.outcome) for r in timer.records])
+                self.conn.execute('COMMIT')
+            except sqlite3.Error as err:
+                if self.conn.in_transaction:
+                    self.conn.execute('ROLLBACK')
+                logging.warning(msg=f' Unable to store {timer.customer_dir} migration into the history. Error: {err}')
+                return None
+        return cursor.lastrowid
+
+    def __samples(self, mig_type):
+        """
+        Get successful stage durations of the latest migrations (config.py - HISTORY_SAMPLES).
+        :param mig_type: migration type (PDOL, SDOL, MLM, etc..)
+        :return: {stage: [(archive_mib, documents, wall), ...]}
+        :rtype: dict
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT s.stage, m.archive_bytes, m.documents, s.wall FROM stages s '
+                'JOIN (SELECT id, archive_bytes, documents FROM migrations '
+                '      WHERE mig_type = ? AND archive_bytes IS NOT NULL ORDER BY id DESC LIMIT ?) m '
+                'ON s.migration_id = m.id WHERE s.outcome = ?',
+                (mig_type, cfg.HISTORY_SAMPLES, 'ok')).fetchall()
+        samples = {}
+        for stage, archive_bytes, documents, wall in rows:
+            samples.setdefault(stage, []).append((archive_bytes / MIB, documents, wall))
+        return samples
+
+    def predict(self, mig_type, archive_bytes, documents=None):
+        """
+        Predict stage durations of the customer migration.
+        Stage duration is fitted linearly on archive size and documents count of the latest migrations
+        (on archive size only if documents count isn't known, mean duration if there are too few samples).
+        Unknown documents count is estimated from archive size.
+        :param mig_type: migration type (PDOL, SDOL, MLM, etc..)
+        :param archive_bytes: size of customer archives
+        :param documents: documents count (optional)
+        :return: {stage: seconds} (empty if there is no history)
+        :rtype: dict
+        """
+        samples = self.__samples(mig_type)
+        mib = archive_bytes / MIB
+
+        if documents is None:
+            known = {(m, d) for rows in samples.values() for m, d, _ in rows if d is not None}
+            if len(known) >= cfg.HISTORY_MIN_SAMPLES:
+                weights = _fit([(1.0, m) for m, _ in known], [d for _, d in known])
+                documents = _predict(weights, (1.0, mib)) if weights else None
+
+        prediction = {}
+        for stage, rows in samples.items():
+            weights = None
+            if len(rows) >= cfg.HISTORY_MIN_SAMPLES:
+                if documents is not None and all(d is not None for _, d, _ in rows):
+                    weights = _fit([(1.0, m, d / 1000) for m, d, _ in rows], [w for _, _, w in rows])
+                    if weights:
+                        prediction[stage] = _predict(weights, (1.0, mib, documents / 1000))
+                if not weights:
+                    weights = _fit([(1.0, m) for m, _, _ in rows], [w for _, _, w in rows])
+                    if weights:
+                        prediction[stage] = _predict(weights, (1.0, mib))
+            if not weights:
+                prediction[stage] = mean(w for _, _, w in rows)
+        return prediction
+
+    def estimate(self, mig_type, archive_bytes, documents=None):
+        """
+        Predict total duration of the customer migration.
+        :param mig_type: migration type (PDOL, SDOL, MLM, etc..)
+        :param archive_bytes: size of customer archives
+        :param documents: documents count (optional)
+        :return: seconds or None if there is no history
+        :rtype: float
+        """
+        prediction = self.predict(mig_type=mig_type, archive_bytes=archive_bytes, documents=documents)
+        return sum(prediction.values()) if prediction else None
+
+    def plan(self, mig_type, archives, workers=None):
+        """
+        Plan the batch of customer migrations: estimate durations, order customers and check the schedule.
+        Customers are ordered from the shortest estimate (config.py - HISTORY_SHORTEST_FIRST), so the most
+        customers are finished if the batch runs into the next scheduled run. Customers without estimate keep
+        their original order at the end.
+        :param mig_type: migration type (PDOL, SDOL, MLM, etc..)
+        :param archives: {customer_dir: archive_bytes} in original order
+        :param workers: number of customers migrated concurrently (MIG_CUSTOMER_WORKERS by default)
+        :return: (ordered customer dirs, {customer_dir: seconds or None}, schedule warning or None)
+        :rtype: tuple
+        """
+        estimates = {customer: self.estimate(mig_type=mig_type, archive_bytes=size)
+                     for customer, size in archives.items()}
+        ordered = list(archives)
+        if cfg.HISTORY_SHORTEST_FIRST:
+            ordered.sort(key=lambda c: (estimates[c] is None, estimates[c] or 0))
+
+        warning = None
+        known = [estimates[c] for c in ordered if estimates[c] is not None]
+        if known:
+            total = batch_duration(known, workers=workers)
+            finish = datetime.now() + timedelta(seconds=total)
+            next_run = next_scheduled_run()
+            logging.info(msg=f' Estimated batch duration: {format_duration(total)} '
+                             f'({len(known)}/{len(estimates)} customers estimated), ETA: {finish:%Y-%m-%d %H:%M}')
+            if next_run and finish > next_run:
+                warning = (f'{mig_type} batch is not expected to finish before the next scheduled run '
+                           f'({next_run:%Y-%m-%d %H:%M}), ETA: {finish:%Y-%m-%d %H:%M}')
+                logging.warning(msg=f' {warning}')
+        else:
+            logging.info(msg=f' No {mig_type} migration history for duration estimates yet')
+        return ordered, estimates, warning
+
+    def close(self):
+        """Close the history database connection."""
+        with self.lock:
+            self.conn.close()
+
+
+def log_eta(estimates, customers, workers=None):
+    """
+    Log estimated duration of the current customer migration and ETA of the remaining batch.
+    NOTE: With concurrent workers the remaining customers are spread over the workers (batch_duration), remaining
+    time of the customers already running is not included.
+    :param estimates: {customer_dir: seconds or None} (History.plan)
+    :param customers: remaining customer dirs (current customer first)
+    :param workers: number of customers migrated concurrently (MIG_CUSTOMER_WORKERS by default)
+    :return: None
+    """
+    current = estimates.get(customers[0])
+    if current is None:
+        return
+    remaining = batch_duration([estimates.get(c) or 0 for c in customers], workers=workers)
+    finish = datetime.now() + timedelta(seconds=remaining)
+    logging.info(msg=f' Estimated migration duration: {format_duration(current)}, '
+                     f'batch ETA ({len(customers)} customers left): {finish:%Y-%m-%d %H:%M}')
@@ -0,0 +1,218 @@
+# REF: stefan.mastilak@visma.com
+
+import config as cfg
+import logging
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from lib.miglog_handler import JobProcess, MigLogTailer, kill_process_tree
+from lib.watchdog_handler import Watchdog
+
+_SLOTS = threading.BoundedSemaphore(cfg.MIG_JOB_CONCURRENCY)
+
+KITCHEN_EXIT_CODES = {
+    1: 'errors occurred during processing',
+    2: 'unexpected error during loading or running of the job',
+    7: "job couldn't be loaded from XML or repository",
+    8: 'error loading job entries or plugins',
+    9: 'command line usage printing',
+}
+
+
+@contextmanager
+def job_slot(customer_dir):
+    """
+    Wait for free migration job slot (at most MIG_JOB_CONCURRENCY Pentaho jobs run at once - config.py).
+    :param customer_dir: customer directory
+    """
+    if not _SLOTS.acquire(blocking=False):
+        logging.info(msg=f' Waiting for free migration job slot ({cfg.MIG_JOB_CONCURRENCY} jobs running)')
+        start = time.monotonic()
+        _SLOTS.acquire()
+        logging.info(msg=f' Migration job slot acquired after {time.monotonic() - start:.0f}s')
+    try:
+        yield
+    finally:
+        _SLOTS.release()
+
+
+def _kettle_home():
+    """
+    Get shared KETTLE_HOME folder of the robot user (folder containing '.kettle' configuration).
+    :return: KETTLE_HOME path
+    :rtype: str
+    """
+    return cfg.KETTLE_HOME or os.environ.get('KETTLE_HOME') or os.path.expanduser('~')
+
+
+class JobWorkspace(object):
+    """
+    Isolated working folder of one migration job (config.py - MIG_JOB_WORK_ROOT).
+    Job gets its own KETTLE_HOME (copy of the shared '.kettle' configuration files) and temp folder, so
+    concurrent Kitchen jobs don't share kettle.properties changes, caches, locks or temporary files.
+    """
+
+    def __init__(self, customer_dir, job_id):
+        """
+        :param customer_dir: customer directory
+        :param job_id: migration tool job ID (7 for PDOL, 6 for SDOL, 5 for MLM, etc..)
+        """
+        name = re.sub(r'[^\w.-]', '_', f'{customer_dir}_{job_id}')
+        self.path = os.path.join(cfg.MIG_JOB_WORK_ROOT or os.path.join(cfg.ROOT_DIR, 'jobs'), name)
+        self.kettle_home = os.path.join(self.path, 'home')
+        self.temp = os.path.join(self.path, 'temp')
+
+    def __enter__(self):
+        self.create()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.remove()
+
+    def create(self):
+        """
+        Create the workspace and copy shared '.kettle' configuration files into its KETTLE_HOME.
+        :return: workspace path
+        :rtype: str
+        """
+        shutil.rmtree(self.path, ignore_errors=True)
+        kettle_dir = os.path.join(self.kettle_home, '.kettle')
+        os.makedirs(kettle_dir)
+        os.makedirs(self.temp)
+        shared = os.path.join(_kettle_home(), '.kettle')
+        if os.path.isdir(shared):
+            with os.scandir(shared) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        shutil.copy2(entry.path, kettle_dir)
+        return self.path
+
+    def env(self, base=None):
+        """
+        Get job process environment pointing KETTLE_HOME, TEMP/TMP and JVM temp folder into the workspace.
+        :param base: base environment (robot environment by default)
+        :return: environment dict
+        :rtype: dict
+        """
+        env = dict(base or os.environ)
+        env.update(KETTLE_HOME=self.kettle_home, TEMP=self.temp, TMP=self.temp, TMPDIR=self.temp,
+                   PENTAHO_DI_JAVA_OPTIONS=f'{cfg.KITCHEN_JAVA_OPTIONS} -Djava.io.tmpdir={self.temp}')
+        return env
+
+    def remove(self):
+        """Remove the workspace."""
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def kitchen_command(customer_dir, mig_type):
+    """
+    Get Kitchen command of the migration job (job, logfile and MIG_ID parameter mapping from config.py).
+    NOTE: If MIG_TOOL_SCRIPT is set in config.py, the python MigrationTool stand-in is called instead
+    (same arguments as Kitchen, see bench/fake_migration_tool.py).
+    :param customer_dir: customer directory (used as Migration ID)
+    :param mig_type: migration type (PDOL, SDOL, MLM, etc..)
+    :return: command
+    :rtype: list
+    """
+    job_file = os.path.join(cfg.MIG_JOBS_DIR, getattr(cfg, f'MIG_JOB_{mig_type}'))
+    logfile = os.path.join(cfg.MIG_ROOT, customer_dir, 'Log', getattr(cfg, f'MIG_LOG_{mig_type}'))
+    args = [f'-file:{job_file}', f'-param:MIG_ID={customer_dir}', f'-level:{cfg.KITCHEN_LOG_LEVEL}',
+            f'-logfile:{logfile}']
+    if cfg.MIG_TOOL_SCRIPT:
+        return [sys.executable, cfg.MIG_TOOL_SCRIPT] + args
+    return [os.path.join(cfg.PENTAHO_DIR, 'Kitchen.bat' if os.name == 'nt' else 'kitchen.sh')] + args
+
+
+def _pump(stream, lines, sink=None):
+    """
+    Read process output line by line as it's produced (optionally copying it into the sink file).
+    :param stream: process output stream
+    :param lines: list collecting decoded lines
+    :param sink: binary file the output is copied to
+    """
+    for line in iter(stream.readline, b''):
+        lines.append(line.decode('utf-8', errors='replace').rstrip('\r\n'))
+        if sink:
+            sink.write(line)
+            sink.flush()
+    stream.close()
+
+
+def _join_pumps(pumps, process):
+    """
+    Wait until the job output is read (KITCHEN_PUMP_TIMEOUT). Output pipes can be held open by orphaned children
+    of the finished or killed job (e.g. Kitchen JVM), they are killed then.
+    :param pumps: output reading threads
+    :param process: job process
+    :return: None
+    """
+    deadline = time.monotonic() + cfg.KITCHEN_PUMP_TIMEOUT
+    for pump in pumps:
+        pump.join(timeout=max(0.0, deadline - time.monotonic()))
+    if any(pump.is_alive() for pump in pumps):
+        logging.warning(msg=f' Job output still open {cfg.KITCHEN_PUMP_TIMEOUT} seconds after the job process exited, '
+                            f'killing its child processes')
+        kill_process_tree(process)
+        for pump in pumps:
+            pump.join(timeout=cfg.KITCHEN_PUMP_TIMEOUT)
+
+
+def run_kitchen_job(cmd, customer_dir, mig_type, job_id, env=None, cwd=None, doslog=None, timeout=None):
+    """
+    Run MigrationTool (Kitchen) job process in its own workspace and follow its logfiles (lib/miglog_handler.py).
+    Job waits for a free job slot, so at most MIG_JOB_CONCURRENCY jobs run concurrently.
+    Job is killed as soon as a fatal Pentaho error appears in MigrationTool{N}.log or .doslog file or when
+    it hangs (lib/watchdog_handler.py).
+    Process output is read as it's produced. If doslog is set (Kitchen launched directly), stderr is copied
+    into it and the job result is given by Kitchen exit code. Otherwise (batch script) any stderr is an error.
+    :param cmd: MigrationTool command
+    :param customer_dir: customer directory
+    :param mig_type: migration type (PDOL, SDOL, MLM, etc..)
+    :param job_id: migration tool job ID (7 for PDOL, 6 for SDOL, 5 for MLM, etc..)
+    :param env: base process environment (robot environment by default)
+    :param cwd: process working directory (job workspace if Kitchen is launched directly, PENTAHO_DIR otherwise)
+    :param doslog: .doslog file path stderr is copied to
+    :param timeout: maximum job duration in seconds (stage timeout from the migration history if None)
+    :return: stdout lines, errors (empty string if the job finished successfully)
+    :rtype: tuple
+    """
+    stdout, stderr = [], []
+    with job_slot(customer_dir), JobWorkspace(customer_dir=customer_dir, job_id=job_id) as workspace:
+        tailer = MigLogTailer(customer_dir=customer_dir, mig_type=mig_type)
+        if doslog:
+            os.makedirs(os.path.dirname(doslog), exist_ok=True)
+        sink = open(doslog, 'ab') if doslog else None
+        try:
+            cwd = cwd or (workspace.path if doslog else cfg.PENTAHO_DIR)
+            process = JobProcess(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=cwd,
+                                 env=workspace.env(base=env))
+            tailer.on_fatal = lambda: kill_process_tree(process)
+            pumps = [threading.Thread(target=_pump, args=(process.stdout, stdout), daemon=True),
+                     threading.Thread(target=_pump, args=(process.stderr, stderr, sink), daemon=True)]
+            # job output and MigrationTool logfiles growth is the job progress:
+            watchdog = Watchdog(process=process, timeout=timeout,
+                                progress=lambda: (len(stdout), len(stderr), sum(tailer.files.values())))
+            with tailer, watchdog:
+                for pump in pumps:
+                    pump.start()
+                code = process.wait()
+                _join_pumps(pumps, process)
+        finally:
+            if sink:
+                sink.close()
+
+    if tailer.fatal:
+        return stdout, f'Fatal MigrationTool error: {tailer.fatal}'
+    if watchdog.expired:
+        return stdout, f'Migration job stopped by the watchdog: {watchdog.expired}'
+    if doslog is None:
+        return stdout, '\n'.join(stderr)
+    if code:
+        details = '\n'.join(stderr[-cfg.KITCHEN_ERROR_LINES:])
+        return stdout, f'Kitchen exit code {code}: {KITCHEN_EXIT_CODES.get(code, "unknown error")}\n{details}'
+    return stdout, ''
@@ -1,11 +1,18 @@
 # REF: stefan.mastilak@visma.com
 
 import config as cfg
-from google.cloud import bigquery
-from google.oauth2 import service_account
-from datetime import datetime
+from datetime import datetime, timezone
 from lib.credentials_handler import get_credentials
+from lib.health_handler import HealthWindow
+from lib.lazy_import import lazy_import
+from lib.local_bigquery import LocalBigQueryClient
+from lib.spool_handler import Spool, SpoolFlusher
+import contextvars
 import logging
+import threading
+
+bigquery = lazy_import('google.cloud.bigquery')
+service_account = lazy_import('google.oauth2.service_account')
 
 
 def _get_secret():
@@ -16,11 +23,46 @@ def _get_secret():
     return get_credentials(item=cfg.GCP_SECRET).get('notes')
 
 
+_CLIENT = None
+_RECONCILED = False  # local health window is reconciled with the monitoring table at most once per run
+_MONITORING_LOCK = threading.Lock()  # health window is shared by concurrently migrated customers
+
+
+def _get_client():
+    """
+    Get BigQuery client shared by all Kpi instances within one robot run.
+    NOTE: Service account credentials are loaded and the client is created only once per process.
+    Local BigQuery stand-in is used instead if KPI_BACKEND is set to 'local' in config.py (tests/benchmarks).
+    :return: BigQuery client
+    """
+    global _CLIENT
+    if _CLIENT is None:
+        if cfg.KPI_BACKEND == 'local':
+            _CLIENT = LocalBigQueryClient()
+        else:
+            credentials = service_account.Credentials.from_service_account_info(_get_secret(), scopes=[cfg.SCOPE])
+            _CLIENT = bigquery.Client(credentials=credentials, project=credentials.project_id)
+    return _CLIENT
+
+
+def _to_utc(date):
+    """
+    Convert local robot datetime to UTC datetime string accepted by BigQuery DATETIME column.
+    NOTE: Runtime server is in the same timezone as Europe/Bratislava (CET/CEST).
+    :param date: local naive datetime
+    :return: UTC datetime string
+    :rtype: str
+    """
+    return datetime.strftime(date.astimezone(timezone.utc), '%Y-%m-%d %H:%M:%S')
+
+
 class Kpi(object):
     """
     Class for Migration robot to communication with AutoMate KPI framework (Google BigQuery database).
     GCP Project: prod-amkpi-cm.
     BigQuery Database: transaction_items_kpi.
+    NOTE: KPI and monitoring entries are written to the local durable spool (lib/spool_handler.py) and shipped
+    to BigQuery in batches by the background flusher, so BigQuery latency or outage never blocks the migration.
     """
     PROCESS = cfg.ID_PROCESS
     ROBOT = cfg.ID_ROBOT
@@ -32,14 +74,42 @@ class Kpi(object):
     HOST = cfg.RUNTIME_HOSTNAME
     MONITORING_TABLE = cfg.TABLE_MONITORING
 
-    def __init__(self):
-        self.credentials = service_account.Credentials.from_service_account_info(_get_secret(), scopes=[Kpi.SCOPE])
-        self.client = bigquery.Client(credentials=self.credentials,
-                                      project=self.credentials.project_id)
+    def __init__(self, client=None, spool=None):
+        """
+        :param client: BigQuery client (shared client created on first use by default)
+        :param spool: Spool instance (SPOOL_FILE in robot root folder by default)
+        """
+        self.client = client
+        self.health = HealthWindow()
+        self.spool = spool or Spool()
+        self.flusher = SpoolFlusher(spool=self.spool, sink=self.__ship)
+        self.flusher.start()
+        self.reconciler = self.__start_reconcile()
+
+    def __get_client(self):
+        """
+        Get BigQuery client (created on first use, so no BigQuery connection is made on the robot thread).
+        :return: BigQuery client
+        """
+        if self.client is None:
+            self.client = _get_client()
+        return self.client
+
+    def __ship(self, table, rows, row_ids):
+        """
+        Spool flusher sink: stream one batch of rows into the BigQuery table.
+        NOTE: Row ids let BigQuery de-duplicate rows shipped again when the response of successful request was lost.
+        :param table: BigQuery table
+        :param rows: list of row dicts
+        :param row_ids: unique row ids (Spool.take)
+        :return: list of errors (empty if successful)
+        :rtype: list
+        """
+        return self.__get_client().insert_rows_json(table, rows, row_ids=row_ids)
 
     def insert(self, start, end, inp, out, status, mark, db_prod=True):
         """
-        Insert into the TRANSACTION_ITEMS table
+        Insert into the TRANSACTION_ITEMS table (entry is spooled locally and shipped in the background).
         :param start: transaction start date
         :param end: transaction end date
         :param inp: transaction input
@@ -48,106 +118,115 @@ class Kpi(object):
         :param mark: transaction mark (SUCCESS, BUSINESS EXCEPTION, APPLICATION EXCEPTION)
         :param db_prod: (True by default) if True - logging into production DB to TRANSACTION_ITEMS table.
                         TEST_TRANSACTION_ITEMS otherwise
-        :return: result
+        :return: spooled row
+        :rtype: dict
         """
         table = Kpi.TABLE_PROD if db_prod else Kpi.TABLE_TEST
-        query = (
-            f'''
-            INSERT INTO `{table}`
-            (
-                ID_PROCESS,
-                ID_ROBOT,
-                ID_QUEUE,
-                ID_CUSTOMER,
-                TIMESTAMP,
-                START_DATE,
-                END_DATE,
-                INPUT,
-                OUTPUT,
-                TRANSACTION_STATUS,
-                MARK
-            )
-            VALUES
-            (
-                "{Kpi.PROCESS}",
-                "{Kpi.ROBOT}",
-                {Kpi.QUEUE},
-                "{Kpi.CUSTOMER}",
-                DATETIME(CURRENT_TIMESTAMP),
-                DATETIME(TIMESTAMP("{datetime.strftime(start, '%Y-%m-%d %H:%M:%S')}", "Europe/Bratislava")),
-                DATETIME(TIMESTAMP("{datetime.strftime(end, '%Y-%m-%d %H:%M:%S')}", "Europe/Bratislava")),
-                "{inp}",
-                "{out}",
-                "{status}",
-                "{mark}"
-            )
-            '''
-        )
+        row = {
+            'ID_PROCESS': Kpi.PROCESS,
+            'ID_ROBOT': Kpi.ROBOT,
+            'ID_QUEUE': Kpi.QUEUE,
+            'ID_CUSTOMER': Kpi.CUSTOMER,
+            'TIMESTAMP': _to_utc(datetime.now()),
+            'START_DATE': _to_utc(start),
+            'END_DATE': _to_utc(end),
+            'INPUT': inp,
+            'OUTPUT': out,
+            'TRANSACTION_STATUS': status,
+            'MARK': mark,
+        }
+        self.spool.put(target=table, row=row)
+        logging.info(msg=f' New entry spooled for KPI {table.split(".")[-1] if "." in table else table} table')
+        return row
 
-        result = self.client.query(query)
-        result.result()
-        if result.errors:
-            logging.critical(msg=f' KPI framework error: BiqQuery Exception: {result.errors}')
-            raise Exception(f' KPI framework error: BiqQuery Exception: {result.errors}')
-        logging.info(msg=f' New entry added to KPI {table.split(".")[-1] if "." in table else table} table')
-        return result
+    def flush(self, timeout=cfg.SPOOL_DRAIN_TIMEOUT):
+        """
+        Wait until all spooled entries are shipped to BigQuery.
+        NOTE: Entries which couldn't be shipped stay in the spool and are shipped during the next robot run.
+        :param timeout: maximum waiting time in seconds
+        :return: True if the spool is empty
+        :rtype: bool
+        """
+        if self.flusher.drain(timeout=timeout):
+            logging.info(msg=f' All KPI entries shipped to BigQuery')
+            return True
+        logging.warning(msg=f' {self.spool.pending()} KPI entries left in the spool - will be shipped in the next run')
+        return False
 
-    def __get_last_health(self):
+    def __get_last_statuses(self):
         """
-        Helper for getting last health and status from monitoring table.
-        :return: Health
+        Helper for getting last statuses from monitoring table.
+        :return: statuses (latest first)
+        :rtype: list
         """
-        last_health = 0
         query = (
             f'''
             SELECT STATUS, HEALTH
             FROM `{Kpi.MONITORING_TABLE}`
             WHERE ID_PROCESS = "{Kpi.PROCESS}" 
-            ORDER BY JOB_FINISHED DESC LIMIT 9
+            ORDER BY JOB_FINISHED DESC LIMIT {cfg.HEALTH_WINDOW}
             '''
         )
-        bq_result = self.client.query(query)
-        for row in bq_result.result():
-            if row.get("STATUS") in ('green', "GREEN"):
-                last_health += 1
-        return last_health
+        bq_result = self.__get_client().query(query)
+        return [row.get('STATUS') for row in bq_result.result()]
+
+    def __start_reconcile(self):
+        """
+        Start reconciliation of the local health window with the monitoring table in the background thread
+        if the local state is missing or outdated (at most once per run).
+        :return: reconciling thread or None
+        """
+        global _RECONCILED
+        with _MONITORING_LOCK:
+            if _RECONCILED or not self.health.needs_reconcile():
+                return None
+            _RECONCILED = True
+        reconciler = threading.Thread(target=contextvars.copy_context().run, args=(self.__reconcile,),
+                                      name='health-reconcile', daemon=True)
+        reconciler.start()
+        return reconciler
+
+    def __reconcile(self):
+        with _MONITORING_LOCK:
+            since = self.health.recorded
+        try:
+            statuses = self.__get_last_statuses()
+        except Exception as err:
+            logging.warning(msg=f' Health reconciliation failed, using local health state. Error: {err}')
+            return
+        with _MONITORING_LOCK:
+            # statuses recorded during the query are kept on top of the fetched ones:
+            self.health.reconcile(statuses=statuses, since=since)
 
     def insert_to_monitoring(self, start, status):
         """
-        Insert into the monitoring table
+        Insert into the monitoring table.
+        NOTE: HEALTH is computed from the local health window (lib/health_handler.py). The window is reconciled
+        with the monitoring table in the background (see __start_reconcile), running reconciliation is awaited
+        for HEALTH_RECONCILE_TIMEOUT (config.py) at most, no BigQuery query is made here.
         :param start: transaction start date
         :param status: transaction status
         """
-        query = (
-            f'''
-                INSERT INTO `{Kpi.MONITORING_TABLE}`
-                (
-                    ID_PROCESS,
-                    HOST,
-                    STATUS,
-                    JOB_DURATION,
-                    JOB_START,
-                    JOB_FINISHED,
-                    HEALTH
-                )
-                VALUES
-                (
-                   "{Kpi.PROCESS}",
-                   "{Kpi.HOST}",
-                   "{status}",
-                    {(datetime.now() - start).seconds},
-                    "{start}",
-                    "{datetime.now()}",
-                    {self.__get_last_health() +1 if status.lower() == 'green' else self.__get_last_health() +0}
-                )
-                ''')
-
-        result = self.client.query(query)
-        result.result()
-        if result.errors:
-            logging.critical(msg=f' Monitoring error: BiqQuery Exception: {result.errors}')
-            raise Exception(f' Monitoring error: BiqQuery Exception: {result.errors}')
+        if self.reconciler and self.reconciler.is_alive():
+            self.reconciler.join(timeout=cfg.HEALTH_RECONCILE_TIMEOUT)
+            if self.reconciler.is_alive():
+                logging.warning(msg=f' Health reconciliation not finished in {cfg.HEALTH_RECONCILE_TIMEOUT} seconds, '
+                                    f'using local health state')
+        with _MONITORING_LOCK:
+            finished = datetime.now()
+            row = {
+                'ID_PROCESS': Kpi.PROCESS,
+                'HOST': Kpi.HOST,
+                'STATUS': status,
+                'JOB_DURATION': (finished - start).seconds,
+                'JOB_START': str(start),
+                'JOB_FINISHED': str(finished),
+                'HEALTH': self.health.health(status=status),
+            }
+
+            self.spool.put(target=Kpi.MONITORING_TABLE, row=row)
+            self.health.record(status=status)
         logging.info(
-            msg=f' New entry added to monitoring table {Kpi.MONITORING_TABLE.split(".")[-1] if "." in Kpi.MONITORING_TABLE else Kpi.MONITORING_TABLE} table')
+            msg=f' New entry spooled for monitoring table {Kpi.MONITORING_TABLE.split(".")[-1] if "." in Kpi.MONITORING_TABLE else Kpi.MONITORING_TABLE} table')
         logging.info(msg=f' Monitoring table updated with new status: {status}')
-        return result
+        return row
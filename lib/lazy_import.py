@@ -0,0 +1,47 @@
+# REF: stefan.mastilak@visma.com
+
+import importlib
+import threading
+import types
+
+
+class LazyModule(types.ModuleType):
+    """
+    Module placeholder importing the real module on the first attribute access.
+    It's used for heavy dependencies (BigQuery, Slack, SFTP, ...) so they don't slow down the robot start,
+    especially when there is nothing to migrate.
+    """
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__['_lazy_module'] = None
+        self.__dict__['_lazy_lock'] = threading.Lock()
+
+    def _load(self):
+        """
+        Import the real module (only once, also when accessed from more threads at the same time).
+        :return: imported module
+        """
+        module = self.__dict__['_lazy_module']
+        if module is None:
+            with self.__dict__['_lazy_lock']:
+                module = self.__dict__['_lazy_module']
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__['_lazy_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_import(name):
+    """
+    Get module which is imported on its first use.
+    :param name: full module name (e.g. 'google.cloud.bigquery')
+    :return: lazy module
+    """
+    return LazyModule(name)
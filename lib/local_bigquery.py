@@ -0,0 +1,90 @@
+# REF: stefan.mastilak@visma.com
+
+import json
+import os
+import threading
+import time
+
+
+class _QueryJob(object):
+    """
+    Finished query job returned by LocalBigQueryClient.query().
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.errors = None
+
+    def result(self):
+        return self.rows
+
+
+class LocalBigQueryClient(object):
+    """
+    Local stand-in for google.cloud.bigquery.Client used by the KPI handler in tests and benchmarks.
+    Only insert_rows_json() and the monitoring query used by Kpi are supported.
+    Rows are kept in memory and optionally appended to <path>/<table>.jsonl files.
+    """
+
+    def __init__(self, path=None, latency=0.0, fail_times=0, invalid=None):
+        """
+        :param path: folder for the jsonl table files (rows are kept only in memory if None)
+        :param latency: simulated request latency in seconds
+        :param fail_times: number of first insert requests which fail (for testing retries)
+        :param invalid: optional callable(row) returning True for rows rejected as invalid (for testing rejections)
+        """
+        self.path = path
+        self.latency = latency
+        self.fail_times = fail_times
+        self.invalid = invalid
+        self.tables = {}
+        self.row_ids = set()
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def insert_rows_json(self, table, json_rows, row_ids=None):
+        """
+        Insert rows into the local table (like BigQuery streaming insert: whole request fails if any row is
+        invalid, rows with already inserted row id are skipped).
+        :param table: table name
+        :param json_rows: list of row dicts
+        :param row_ids: optional row ids for de-duplication
+        :return: list of errors (empty if successful)
+        :rtype: list
+        """
+        time.sleep(self.latency)
+        with self.lock:
+            self.requests += 1
+            if self.fail_times:
+                self.fail_times -= 1
+                return [{'index': 0, 'errors': [{'reason': 'backendError', 'message': 'Simulated failure'}]}]
+            if self.invalid:
+                invalid = {i for i, row in enumerate(json_rows) if self.invalid(row)}
+                if invalid:
+                    return [{'index': i, 'errors': [{'reason': 'invalid', 'message': 'Simulated invalid row'}
+                                                    if i in invalid else {'reason': 'stopped', 'message': ''}]}
+                            for i in range(len(json_rows))]
+            if row_ids:
+                json_rows = [row for row, row_id in zip(json_rows, row_ids) if row_id not in self.row_ids]
+                self.row_ids.update(row_ids)
+            self.tables.setdefault(table, []).extend(json_rows)
+            if self.path:
+                with open(os.path.join(self.path, f'{table}.jsonl'), 'a', encoding='utf-8') as table_file:
+                    for row in json_rows:
+                        table_file.write(json.dumps(row) + '\n')
+        return []
+
+    def query(self, query):
+        """
+        Run query against the local tables.
+        NOTE: Only "latest rows of a table" queries are supported (rows are returned latest first).
+        :param query: SQL query
+        :return: finished query job
+        """
+        time.sleep(self.latency)
+        with self.lock:
+            self.requests += 1
+            for table, rows in self.tables.items():
+                if f'`{table}`' in query:
+                    return _QueryJob(rows=list(reversed(rows)))
+        return _QueryJob(rows=[])
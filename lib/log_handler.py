@@ -0,0 +1,246 @@
+# REF: stefan.mastilak@visma.com
+
+import atexit
+import config as cfg
+import gzip
+import json
+import logging
+import os
+import queue
+import re
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+_CUSTOMER_DIR = ContextVar('customer_dir', default=None)
+_STAGE = ContextVar('stage', default=None)
+_MIG_TYPE = None  # one migration type per robot run (shared by background threads)
+_LISTENER = None
+
+
+def set_log_context(customer_dir=None, mig_type=None):
+    """
+    Set customer directory and migration type logged with all following records of the current context.
+    :param customer_dir: customer directory (None outside customer migration)
+    :param mig_type: migration type (PDOL, SDOL, MLM, etc..), unchanged if None
+    :return: None
+    """
+    global _MIG_TYPE
+    _CUSTOMER_DIR.set(customer_dir)
+    if mig_type:
+        _MIG_TYPE = mig_type
+
+
+@contextmanager
+def log_stage(stage):
+    """
+    Log all records inside the with block with the migration stage name.
+    :param stage: stage name
+    """
+    token = _STAGE.set(stage)
+    try:
+        yield
+    finally:
+        _STAGE.reset(token)
+
+
+def get_log_stage():
+    """
+    Get migration stage of the current context.
+    :return: stage name (None outside migration stage)
+    :rtype: str
+    """
+    return _STAGE.get()
+
+
+class ContextFilter(logging.Filter):
+    """
+    Add customer_dir, mig_type and stage of the current context to log records.
+    NOTE: It's attached to the QueueHandler, so the context is captured on the logging thread, not on the listener.
+    """
+
+    def filter(self, record):
+        record.customer_dir = _CUSTOMER_DIR.get()
+        record.mig_type = _MIG_TYPE
+        record.stage = _STAGE.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format log records as JSON lines.
+    """
+
+    def format(self, record):
+        entry = {'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+                 'level': record.levelname,
+                 'logger': record.name,
+                 'thread': record.threadName,
+                 'customer_dir': getattr(record, 'customer_dir', None),
+                 'mig_type': getattr(record, 'mig_type', None),
+                 'stage': getattr(record, 'stage', None),
+                 'msg': record.getMessage().strip()}
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class CustomerFileHandler(logging.Handler):
+    """
+    Write records of customer migrations into per-customer logfiles (<log_dir>/<customer_dir>.log).
+    Only LOG_CUSTOMER_MAX_OPEN (config.py) logfiles are kept open, the least recently used ones are closed.
+    """
+
+    def __init__(self, log_dir, max_open=cfg.LOG_CUSTOMER_MAX_OPEN):
+        """
+        :param log_dir: per-customer logfiles folder
+        :param max_open: maximum number of open logfiles
+        """
+        super().__init__()
+        self.log_dir = log_dir
+        self.max_open = max_open
+        self.streams = OrderedDict()
+        os.makedirs(log_dir, exist_ok=True)
+
+    def __get_stream(self, customer_dir):
+        stream = self.streams.pop(customer_dir, None)
+        if stream is None:
+            name = re.sub(r'[^\w.-]', '_', customer_dir)
+            stream = open(os.path.join(self.log_dir, f'{name}.log'), 'a', encoding='utf-8')
+            while len(self.streams) >= self.max_open:
+                self.streams.popitem(last=False)[1].close()
+        self.streams[customer_dir] = stream
+        return stream
+
+    def emit(self, record):
+        customer_dir = getattr(record, 'customer_dir', None)
+        if not customer_dir:
+            return
+        try:
+            stream = self.__get_stream(customer_dir)
+            stream.write(self.format(record) + '\n')
+            stream.flush()
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        for stream in self.streams.values():
+            stream.close()
+        self.streams.clear()
+        super().close()
+
+
+def setup_logging(logfile, mig_type, level=logging.INFO):
+    """
+    Configure non-blocking robot logging. All records are put into the in-memory queue by the logging thread and
+    written by the background listener into:
+     1) legacy text logfile (uploaded to Slack, same format as before).
+     2) JSON lines logfile with customer_dir, mig_type and stage of every record (config.py - LOG_JSON_FILE).
+     3) per-customer text logfiles (config.py - LOG_CUSTOMER_DIR).
+    :param logfile: robot logfile path
+    :param mig_type: migration type (PDOL, SDOL, MLM, etc..)
+    :param level: logging level
+    :return: queue listener
+    :rtype: QueueListener
+    """
+    global _LISTENER
+    stop_logging()
+    set_log_context(customer_dir=None, mig_type=mig_type)
+
+    text_handler = logging.FileHandler(logfile, mode='w', encoding='utf-8')
+    text_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    json_handler = logging.FileHandler(os.path.join(cfg.ROOT_DIR, cfg.LOG_JSON_FILE.format(mig_type.lower())),
+                                       mode='w', encoding='utf-8')
+    json_handler.setFormatter(JsonFormatter())
+    customer_handler = CustomerFileHandler(os.path.join(cfg.ROOT_DIR, cfg.LOG_CUSTOMER_DIR.format(mig_type.lower())))
+    customer_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s:%(message)s'))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))  # records are formatted by listener handlers
+    queue_handler.addFilter(ContextFilter())
+    logging.basicConfig(handlers=[queue_handler], level=level, force=True)
+
+    _LISTENER = QueueListener(log_queue, text_handler, json_handler, customer_handler)
+    _LISTENER.start()
+    return _LISTENER
+
+
+def flush_logging():
+    """
+    Wait until all queued log records are written (restarts the queue listener).
+    :return: None
+    """
+    if _LISTENER:
+        _LISTENER.stop()
+        _LISTENER.start()
+    for handler in logging.getLogger().handlers:
+        handler.flush()
+
+
+@atexit.register
+def stop_logging():
+    """
+    Write all queued log records and close robot logfiles.
+    :return: None
+    """
+    global _LISTENER
+    if _LISTENER:
+        _LISTENER.stop()
+        for handler in _LISTENER.handlers:
+            handler.close()
+        _LISTENER = None
+
+
+def _error_digest(logfile):
+    """
+    Extract CRITICAL, ERROR and WARNING lines from the robot logfile (duplicates skipped).
+    :param logfile: robot logfile path
+    :return: digest lines
+    :rtype: list
+    """
+    digest = []
+    seen = set()
+    with open(logfile, encoding='utf-8', errors='replace') as log:
+        for line in log:
+            if line.startswith(('CRITICAL:', 'ERROR:', 'WARNING:')) and line not in seen:
+                seen.add(line)
+                digest.append(line)
+                if len(digest) >= cfg.LOG_DIGEST_LINES:
+                    digest.append(f'... digest limited to {cfg.LOG_DIGEST_LINES} lines\n')
+                    break
+    return digest
+
+
+def compact_log(logfile, max_bytes=cfg.LOG_UPLOAD_MAX_BYTES):
+    """
+    Create compact gzip artefact of the robot logfile for uploading to Slack.
+    It contains error digest (CRITICAL/ERROR/WARNING lines) followed by the log itself. If the log is larger
+    than max_bytes, only its head and tail are included (half of max_bytes each).
+    :param logfile: robot logfile path
+    :param max_bytes: maximum size of the included log content (uncompressed)
+    :return: gzip file path
+    :rtype: str
+    """
+    flush_logging()
+
+    size = os.path.getsize(logfile)
+    artefact = f'{logfile}.gz'
+    digest = _error_digest(logfile)
+
+    with open(logfile, 'rb') as log, gzip.open(artefact, 'wb') as out:
+        out.write(f'=== ERROR DIGEST ({len(digest)} lines) ===\n'.encode('utf-8'))
+        out.write(''.join(digest).encode('utf-8') if digest else b'None\n')
+        out.write(b'\n=== LOG ===\n')
+        if size <= max_bytes:
+            out.write(log.read())
+        else:
+            out.write(log.read(max_bytes // 2))
+            out.write(f'\n\n... {size - 2 * (max_bytes // 2)} bytes skipped ...\n\n'.encode('utf-8'))
+            log.seek(size - max_bytes // 2)
+            out.write(log.read())
+
+    logging.info(msg=f' Logfile compacted for upload: {size} bytes >> {os.path.getsize(artefact)} bytes')
+    return artefact
@@ -0,0 +1,215 @@
+# REF: stefan.mastilak@visma.com
+
+import bisect
+import config as cfg
+import json
+import logging
+import os
+import threading
+import time
+
+_HELP = {
+    'robot_stage_duration_seconds': 'Wall time of migration stages',
+    'robot_stage_files_total': 'Files processed by migration stages (extracted, indexed, moved, zipped, uploaded, cleaned up)',
+    'robot_stage_bytes_total': 'Bytes processed by migration stages (unpacked, zipped, uploaded, cleaned up)',
+    'robot_stage_outcomes_total': 'Migration stage outcomes (ok, failed, error)',
+    'robot_rename_retries_total': 'Rename retries blocked by open handles (dossier, customer folders, moves)',
+    'robot_sftp_connects_total': 'SFTP connection attempts',
+    'robot_sftp_connect_failures_total': 'Failed SFTP connection attempts',
+    'robot_customers_total': 'Processed customer folders by result',
+    'robot_disk_admissions_total': 'Disk space admissions of customers by result (admitted, deferred, rejected)',
+    'robot_watchdog_kills_total': 'Subprocesses killed by the watchdog by stage and reason (timeout, stall)',
+    'robot_metrics_timestamp_seconds': 'Unix time of the last metrics snapshot',
+}
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels):
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}' if labels else ''
+
+
+class Metrics(object):
+    """
+    Thread-safe registry of counters and histograms of one robot run.
+    """
+
+    def __init__(self, buckets=cfg.METRICS_BUCKETS):
+        """
+        :param buckets: histogram bucket upper bounds (ascending)
+        """
+        self.buckets = tuple(buckets)
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        """
+        Increase counter.
+        :param name: counter name
+        :param value: increment
+        :param labels: counter labels
+        """
+        key = (name, _label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """
+        Record value into histogram.
+        :param name: histogram name
+        :param value: observed value
+        :param labels: histogram labels
+        """
+        key = (name, _label_key(labels))
+        with self.lock:
+            hist = self.histograms.setdefault(key, {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0})
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                hist['buckets'][index] += 1
+            hist['sum'] += value
+            hist['count'] += 1
+
+    def snapshot(self):
+        """
+        Get JSON serializable snapshot of all metrics.
+        :return: snapshot dict
+        :rtype: dict
+        """
+        with self.lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self.counters.items())]
+            histograms = [{'name': name, 'labels': dict(labels), 'buckets': dict(zip(self.buckets, hist['buckets'])),
+                           'sum': round(hist['sum'], 3), 'count': hist['count']}
+                          for (name, labels), hist in sorted(self.histograms.items())]
+        return {'timestamp': time.time(), 'counters': counters, 'histograms': histograms}
+
+    def to_prometheus(self, **const_labels):
+        """
+        Render all metrics in Prometheus text exposition format (node_exporter textfile collector).
+        :param const_labels: labels added to every sample
+        :return: Prometheus textfile content
+        :rtype: str
+        """
+        const = _label_key(const_labels)
+        lines = []
+        written = set()
+
+        def header(name, kind):
+            if name not in written:
+                written.add(name)
+                lines.append(f'# HELP {name} {_HELP.get(name, name)}')
+                lines.append(f'# TYPE {name} {kind}')
+
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                header(name, 'counter')
+                lines.append(f'{name}{_format_labels(const + labels)} {value}')
+            for (name, labels), hist in sorted(self.histograms.items()):
+                header(name, 'histogram')
+                cumulative = 0
+                for bound, count in zip(self.buckets, hist['buckets']):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_format_labels(const + labels + (("le", str(bound)),))} {cumulative}')
+                lines.append(f'{name}_bucket{_format_labels(const + labels + (("le", "+Inf"),))} {hist["count"]}')
+                lines.append(f'{name}_sum{_format_labels(const + labels)} {round(hist["sum"], 3)}')
+                lines.append(f'{name}_count{_format_labels(const + labels)} {hist["count"]}')
+
+        header('robot_metrics_timestamp_seconds', 'gauge')
+        lines.append(f'robot_metrics_timestamp_seconds{_format_labels(const)} {int(time.time())}')
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics()  # registry shared by the whole robot run
+
+
+def inc(name, value=1, **labels):
+    """
+    Increase counter in the robot run registry.
+    :param name: counter name
+    :param value: increment
+    :param labels: counter labels
+    """
+    METRICS.inc(name, value, **labels)
+
+
+def observe(name, value, **labels):
+    """
+    Record value into histogram of the robot run registry.
+    :param name: histogram name
+    :param value: observed value
+    :param labels: histogram labels
+    """
+    METRICS.observe(name, value, **labels)
+
+
+def _write_atomic(path, content):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as tmp_file:
+        tmp_file.write(content)
+    os.replace(tmp_path, path)
+
+
+def write_metrics(mig_type, metrics=METRICS):
+    """
+    Write Prometheus textfile and JSON snapshot of the robot run metrics (config.py - METRICS_PROM_FILE,
+    METRICS_JSON_FILE). Files are replaced atomically so the collector never reads partial content.
+    :param mig_type: migration type (PDOL, SDOL, MLM, etc..)
+    :param metrics: metrics registry
+    :return: Prometheus textfile path
+    :rtype: str
+    """
+    prom_path = os.path.join(cfg.METRICS_DIR or cfg.ROOT_DIR, cfg.METRICS_PROM_FILE.format(mig_type.lower()))
+    json_path = os.path.join(cfg.ROOT_DIR, cfg.METRICS_JSON_FILE.format(mig_type.lower()))
+    snapshot = metrics.snapshot()
+    snapshot['mig_type'] = mig_type
+    _write_atomic(prom_path, metrics.to_prometheus(mig_type=mig_type, host=cfg.RUNTIME_HOSTNAME))
+    _write_atomic(json_path, json.dumps(snapshot, indent=2))
+    return prom_path
+
+
+class MetricsWriter(threading.Thread):
+    """
+    Background writer of metrics snapshots during long robot runs (every METRICS_INTERVAL seconds).
+    Final snapshot is written by stop() at the end of the run.
+    """
+
+    def __init__(self, mig_type, interval=cfg.METRICS_INTERVAL, metrics=METRICS):
+        """
+        :param mig_type: migration type (PDOL, SDOL, MLM, etc..)
+        :param interval: snapshot interval in seconds
+        :param metrics: metrics registry
+        """
+        super().__init__(name='metrics-writer', daemon=True)
+        self.mig_type = mig_type
+        self.interval = interval
+        self.metrics = metrics
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+
+    def __write(self):
+        try:
+            with self.lock:
+                return write_metrics(mig_type=self.mig_type, metrics=self.metrics)
+        except OSError as err:
+            logging.warning(msg=f' Unable to write metrics. Error: {err}')
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.__write()
+
+    def stop(self):
+        """
+        Stop the writer and write the final metrics snapshot.
+        :return: Prometheus textfile path
+        :rtype: str
+        """
+        self.stopped.set()
+        if self.is_alive():
+            self.join(timeout=self.interval)
+        path = self.__write()
+        if path:
+            logging.info(msg=f' Metrics written to {path}')
+        return path
@@ -0,0 +1,168 @@
+# REF: stefan.mastilak@visma.com
+
+import config as cfg
+import contextvars
+import logging
+import os
+import re
+import signal
+import subprocess
+import threading
+import time
+from datetime import datetime
+
+_LINE = re.compile(r'^(\d{4}/\d{2}/\d{2} \d{2}:\d{2}:\d{2}) - (.+?) - (.*)$')
+_ROWS = re.compile(r'linenr (\d+)')
+_FINISHED = re.compile(r'Finished processing \((.*)\)')
+
+
+class JobProcess(subprocess.Popen):
+    """
+    Subprocess started in its own process group (new session outside Windows), so kill_process_tree kills its
+    children too (e.g. Kitchen JVM started by kitchen.sh), even when the process itself has already exited.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, start_new_session=os.name != 'nt', **kwargs)
+
+
+def _kill_children(pid):
+    """
+    Kill child processes of the process (psutil if it's installed, best effort only).
+    :param pid: process id
+    :return: None
+    """
+    try:
+        import psutil
+    except ImportError:
+        return
+    try:
+        children = psutil.Process(pid).children(recursive=True)
+    except psutil.Error:
+        return
+    for child in children:
+        try:
+            child.kill()
+        except psutil.Error:
+            continue
+
+
+def kill_process_tree(process):
+    """
+    Kill the process including its children (Kitchen JVM started by the batch script or kitchen.sh).
+    Process group of JobProcess is killed outside Windows. Otherwise taskkill is used on Windows and children
+    are killed through psutil if it fails (or outside Windows).
+    :param process: Popen instance
+    :return: None
+    """
+    if os.name != 'nt' and isinstance(process, JobProcess):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except OSError:
+            pass  # no process of the group is running
+        return
+    if process.poll() is not None:
+        return
+    if os.name == 'nt':
+        result = subprocess.run(['taskkill', '/F', '/T', '/PID', str(process.pid)],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if not result.returncode:
+            return
+        logging.warning(msg=f' taskkill of process {process.pid} failed with exit code {result.returncode}')
+    _kill_children(process.pid)
+    try:
+        process.kill()
+    except OSError:
+        pass
+
+
+class MigLogTailer(threading.Thread):
+    """
+    Follow MigrationTool{N}.log and .doslog files of the running migration job (customer 'Log' folder).
+    Progress (rows processed, finished steps with their duration) is streamed into the robot log and
+    fatal Pentaho errors (config.py - MIG_LOG_FATAL_PATTERNS) are reported as soon as they appear.
+    NOTE: Only lines written after the tailer was created are considered (logfiles are appended by every run).
+    """
+
+    def __init__(self, customer_dir, mig_type, on_fatal=None):
+        """
+        :param customer_dir: customer directory
+        :param mig_type: migration type (PDOL, SDOL, MLM, etc..)
+        :param on_fatal: callable executed once on the first fatal error (e.g. killing the job)
+        """
+        super().__init__(name=f'miglog-{customer_dir}', daemon=True)
+        log_dir = os.path.join(cfg.MIG_ROOT, customer_dir, 'Log')
+        self.files = {os.path.join(log_dir, getattr(cfg, f'MIG_LOG_{mig_type}')): None,
+                      os.path.join(log_dir, getattr(cfg, f'MIG_DOSLOG_{mig_type}')): None}
+        for path in self.files:
+            self.files[path] = os.path.getsize(path) if os.path.isfile(path) else 0
+        self.partial = dict.fromkeys(self.files, b'')
+        self.fatal_patterns = [re.compile(i) for i in cfg.MIG_LOG_FATAL_PATTERNS]
+        self.on_fatal = on_fatal
+        self.fatal = None
+        self.steps = {}
+        self.last_progress = 0.0
+        self.stopped = threading.Event()
+        self.context = contextvars.copy_context()  # customer log context of the calling thread
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def run(self):
+        self.context.run(self.__follow)
+
+    def stop(self):
+        """Stop following and process the rest of the logfiles."""
+        self.stopped.set()
+        if self.is_alive():
+            self.join(timeout=30)
+
+    def __follow(self):
+        while not self.stopped.wait(cfg.MIG_LOG_POLL_INTERVAL):
+            self.__read()
+        self.__read()
+
+    def __read(self):
+        for path, offset in self.files.items():
+            try:
+                if not os.path.isfile(path) or os.path.getsize(path) <= offset:
+                    continue
+                with open(path, 'rb') as log:
+                    log.seek(offset)
+                    data = self.partial[path] + log.read()
+                    self.files[path] = log.tell()
+            except OSError:
+                continue
+            *lines, self.partial[path] = data.split(b'\n')
+            for line in lines:
+                self.__parse(line.decode('utf-8', errors='replace').rstrip('\r'))
+
+    def __parse(self, line):
+        if not self.fatal and any(p.search(line) for p in self.fatal_patterns):
+            self.fatal = line.strip()
+            logging.critical(msg=f' Fatal MigrationTool error: {self.fatal}')
+            if self.on_fatal:
+                logging.critical(msg=f' Stopping the migration job')
+                self.on_fatal()
+            return
+
+        match = _LINE.match(line)
+        if not match:
+            return
+        stamp, step, msg = match.groups()
+        stamp = datetime.strptime(stamp, '%Y/%m/%d %H:%M:%S')
+        started = self.steps.setdefault(step, stamp)
+
+        finished = _FINISHED.search(msg)
+        if finished:
+            logging.info(msg=f' MigrationTool step {step} finished in {(stamp - started).seconds}s '
+                             f'({finished.group(1)})')
+            return
+        rows = _ROWS.search(msg)
+        if rows and time.monotonic() - self.last_progress >= cfg.MIG_LOG_PROGRESS_INTERVAL:
+            self.last_progress = time.monotonic()
+            logging.info(msg=f' MigrationTool progress: {step} - {rows.group(1)} rows processed')
@@ -0,0 +1,148 @@
+# REF: stefan.mastilak@visma.com
+
+import config as cfg
+import errno
+import logging
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from lib.cleanup_handler import remove_empty_tree
+from lib.rename_handler import rename_path
+
+
+def _tree_stats(path):
+    """
+    Get files count and size of the file or folder (including its sub-folders).
+    :param path: file or folder path
+    :return: (files, bytes)
+    :rtype: tuple
+    """
+    if not os.path.isdir(path):
+        return 1, os.path.getsize(path)
+    files, size = 0, 0
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                sub_files, sub_size = _tree_stats(entry.path)
+                files += sub_files
+                size += sub_size
+            else:
+                files += 1
+                size += entry.stat(follow_symlinks=False).st_size
+    return files, size
+
+
+def _copy_tasks(src, dst):
+    """
+    Create destination folders of the cross-volume move and get its file copies.
+    :param src: source file or folder
+    :param dst: destination file or folder
+    :return: [(source file, destination file), ...]
+    :rtype: list
+    """
+    if not os.path.isdir(src):
+        return [(src, dst)]
+    tasks = []
+    for root, dirs, files in os.walk(src):
+        target = os.path.join(dst, os.path.relpath(root, src))
+        os.makedirs(target, exist_ok=True)
+        tasks.extend((os.path.join(root, name), os.path.join(target, name)) for name in files)
+    return tasks
+
+
+def _remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+def check_collisions(moves):
+    """
+    Check that no destination is used twice.
+    NOTE: Existing destinations are not collisions (re-run of partially moved customer), files are overwritten
+    and folders merged (_merge_tasks).
+    :param moves: [(source, destination), ...]
+    :return: None
+    """
+    targets = {}
+    for src, dst in moves:
+        key = os.path.normcase(os.path.abspath(dst))
+        if key in targets:
+            logging.critical(msg=f' Move collision: {src} and {targets[key]} have the same destination {dst}')
+            raise FileExistsError(f' Move collision: {src} and {targets[key]} have the same destination {dst}')
+        targets[key] = src
+
+
+def _merge_tasks(src, dst):
+    """
+    Get moves of the folder merged into already existing destination folder (files of the folder tree one by one,
+    existing destination files are overwritten). Other moves are kept as they are.
+    :param src: source file or folder
+    :param dst: destination file or folder
+    :return: [(source, destination), ...]
+    :rtype: list
+    """
+    if os.path.isdir(src) and os.path.isdir(dst):
+        return _copy_tasks(src, dst)
+    return [(src, dst)]
+
+
+def bulk_move(moves, workers=None, verify=True):
+    """
+    Move files and folders (config.py - MOVE_WORKERS).
+    Moves are renamed in place by the thread pool first (atomic metadata operation for whole folders on the same
+    volume). Moves crossing the volumes are copied file by file by the thread pool, verified and only then their
+    sources are removed.
+    Destinations are checked for collisions before anything is moved (check_collisions). Existing destination files
+    are overwritten (like by shutil.move) and folders moved onto existing folders are merged into them file by file,
+    so moving can be repeated after partially finished run.
+    :param moves: [(source, destination), ...] (destination is full target path, not its parent folder)
+    :param workers: number of threads (MOVE_WORKERS by default)
+    :param verify: True to compare files count and bytes of the sources and destinations
+    :return: (files, bytes) moved
+    :rtype: tuple
+    """
+    moves = list(moves)
+    check_collisions(moves)
+    merged = [src for src, dst in moves if os.path.isdir(src) and os.path.isdir(dst)]
+    if merged:
+        logging.warning(msg=f' {len(merged)} destination folders already exist, merging into them')
+    moves = [task for src, dst in moves for task in _merge_tasks(src, dst)]
+    expected = [_tree_stats(src) for src, _ in moves] if verify else []
+    workers = max(1, workers or cfg.MOVE_WORKERS)
+
+    def rename(move):
+        try:
+            rename_path(src=move[0], dst=move[1], folder='move', overwrite=True)
+        except OSError as err:
+            if err.errno != errno.EXDEV:
+                logging.critical(msg=f' Moving of {move[0]} failed. Error: {err}')
+                raise
+            return move  # different volume, copied later
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='move') as pool:
+        cross_volume = [move for move in pool.map(rename, moves) if move]
+
+        if cross_volume:
+            logging.info(msg=f' Copying {len(cross_volume)} items to different volume by {workers} threads')
+            tasks = [task for src, dst in cross_volume for task in _copy_tasks(src, dst)]
+            for _ in pool.map(lambda task: shutil.copy2(*task), tasks):
+                pass
+
+    if verify:
+        files = sum(i[0] for i in expected)
+        size = sum(i[1] for i in expected)
+        moved = [_tree_stats(dst) for _, dst in moves]
+        if (sum(i[0] for i in moved), sum(i[1] for i in moved)) != (files, size):
+            logging.critical(msg=f' Checksum failed: {files} files ({size} bytes) expected, '
+                                 f'{sum(i[0] for i in moved)} files ({sum(i[1] for i in moved)} bytes) moved')
+            raise AssertionError(f' Checksum failed: moved files count or size differs from the source')
+    else:
+        files, size = None, None
+
+    for src, _ in cross_volume:
+        _remove(src)
+    for src in merged:
+        remove_empty_tree(src)
+    return files, size
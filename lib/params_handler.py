@@ -0,0 +1,162 @@
+# REF: stefan.mastilak@visma.com
+
+import logging
+import os
+import re
+import threading
+from typing import Any, Dict, NamedTuple, Optional
+from lib.lazy_import import lazy_import
+
+openpyxl = lazy_import('openpyxl')
+
+_CACHE = {}  # {parameters file path: (modification time, Parameters)}
+_CACHE_LOCK = threading.Lock()
+
+
+class ParametersRow(NamedTuple):
+    """
+    One row of the parameters file (known columns are matched case-insensitively, like 'CustomerID').
+    """
+    customer_id: Optional[str]  # CustomerID column
+    target_path: Optional[str]  # TargetPath column
+    values: Dict[str, Any]  # all columns of the row {column name: value}
+
+
+def _column_key(name):
+    """
+    Normalize column name for matching of the known columns ('Customer ID' >> 'customerid').
+    :param name: column name
+    :return: normalized column name
+    :rtype: str
+    """
+    return re.sub(r'[^a-z0-9]', '', name.lower())
+
+
+def _text(value):
+    """
+    Convert cell value to stripped text.
+    :param value: cell value
+    :return: text or None for empty cells
+    :rtype: str
+    """
+    if value is None:
+        return None
+    return str(value).strip() or None
+
+
+class Parameters(object):
+    """
+    Migration parameters read from <TYPE>_parameters.xlsx file (first sheet, first row contains column names).
+    Known columns are exposed as attributes (customer_id, customer_ids, target_path), rows as ParametersRow tuples.
+    """
+
+    def __init__(self, path, columns):
+        """
+        :param path: parameters file path
+        :param columns: dict {column name: list of column values}
+        """
+        self.path = path
+        self.columns = columns
+        self.rows = self.__rows()
+        self.customer_ids = [row.customer_id for row in self.rows if row.customer_id]
+        self.customer_id = self.customer_ids[0] if self.customer_ids else None
+        self.target_path = self.__target_path()
+
+    def get(self, column):
+        """
+        Get values of the parameters column.
+        :param column: column name
+        :return: column values (empty list if column doesn't exist)
+        :rtype: list
+        """
+        return self.columns.get(column, [])
+
+    def __rows(self):
+        known = {_column_key(name): name for name in self.columns}
+        count = max((len(values) for values in self.columns.values()), default=0)
+        rows = []
+        for idx in range(count):
+            values = {name: values[idx] if idx < len(values) else None for name, values in self.columns.items()}
+            rows.append(ParametersRow(customer_id=_text(values.get(known.get('customerid'))),
+                                      target_path=_text(values.get(known.get('targetpath'))),
+                                      values=values))
+        return rows
+
+    def __target_path(self):
+        """
+        E-dossier migration target path from the TargetPath column (MigVisma should be in the path).
+        :return: target path or None if not found
+        :rtype: str
+        """
+        for column, values in self.columns.items():
+            if 'target' in column.lower():
+                target_path = None
+                for value in values:
+                    if isinstance(value, str) and 'migvisma' in value.lower():
+                        target_path = value
+                if target_path:
+                    return target_path
+        return None
+
+
+def _unique_names(names):
+    """
+    De-duplicate column names like pandas does (repeated 'Name' columns become 'Name.1', 'Name.2', ..).
+    :param names: column names of the header row
+    :return: unique column names (in the same order)
+    :rtype: list
+    """
+    unique, counts = [], {}
+    for name in names:
+        count = counts.get(name, 0)
+        original = name
+        while name in counts:
+            count += 1
+            name = f'{original}.{count}'
+        counts[original] = count
+        counts[name] = 0
+        unique.append(name)
+    return unique
+
+
+def _read_workbook(path):
+    """
+    Stream the first sheet of the workbook in read-only mode.
+    :param path: xlsx file path
+    :return: dict {column name: list of column values}
+    :rtype: dict
+    """
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, ())
+        names = _unique_names([str(i) if i is not None else f'Unnamed: {idx}' for idx, i in enumerate(header)])
+        columns = {name: [] for name in names}
+        for row in rows:
+            if not any(i is not None for i in row):
+                continue  # skip empty rows
+            for name, value in zip(names, row):
+                columns[name].append(value)
+        return columns
+    finally:
+        workbook.close()
+
+
+def read_parameters(path):
+    """
+    Read parameters xlsx file. Result is cached and the file is read again only if it was modified.
+    :param path: parameters file path
+    :return: parameters
+    :rtype: Parameters
+    """
+    mtime = os.path.getmtime(path)
+    with _CACHE_LOCK:
+        cached = _CACHE.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+    params = Parameters(path=path, columns=_read_workbook(path))
+    with _CACHE_LOCK:
+        _CACHE[path] = (mtime, params)
+    logging.info(msg=f' Parameters file {os.path.basename(path)} loaded')
+    return params
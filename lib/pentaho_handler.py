@@ -0,0 +1,249 @@
+# REF: stefan.mastilak@visma.com
+
+import atexit
+import base64
+import config as cfg
+import gzip
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ElementTree
+from lib.credentials_handler import get_credentials
+from lib.lazy_import import lazy_import
+
+requests = lazy_import('requests')
+
+_CARTE = None  # Carte server of the robot run (started on first use)
+_CARTE_FAILED = False  # Carte is not retried within the run once it failed to start
+_CARTE_LOCK = threading.Lock()  # Carte is started only once if customers are migrated concurrently
+
+
+class CarteUnavailable(ConnectionError):
+    """Carte server can't be reached, the job wasn't submitted (Kitchen fallback is safe)."""
+
+
+def _decode_log(text):
+    """
+    Decode Carte logging string (base64 encoded gzip, plain text in older Carte versions).
+    :param text: logging string from jobStatus response
+    :return: log lines
+    :rtype: list
+    """
+    if not text:
+        return []
+    try:
+        text = gzip.decompress(base64.b64decode(text.strip())).decode('utf-8', errors='replace')
+    except (ValueError, OSError):
+        pass
+    return text.splitlines()
+
+
+def _is_running(desc):
+    """
+    Check Carte job status description.
+    :param desc: status_desc from jobStatus response
+    :return: True if the job is still running
+    :rtype: bool
+    """
+    return desc.startswith('Running') or desc in ('Waiting', 'Initializing', 'Preparing executing', 'Halting')
+
+
+class CarteClient(object):
+    """
+    Client of Pentaho Carte server (HTTP API of long-lived PDI JVM).
+    Jobs are executed on the warm JVM, so Kitchen/JVM/plugins startup is paid only once per robot run.
+    """
+
+    def __init__(self, url=None, auth=None):
+        """
+        :param url: Carte server url (CARTE_HOST and CARTE_PORT from config.py by default)
+        :param auth: (user, password) tuple (CARTE_CREDS item from LastPass, Carte defaults if not set)
+        """
+        self.url = url or f'http://{cfg.CARTE_HOST}:{cfg.CARTE_PORT}'
+        if auth is None and cfg.CARTE_CREDS:
+            credentials = get_credentials(item=cfg.CARTE_CREDS)
+            auth = (credentials.get('username'), credentials.get('password'))
+        self.auth = auth or ('cluster', 'cluster')
+        self.session = requests.Session()
+
+    def __get(self, servlet, timeout, **params):
+        response = self.session.get(f'{self.url}/kettle/{servlet}/', params=params, auth=self.auth, timeout=timeout)
+        response.raise_for_status()
+        return ElementTree.fromstring(response.content)
+
+    def is_alive(self):
+        """
+        Check if Carte server responds.
+        :return: True if Carte is up
+        :rtype: bool
+        """
+        try:
+            self.__get('status', timeout=5, xml='Y')
+            return True
+        except Exception:
+            return False
+
+    def execute_job(self, job_file, params, stop=None):
+        """
+        Execute job file on Carte and wait for its end.
+        Running job is stopped (stopJob servlet) when the stop event is set or the job exceeds CARTE_JOB_TIMEOUT.
+        :param job_file: .kjb file path
+        :param params: job parameters (like MIG_ID)
+        :param stop: threading.Event stopping the job (e.g. set on fatal error in MigrationTool logfile)
+        :return: job log lines, errors (empty string if job finished successfully)
+        :rtype: tuple
+        """
+        stop = stop or threading.Event()
+        try:
+            result = self.__get('executeJob', timeout=cfg.CARTE_JOB_TIMEOUT, job=job_file, level='Basic', **params)
+        except requests.exceptions.ConnectionError as err:
+            raise CarteUnavailable(f' Carte server {self.url} unavailable: {err}')
+
+        job_id = result.findtext('id')
+        if result.findtext('result') != 'OK':
+            return [], result.findtext('message') or 'Carte job execution failed'
+
+        name = os.path.splitext(os.path.basename(job_file))[0]
+        deadline = time.monotonic() + cfg.CARTE_JOB_TIMEOUT
+        while True:
+            status = self.__get('jobStatus', timeout=60, name=name, id=job_id, xml='Y')
+            desc = status.findtext('status_desc') or ''
+            if not _is_running(desc):
+                break
+            if stop.is_set() or time.monotonic() > deadline:
+                reason = 'stopped' if stop.is_set() else f'not finished in {cfg.CARTE_JOB_TIMEOUT} seconds'
+                self.stop_job(name=name, job_id=job_id)
+                return _decode_log(status.findtext('logging_string')), f'Carte job {name} ({job_id}) {reason}'
+            stop.wait(cfg.CARTE_POLL_INTERVAL)
+
+        lines = _decode_log(status.findtext('logging_string'))
+        errors = status.findtext('result/nr_errors') or '0'
+        if desc != 'Finished' or errors != '0':
+            return lines, status.findtext('error_desc') or f'Carte job {name} {desc.lower()} with {errors} errors'
+        return lines, ''
+
+    def stop_job(self, name, job_id):
+        """
+        Stop running job (stopJob servlet) and wait until Carte reports it's not running (CARTE_STOP_TIMEOUT).
+        :param name: job name
+        :param job_id: Carte job id
+        :return: True if the job stopped
+        :rtype: bool
+        """
+        logging.warning(msg=f' Stopping Carte job {name} ({job_id})')
+        deadline = time.monotonic() + cfg.CARTE_STOP_TIMEOUT
+        try:
+            self.__get('stopJob', timeout=60, name=name, id=job_id, xml='Y')
+            while time.monotonic() < deadline:
+                status = self.__get('jobStatus', timeout=60, name=name, id=job_id, xml='Y')
+                if not _is_running(status.findtext('status_desc') or ''):
+                    return True
+                time.sleep(1)
+        except Exception as err:
+            logging.warning(msg=f' Unable to stop Carte job {name} ({job_id}). Error: {err}')
+            return False
+        logging.warning(msg=f' Carte job {name} ({job_id}) still running after {cfg.CARTE_STOP_TIMEOUT} seconds')
+        return False
+
+    def stop(self):
+        """Stop Carte server."""
+        try:
+            self.session.get(f'{self.url}/kettle/stopCarte', auth=self.auth, timeout=10)
+        except Exception:
+            pass
+
+
+class CarteServer(object):
+    """
+    Carte server started once per robot run (config.py - CARTE_*).
+    Already running Carte is reused and left running at the end of the run.
+    NOTE: If CARTE_SCRIPT is set, the python Carte stand-in is started instead (see bench/fake_carte.py).
+    """
+
+    def __init__(self, client=None):
+        """
+        :param client: CarteClient (created from config.py by default)
+        """
+        self.client = client or CarteClient()
+        self.process = None
+
+    def start(self):
+        """
+        Start Carte server (if not running yet) and wait until it responds.
+        :return: True if Carte is up
+        :rtype: bool
+        """
+        if self.client.is_alive():
+            logging.info(msg=f' Using running Carte server {self.client.url}')
+            return True
+
+        if cfg.CARTE_SCRIPT:
+            cmd = [sys.executable, cfg.CARTE_SCRIPT, cfg.CARTE_HOST, str(cfg.CARTE_PORT)]
+        else:
+            cmd = [os.path.join(cfg.PENTAHO_DIR, 'Carte.bat' if os.name == 'nt' else 'carte.sh'),
+                   cfg.CARTE_HOST, str(cfg.CARTE_PORT)]
+        logging.info(msg=f' Starting Carte server {self.client.url}..')
+        try:
+            self.process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                            cwd=cfg.PENTAHO_DIR, env=dict(os.environ, MIG_ROOT=cfg.MIG_ROOT))
+        except OSError as err:
+            logging.warning(msg=f' Unable to start Carte server. Error: {err}')
+            return False
+
+        deadline = time.monotonic() + cfg.CARTE_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                break
+            if self.client.is_alive():
+                logging.info(msg=f' Carte server started')
+                return True
+            time.sleep(1)
+        logging.warning(msg=f' Carte server not available after {cfg.CARTE_START_TIMEOUT} seconds')
+        self.stop()
+        return False
+
+    def stop(self):
+        """Stop Carte server started by the robot."""
+        if self.process and self.process.poll() is None:
+            self.client.stop()
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            logging.info(msg=f' Carte server stopped')
+        self.process = None
+
+
+def get_carte():
+    """
+    Get Carte client of the robot run. Carte server is started on first use.
+    :return: CarteClient or None if Carte isn't available (Kitchen is used instead)
+    """
+    global _CARTE, _CARTE_FAILED
+    with _CARTE_LOCK:
+        if _CARTE is None and not _CARTE_FAILED:
+            server = CarteServer()
+            if server.start():
+                _CARTE = server
+                atexit.register(stop_carte)
+            else:
+                _CARTE_FAILED = True
+        return _CARTE.client if _CARTE else None
+
+
+def stop_carte():
+    """Stop Carte server of the robot run (if it was started by the robot)."""
+    global _CARTE
+    if _CARTE:
+        _CARTE.stop()
+        _CARTE = None
+
+
+def disable_carte():
+    """Stop using Carte for the rest of the robot run (remaining jobs are executed by Kitchen)."""
+    global _CARTE_FAILED
+    _CARTE_FAILED = True
+    stop_carte()
@@ -0,0 +1,138 @@
+# REF: stefan.mastilak@visma.com
+
+import config as cfg
+import cProfile
+import io
+import logging
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+_PROFILE_DIR = None  # profiling is disabled if not set (see enable_profiling)
+_TRACE_LOCK = threading.Lock()
+_TRACE_USERS = 0  # profiled stages running (tracemalloc is shared by concurrently migrated customers)
+_TRACE_OWNED = False  # True if tracemalloc was started by the profiler (not by -X tracemalloc)
+
+
+def enable_profiling(mig_type):
+    """
+    Enable cProfile and tracemalloc profiling of all migration stages (main scripts --profile switch).
+    Profiles are written next to the robot logfile into PROFILE_DIR folder (config.py).
+    :param mig_type: migration type (PDOL, SDOL, MLM, etc..)
+    :return: profiles folder path
+    :rtype: str
+    """
+    global _PROFILE_DIR
+    _PROFILE_DIR = os.path.join(cfg.ROOT_DIR, cfg.PROFILE_DIR.format(mig_type.lower()))
+    os.makedirs(_PROFILE_DIR, exist_ok=True)
+    logging.info(msg=f' Profiling enabled, profiles are written to {_PROFILE_DIR}')
+    return _PROFILE_DIR
+
+
+def _start_tracing():
+    """
+    Start tracemalloc for the profiled stage (started by the first running stage only).
+    :return: None
+    """
+    global _TRACE_USERS, _TRACE_OWNED
+    with _TRACE_LOCK:
+        if not _TRACE_USERS and not tracemalloc.is_tracing():
+            tracemalloc.start(cfg.PROFILE_TRACE_FRAMES)
+            _TRACE_OWNED = True
+        _TRACE_USERS += 1
+
+
+def _stop_tracing():
+    """
+    Take memory snapshot of the profiled stage and stop tracemalloc when the last running stage finishes.
+    NOTE: With concurrently migrated customers the snapshot and peak include allocations of the other stages.
+    :return: (peak, snapshot) - snapshot is None if it can't be taken
+    :rtype: tuple
+    """
+    global _TRACE_USERS, _TRACE_OWNED
+    with _TRACE_LOCK:
+        try:
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+        except RuntimeError as err:
+            logging.warning(msg=f' Unable to take memory snapshot. Error: {err}')
+            peak, snapshot = 0, None
+        finally:
+            _TRACE_USERS -= 1
+            if not _TRACE_USERS and _TRACE_OWNED:
+                tracemalloc.stop()
+                _TRACE_OWNED = False
+    return peak, snapshot
+
+
+def get_profiler(customer_dir):
+    """
+    Get profiler for the customer migration.
+    :param customer_dir: customer directory
+    :return: Profiler instance or None if profiling is disabled
+    """
+    return Profiler(customer_dir=customer_dir, out_dir=_PROFILE_DIR) if _PROFILE_DIR else None
+
+
+class Profiler(object):
+    """
+    cProfile and tracemalloc profiler of migration stages of one customer.
+    For every stage it writes <customer>_<stage>.pstats file, merged <customer>.pstats file of all stages and
+    appends top hotspots and top memory allocations into the <customer>.txt summary.
+    """
+
+    def __init__(self, customer_dir, out_dir):
+        """
+        :param customer_dir: customer directory
+        :param out_dir: profiles folder
+        """
+        self.customer_dir = customer_dir
+        self.out_dir = out_dir
+        self.prefix = os.path.join(out_dir, re.sub(r'[^\w.-]', '_', customer_dir))
+        self.merged = None
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Profile the stage executed inside the with block.
+        :param name: stage name
+        """
+        profile = cProfile.Profile()
+        _start_tracing()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            wall = time.perf_counter() - start
+            peak, snapshot = _stop_tracing()
+            try:
+                self.__write(name=name, profile=profile, wall=wall, peak=peak, snapshot=snapshot)
+            except Exception as err:
+                logging.warning(msg=f' Unable to write profile of {name} stage. Error: {err}')
+
+    def __write(self, name, profile, wall, peak, snapshot):
+        profile.dump_stats(f'{self.prefix}_{name}.pstats')
+        if self.merged is None:
+            self.merged = pstats.Stats(profile)
+        else:
+            self.merged.add(profile)
+        self.merged.dump_stats(f'{self.prefix}.pstats')
+
+        hotspots = io.StringIO()
+        pstats.Stats(profile, stream=hotspots).sort_stats('cumulative').print_stats(cfg.PROFILE_TOP)
+        top = []
+        if snapshot:
+            allocations = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+            top = allocations.statistics('lineno')[:cfg.PROFILE_TOP]
+
+        with open(f'{self.prefix}.txt', 'a', encoding='utf-8') as summary:
+            summary.write(f'{"=" * 100}\nStage: {name}\nWall time: {wall:.3f}s\n'
+                          f'Memory peak: {peak / 1024 / 1024:.1f} MiB\n\nTop allocations:\n')
+            summary.writelines(f'  {stat}\n' for stat in top)
+            summary.write(f'\nTop hotspots (cumulative):\n{hotspots.getvalue()}\n')
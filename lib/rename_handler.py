@@ -0,0 +1,97 @@
+# REF: stefan.mastilak@visma.com
+
+import config as cfg
+import errno
+import logging
+import os
+import subprocess
+import time
+from lib.metrics_handler import inc
+
+# Windows errors of rename blocked by open handle: access denied (handle open inside the folder),
+# sharing violation and lock violation:
+_SHARING_WINERRORS = (5, 32, 33)
+
+
+def is_sharing_violation(err):
+    """
+    Check if the OS error is caused by a file or folder handle held by another process.
+    :param err: OSError
+    :return: True if the operation can succeed once the handle is closed
+    :rtype: bool
+    """
+    return getattr(err, 'winerror', None) in _SHARING_WINERRORS or err.errno == errno.EBUSY
+
+
+def _inside(file, path):
+    return file == path or file.startswith(path.rstrip(os.sep) + os.sep)
+
+
+def lock_holders(path):
+    """
+    Get processes holding handles inside the path (Sysinternals handle.exe if HANDLE_EXE is set in config.py,
+    psutil if it's installed). Best effort only, nothing is reported if neither is available.
+    :param path: file or folder path
+    :return: ['name (pid)', ...]
+    :rtype: list
+    """
+    path = os.path.normcase(os.path.abspath(path))
+    if cfg.HANDLE_EXE:
+        try:
+            result = subprocess.run([cfg.HANDLE_EXE, '-accepteula', '-nobanner', path], capture_output=True,
+                                    text=True, timeout=30)
+            # e.g. 'explorer.exe       pid: 4242   type: File   1F4: D:\MigVisma\...'
+            return sorted({' '.join(line.split()[:3]) for line in result.stdout.splitlines() if ' pid: ' in line})
+        except (OSError, subprocess.SubprocessError):
+            return []
+    try:
+        import psutil
+    except ImportError:
+        return []
+    holders = set()
+    for process in psutil.process_iter(['pid', 'name']):
+        try:
+            if any(_inside(os.path.normcase(f.path), path) for f in process.open_files()):
+                holders.add(f'{process.info["name"]} ({process.info["pid"]})')
+        except (psutil.Error, OSError):
+            continue
+    return sorted(holders)
+
+
+def rename_path(src, dst, folder='other', overwrite=False):
+    """
+    Rename file or folder. Rename is attempted immediately and retried with exponential backoff only while it's
+    blocked by a handle of another process (config.py - RENAME_*). Other errors are raised immediately.
+    Processes holding the handle are logged when giving up (lock_holders), retries are counted in
+    robot_rename_retries_total.
+    :param src: source path
+    :param dst: destination path
+    :param folder: metric label of the renamed item (dossier, success, failed, ...)
+    :param overwrite: True to replace existing destination file (os.replace)
+    :return: destination path
+    :rtype: str
+    """
+    delay = cfg.RENAME_BACKOFF_START
+    for attempt in range(cfg.RENAME_RETRIES + 1):
+        try:
+            if overwrite:
+                os.replace(src=src, dst=dst)
+            else:
+                os.rename(src=src, dst=dst)
+            if attempt:
+                logging.info(msg=f' {src} renamed after {attempt} retries')
+            return dst
+        except OSError as err:
+            if not is_sharing_violation(err):
+                raise
+            if attempt == 0 and cfg.RENAME_RETRIES:
+                logging.warning(msg=f' {src} is locked, retrying. Error: {err}')
+            if attempt == cfg.RENAME_RETRIES:
+                # lock holders lookup is slow (all processes of the host), it's done only when giving up:
+                holders = lock_holders(src)
+                logging.warning(msg=f' {src} is still locked' + (f' by {", ".join(holders)}' if holders else '') +
+                                    f'. Error: {err}')
+                raise
+            inc('robot_rename_retries_total', folder=folder)
+            time.sleep(delay)
+            delay = min(delay * 2, cfg.RENAME_BACKOFF_MAX)
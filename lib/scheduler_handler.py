@@ -0,0 +1,39 @@
+# REF: stefan.mastilak@visma.com
+
+import config as cfg
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from lib.disk_handler import DISK
+
+
+def run_customers(migrate, customers, workers=None):
+    """
+    Migrate customers by the pool of workers (config.py - MIG_CUSTOMER_WORKERS).
+    With one worker customers are migrated one after another on the calling thread (the original behaviour).
+    NOTE: Pentaho jobs of concurrently migrated customers are limited by MIG_JOB_CONCURRENCY
+    (lib/kitchen_handler.py), their disk footprint by disk space admission (lib/disk_handler.py), which is
+    released when the customer is finished.
+    :param migrate: callable(index) migrating customers[index]
+    :param customers: ordered customer dirs
+    :param workers: number of workers (MIG_CUSTOMER_WORKERS by default)
+    :return: None
+    """
+    def run(index):
+        try:
+            return migrate(index)
+        finally:
+            DISK.release(customers[index])
+
+    workers = min(workers or cfg.MIG_CUSTOMER_WORKERS, len(customers))
+    if workers <= 1:
+        for index in range(len(customers)):
+            run(index)
+        return
+
+    logging.info(msg=f' Migrating {len(customers)} customers by {workers} workers')
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='customer') as pool:
+        futures = {pool.submit(run, index): customer for index, customer in enumerate(customers)}
+        for future, customer in futures.items():
+            error = future.exception()
+            if error:
+                logging.critical(msg=f' Unhandled exception while processing {customer}: {error}')
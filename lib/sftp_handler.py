@@ -2,10 +2,13 @@
 
 import config as cfg
 import logging
-import pysftp
 from lib.credentials_handler import get_credentials
+from lib.lazy_import import lazy_import
+from lib.metrics_handler import inc
 from retry import retry
 
+pysftp = lazy_import('pysftp')
+
 
 class SftpHandle(object):
     """
@@ -29,9 +32,11 @@ class SftpHandle(object):
     @retry(Exception, delay=20, tries=3)
     def connect(self):
         """Establish the SFTP connection."""
+        inc('robot_sftp_connects_total')
         try:
             self.sftp = pysftp.Connection(host=self.host, username=self.user, password=self.pwd, cnopts=self.cnopts)
         except Exception as error:
+            inc('robot_sftp_connect_failures_total')
             logging.warning(msg=f" Connection to sftp failed due to error: {error}")
 
     def disconnect(self):
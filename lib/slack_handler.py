@@ -1,7 +1,14 @@
 # REF: stefan.mastilak@visma.com
 
-from slack import WebClient, WebhookClient
-from slack.errors import SlackApiError
+import config as cfg
+import logging
+import queue
+import threading
+import time
+from lib.lazy_import import lazy_import
+
+slack = lazy_import('slack')
+slack_errors = lazy_import('slack.errors')
 
 
 class SlackLogger(object):
@@ -17,8 +24,22 @@ class SlackLogger(object):
         self.channel = channel
         self.webhook_url = creds.get('url')  # webhook url is stored in the 'url' section in LastPass item
         self.token = creds.get('notes')  # token is stored in the 'notes' section in LastPass item
-        self.client = WebClient(token=self.token)
-        self.webhook = WebhookClient(url=self.webhook_url)
+        self.__client = None
+        self.__webhook = None
+
+    @property
+    def client(self):
+        """Slack API client (created on first use)."""
+        if self.__client is None:
+            self.__client = slack.WebClient(token=self.token)
+        return self.__client
+
+    @property
+    def webhook(self):
+        """Slack webhook client (created on first use)."""
+        if self.__webhook is None:
+            self.__webhook = slack.WebhookClient(url=self.webhook_url)
+        return self.__webhook
 
     def upload_message(self, msg):
         """
@@ -30,7 +51,7 @@ class SlackLogger(object):
             assert response.status_code == 200
             assert response.body == "ok"
 
-        except SlackApiError as e:
+        except slack_errors.SlackApiError as e:
             assert e.response["ok"] is False
             assert e.response["error"]
             print(f"Got an error: {e.response['error']}")
@@ -46,7 +67,145 @@ class SlackLogger(object):
                 file=filepath)
             assert response["file"]
 
-        except SlackApiError as e:
+        except slack_errors.SlackApiError as e:
             assert e.response["ok"] is False
             assert e.response["error"]
             print(f"Got an error: {e.response['error']}")
+
+
+class SlackNotifier(threading.Thread):
+    """
+    Asynchronous Slack notifier.
+    Messages and files are queued (bounded queue) and posted by a background thread, so Slack latency
+    or outage never blocks the robot. Queued messages are coalesced into one post and rate-limited
+    requests (HTTP 429) are retried after the time requested by Slack.
+    """
+
+    def __init__(self, logger, queue_size=cfg.SLACK_QUEUE_SIZE):
+        """
+        :param logger: SlackLogger instance used for posting
+        :param queue_size: maximum number of queued notifications
+        """
+        super().__init__(name='slack-notifier', daemon=True)
+        self.logger = logger
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.pending = None
+        self.closing = threading.Event()
+        self.start()
+
+    def upload_message(self, msg):
+        """
+        Queue message to be posted to the slack channel.
+        :param msg: message to be posted
+        :return: True if queued
+        :rtype: bool
+        """
+        return self.__enqueue(('message', msg))
+
+    def upload_file(self, filepath):
+        """
+        Queue file to be uploaded to the slack channel.
+        :param filepath: full path to file
+        :return: True if queued
+        :rtype: bool
+        """
+        return self.__enqueue(('file', filepath))
+
+    def close(self, timeout=cfg.SLACK_CLOSE_TIMEOUT):
+        """
+        Wait (limited time) until all queued notifications are posted and stop the notifier.
+        :param timeout: maximum waiting time in seconds (for queueing and posting together)
+        :return: True if all notifications were posted
+        :rtype: bool
+        """
+        self.closing.set()
+        try:
+            self.queue.put_nowait(('stop', None))
+        except queue.Full:
+            pass  # notifier stops once the queue is drained (closing flag)
+        self.join(timeout=timeout)
+        if self.is_alive():
+            logging.warning(msg=f' Slack notifications not posted within {timeout} seconds')
+            return False
+        return True
+
+    def __enqueue(self, item):
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except queue.Full:
+            logging.warning(msg=f' Slack queue is full - notification dropped')
+            return False
+
+    def __next_item(self):
+        """
+        Get next notification. Consecutive queued messages are coalesced into one message.
+        :return: notification tuple (kind, payload) or None if notifier is closed
+        """
+        item = self.pending
+        self.pending = None
+        while item is None:
+            try:
+                item = self.queue.get(timeout=1)
+            except queue.Empty:
+                if self.closing.is_set():
+                    return None
+        if item[0] == 'stop':
+            return None
+        if item[0] != 'message':
+            return item
+
+        messages = [item[1]]
+        length = len(item[1])
+        while True:
+            try:
+                following = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if following[0] != 'message' \
+                    or length + len(following[1]) > cfg.SLACK_COALESCE_CHARS:
+                self.pending = following
+                break
+            messages.append(following[1])
+            length += len(following[1])
+        return 'message', '\n\n'.join(messages)
+
+    def run(self):
+        while True:
+            item = self.__next_item()
+            if item is None:
+                return
+            kind, payload = item
+            for attempt in range(1, cfg.SLACK_RETRIES + 1):
+                try:
+                    delay = self.__deliver(kind=kind, payload=payload)
+                except Exception as err:
+                    logging.warning(msg=f' Slack {kind} not posted (attempt {attempt}). Error: {err}')
+                    delay = 2 ** attempt
+                if not delay:
+                    break
+                if attempt < cfg.SLACK_RETRIES:
+                    time.sleep(delay)
+            else:
+                logging.error(msg=f' Slack {kind} dropped after {cfg.SLACK_RETRIES} attempts')
+
+    def __deliver(self, kind, payload):
+        """
+        Post single notification.
+        :return: 0 if posted, otherwise number of seconds to wait before the retry
+        :rtype: int
+        """
+        try:
+            if kind == 'message':
+                response = self.logger.webhook.send(text=payload)
+                if response.status_code == 429:
+                    return int(response.headers.get('Retry-After', 1))
+                if response.status_code != 200:
+                    raise AssertionError(f' Webhook responded with {response.status_code}: {response.body}')
+            else:
+                self.logger.client.files_upload(channels=self.logger.channel, file=payload)
+            return 0
+        except slack_errors.SlackApiError as e:
+            if e.response.status_code == 429:
+                return int(e.response.headers.get('Retry-After', 1))
+            raise
@@ -0,0 +1,260 @@
+# REF: stefan.mastilak@visma.com
+
+import config as cfg
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+# BigQuery insert errors of rows which can be shipped again ('stopped' rows were only rejected with other rows):
+_RETRYABLE_REASONS = ('stopped', 'backendError', 'internalError', 'timeout', 'rateLimitExceeded', 'quotaExceeded')
+
+
+def rejected_rows(errors):
+    """
+    Get rows permanently rejected by BigQuery (e.g. 'invalid' rows) from insert_rows_json errors.
+    :param errors: insert_rows_json errors ([{'index': row index, 'errors': [{'reason': ..}, ..]}, ..])
+    :return: indexes of rejected rows (empty if the whole request can be retried)
+    :rtype: set
+    """
+    rejected = set()
+    for error in errors:
+        if isinstance(error, dict) and 'index' in error:
+            if any(i.get('reason') not in _RETRYABLE_REASONS for i in error.get('errors', [])):
+                rejected.add(error['index'])
+    return rejected
+
+
+class Spool(object):
+    """
+    Durable local spool for KPI and monitoring events (SQLite file in robot root folder).
+    Events are written synchronously on the robot thread and shipped to BigQuery later by SpoolFlusher,
+    so migration throughput doesn't depend on BigQuery latency or availability.
+    Events rejected by BigQuery SPOOL_MAX_ATTEMPTS times (config.py) are moved to the dead_events table.
+    """
+
+    def __init__(self, path=None):
+        """
+        :param path: spool database path (SPOOL_FILE in robot root folder by default)
+        """
+        self.path = path or os.path.join(cfg.ROOT_DIR, cfg.SPOOL_FILE)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS events ('
+                          'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                          'target TEXT NOT NULL, '
+                          'payload TEXT NOT NULL, '
+                          'created TEXT NOT NULL, '
+                          'attempts INTEGER NOT NULL DEFAULT 0)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS dead_events ('
+                          'id INTEGER PRIMARY KEY, '
+                          'target TEXT NOT NULL, '
+                          'payload TEXT NOT NULL, '
+                          'created TEXT NOT NULL, '
+                          'attempts INTEGER NOT NULL, '
+                          'error TEXT, '
+                          'buried TEXT NOT NULL)')
+
+    def put(self, target, row):
+        """
+        Append new event to the spool.
+        :param target: BigQuery table the event belongs to
+        :param row: event row (JSON serializable dict)
+        :return: event id
+        :rtype: int
+        """
+        with self.lock:
+            cursor = self.conn.execute('INSERT INTO events (target, payload, created) VALUES (?, ?, ?)',
+                                       (target, json.dumps(row), datetime.now().isoformat()))
+            return cursor.lastrowid
+
+    def take(self, limit):
+        """
+        Get the oldest spooled events.
+        Row id (host, creation time and event id) lets BigQuery de-duplicate rows shipped again after a lost response.
+        :param limit: maximum number of events
+        :return: list of (id, target, row, row id) tuples
+        :rtype: list
+        """
+        with self.lock:
+            rows = self.conn.execute('SELECT id, target, payload, created FROM events ORDER BY id LIMIT ?',
+                                     (limit,)).fetchall()
+        return [(_id, target, json.loads(payload), f'{cfg.RUNTIME_HOSTNAME}-{created}-{_id}')
+                for _id, target, payload, created in rows]
+
+    def ack(self, ids):
+        """
+        Remove shipped events from the spool.
+        :param ids: event ids
+        :return: None
+        """
+        with self.lock:
+            self.conn.executemany('DELETE FROM events WHERE id = ?', [(i,) for i in ids])
+
+    def nack(self, ids, error=None):
+        """
+        Increase attempts counter of events rejected by BigQuery. Events rejected SPOOL_MAX_ATTEMPTS times
+        (config.py) are moved to the dead_events table, so they don't block the events spooled after them.
+        :param ids: event ids
+        :param error: rejection error (stored with dead events)
+        :return: ids of events moved to the dead_events table
+        :rtype: list
+        """
+        with self.lock:
+            self.conn.execute('BEGIN')
+            try:
+                self.conn.executemany('UPDATE events SET attempts = attempts + 1 WHERE id = ?', [(i,) for i in ids])
+                dead = [row[0] for row in self.conn.execute(
+                    f'SELECT id FROM events WHERE attempts >= ? AND id IN ({",".join("?" * len(ids))})',
+                    (cfg.SPOOL_MAX_ATTEMPTS, *ids))]
+                for i in dead:
+                    self.conn.execute('INSERT INTO dead_events (id, target, payload, created, attempts, error, buried) '
+                                      'SELECT id, target, payload, created, attempts, ?, ? FROM events WHERE id = ?',
+                                      (error, datetime.now().isoformat(), i))
+                    self.conn.execute('DELETE FROM events WHERE id = ?', (i,))
+                self.conn.execute('COMMIT')
+            except sqlite3.Error:
+                self.conn.execute('ROLLBACK')
+                raise
+        return dead
+
+    def dead(self):
+        """
+        Get number of events moved to the dead_events table.
+        :return: dead events count
+        :rtype: int
+        """
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM dead_events').fetchone()[0]
+
+    def pending(self):
+        """
+        Get number of events waiting in the spool.
+        :return: events count
+        :rtype: int
+        """
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM events').fetchone()[0]
+
+    def close(self):
+        """Close the spool database connection."""
+        with self.lock:
+            self.conn.close()
+
+
+class SpoolFlusher(threading.Thread):
+    """
+    Background thread shipping spooled events in batches.
+    Failed batches stay in the spool and are retried with exponential backoff (also in the next robot run).
+    Rows rejected by BigQuery are split from the batch, so the other rows are still shipped (Spool.nack).
+    """
+
+    def __init__(self, spool, sink, batch_size=cfg.KPI_BATCH_SIZE):
+        """
+        :param spool: Spool instance
+        :param sink: callable(target, rows, row_ids) shipping one batch, returns list of errors (empty if successful)
+        :param batch_size: maximum number of events shipped in one batch
+        """
+        super().__init__(name='spool-flusher', daemon=True)
+        self.spool = spool
+        self.sink = sink
+        self.batch_size = batch_size
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+        self.idle = threading.Event()
+        self.backoff = 0
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.wakeup.wait(timeout=self.backoff or cfg.SPOOL_FLUSH_INTERVAL)
+            self.wakeup.clear()
+            try:
+                shipped = self.ship_batch()
+            except Exception as err:
+                logging.warning(msg=f' Spooled events not shipped. Error: {err}')
+                shipped = None
+            if shipped is None:
+                self.backoff = min(max(self.backoff * 2, 1), cfg.SPOOL_MAX_BACKOFF)
+            else:
+                self.backoff = 0
+                if shipped:
+                    self.wakeup.set()  # ship next batch right away
+                else:
+                    self.idle.set()
+
+    def ship_batch(self):
+        """
+        Ship the oldest spooled events grouped by target table (rows rejected by BigQuery are split from the batch).
+        :return: number of shipped and rejected events, None if any batch failed
+        :rtype: int
+        """
+        events = self.spool.take(limit=self.batch_size)
+        if not events:
+            return 0
+        self.idle.clear()
+
+        batches = {}
+        for _id, target, row, row_id in events:
+            batches.setdefault(target, []).append((_id, row, row_id))
+
+        shipped = 0
+        for target, batch in batches.items():
+            errors = self.__ship(target, batch)
+            rejected = rejected_rows(errors)
+            if rejected:
+                # ship the other rows without the rejected ones:
+                self.__reject(target, batch, rejected, errors)
+                batch = [row for index, row in enumerate(batch) if index not in rejected]
+                errors = self.__ship(target, batch) if batch else []
+            if errors:
+                logging.warning(msg=f' Shipping of {len(batch)} events to {target} failed: {errors}')
+                return None
+            if batch:
+                self.spool.ack([i[0] for i in batch])
+                shipped += len(batch)
+                logging.info(msg=f' {len(batch)} entries added to '
+                                 f'{target.split(".")[-1] if "." in target else target} table')
+            shipped += len(rejected)  # rejected events were processed too (attempt counted)
+        return shipped
+
+    def __ship(self, target, batch):
+        try:
+            return self.sink(target, [i[1] for i in batch], [i[2] for i in batch])
+        except Exception as err:
+            return [str(err)]
+
+    def __reject(self, target, batch, rejected, errors):
+        reasons = [e.get('errors') for e in errors if isinstance(e, dict) and e.get('index') in rejected]
+        logging.warning(msg=f' {len(rejected)} events rejected by {target}: {reasons[:3]}')
+        dead = self.spool.nack([batch[i][0] for i in sorted(rejected)], error=json.dumps(reasons)[:2000])
+        if dead:
+            logging.critical(msg=f' {len(dead)} events rejected {cfg.SPOOL_MAX_ATTEMPTS} times by {target} moved '
+                                 f'to dead_events table of {self.spool.path}')
+
+    def drain(self, timeout):
+        """
+        Wake up the flusher and wait until the spool is empty.
+        :param timeout: maximum waiting time in seconds
+        :return: True if all events were shipped
+        :rtype: bool
+        """
+        deadline = time.monotonic() + timeout
+        self.idle.clear()
+        self.backoff = 0
+        self.wakeup.set()
+        while time.monotonic() < deadline:
+            if self.idle.wait(timeout=0.5) and not self.spool.pending():
+                return True
+            if not self.backoff:
+                self.wakeup.set()
+        return not self.spool.pending()
+
+    def stop(self):
+        """Stop the flusher thread."""
+        self.stopped.set()
+        self.wakeup.set()
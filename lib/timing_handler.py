@@ -0,0 +1,201 @@
+# REF: stefan.mastilak@visma.com
+
+import config as cfg
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from lib.log_handler import log_stage
+from lib.metrics_handler import inc, observe
+from lib.profile_handler import get_profiler
+
+_WRITE_LOCK = threading.Lock()
+
+
+def timings_path(mig_type):
+    """
+    Get path of the JSON lines file with stage timings of the current robot run.
+    :param mig_type: migration type (PDOL, SDOL, MLM, etc..)
+    :return: timings file path
+    :rtype: str
+    """
+    return os.path.join(cfg.ROOT_DIR, cfg.TIMINGS_FILE.format(mig_type.lower()))
+
+
+def reset_timings(mig_type):
+    """
+    Start new timings file for the robot run (like the robot logfile, it's overwritten by every run).
+    :param mig_type: migration type (PDOL, SDOL, MLM, etc..)
+    :return: timings file path
+    :rtype: str
+    """
+    path = timings_path(mig_type)
+    open(path, 'w').close()
+    return path
+
+
+def read_timings(mig_type):
+    """
+    Read stage records of the current robot run.
+    :param mig_type: migration type (PDOL, SDOL, MLM, etc..)
+    :return: list of stage records (dicts)
+    :rtype: list
+    """
+    path = timings_path(mig_type)
+    if not os.path.isfile(path):
+        return []
+    with open(path, encoding='utf-8') as timings_file:
+        return [json.loads(line) for line in timings_file if line.strip()]
+
+
+def log_timings_summary(mig_type):
+    """
+    Log per-stage summary (count, total, mean and max wall time, CPU time, outcomes) of the current robot run.
+    :param mig_type: migration type (PDOL, SDOL, MLM, etc..)
+    :return: summary dict {stage: {...}}
+    :rtype: dict
+    """
+    summary = {}
+    for record in read_timings(mig_type):
+        stage = summary.setdefault(record['stage'], {'count': 0, 'wall': 0.0, 'max': 0.0, 'cpu': 0.0,
+                                                     'files': 0, 'bytes': 0, 'failed': 0})
+        stage['count'] += 1
+        stage['wall'] += record['wall']
+        stage['max'] = max(stage['max'], record['wall'])
+        stage['cpu'] += record['cpu']
+        stage['files'] += record.get('files') or 0
+        stage['bytes'] += record.get('bytes') or 0
+        stage['failed'] += 0 if record['outcome'] == 'ok' else 1
+
+    if summary:
+        logging.info(msg=f' Stage timings summary:')
+        for name, stage in sorted(summary.items(), key=lambda x: -x[1]['wall']):
+            logging.info(msg=f'  {name:<24} count: {stage["count"]:>3}  total: {stage["wall"]:>9.1f}s  '
+                             f'mean: {stage["wall"] / stage["count"]:>8.1f}s  max: {stage["max"]:>8.1f}s  '
+                             f'cpu: {stage["cpu"]:>8.1f}s  files: {stage["files"]:>8}  '
+                             f'bytes: {stage["bytes"]:>13}  failed: {stage["failed"]}')
+    return summary
+
+
+class StageRecord(object):
+    """
+    Timing record of one migration stage.
+    """
+
+    def __init__(self, stage, customer_dir, mig_type):
+        self.stage = stage
+        self.customer_dir = customer_dir
+        self.mig_type = mig_type
+        self.start = datetime.now()
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.files = None
+        self.bytes = None
+        self.outcome = 'ok'
+        self.error = None
+
+    def to_dict(self):
+        return {'customer_dir': self.customer_dir, 'mig_type': self.mig_type, 'stage': self.stage,
+                'start': self.start.isoformat(), 'wall': round(self.wall, 3), 'cpu': round(self.cpu, 3),
+                'files': self.files, 'bytes': self.bytes, 'outcome': self.outcome, 'error': self.error}
+
+
+class StageTimer(object):
+    """
+    Per-stage timing instrumentation of the customer migration.
+    Every stage records wall time, CPU time (of the migrating thread, concurrently migrated customers are not
+    included), processed files/bytes and outcome (ok, failed, error).
+    Records are appended as JSON lines to the timings file of the current run (config.py - TIMINGS_FILE)
+    and exported to the run metrics (lib/metrics_handler.py).
+    """
+
+    def __init__(self, customer_dir, mig_type):
+        """
+        :param customer_dir: customer directory
+        :param mig_type: migration type (PDOL, SDOL, MLM, etc..)
+        """
+        self.customer_dir = customer_dir
+        self.mig_type = mig_type
+        self.records = []
+        self.profiler = get_profiler(customer_dir=customer_dir)  # None if profiling is disabled
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Time the stage executed inside the with block.
+        :param name: stage name
+        :return: stage record (files, bytes and outcome can be set inside the with block)
+        """
+        record = StageRecord(stage=name, customer_dir=self.customer_dir, mig_type=self.mig_type)
+        try:
+            with self.__timed(record):
+                yield record
+        finally:
+            self.__finish(record)
+
+    def run(self, name, func, *args, measure=None, **kwargs):
+        """
+        Run and time one migration stage.
+        :param name: stage name
+        :param func: stage function
+        :param measure: optional callable(result) returning (files, bytes) processed by the stage
+                        (evaluated after the stage is timed, its failure doesn't change the stage outcome)
+        :return: result of the stage function (falsy result is recorded as 'failed' outcome)
+        """
+        record = StageRecord(stage=name, customer_dir=self.customer_dir, mig_type=self.mig_type)
+        try:
+            with self.__timed(record):
+                result = func(*args, **kwargs)
+            if not result:
+                record.outcome = 'failed'
+            elif measure:
+                try:
+                    record.files, record.bytes = measure(result)
+                except Exception as err:
+                    logging.warning(msg=f' Unable to measure files/bytes of {name} stage. Error: {err}')
+        finally:
+            self.__finish(record)
+        return result
+
+    @contextmanager
+    def __timed(self, record):
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            with log_stage(record.stage):
+                if self.profiler:
+                    with self.profiler.stage(record.stage):
+                        yield
+                else:
+                    yield
+        except BaseException as err:
+            record.outcome = 'error'
+            record.error = str(err) or type(err).__name__
+            raise
+        finally:
+            record.wall = time.perf_counter() - wall_start
+            record.cpu = time.thread_time() - cpu_start
+
+    def __finish(self, record):
+        self.records.append(record)
+        self.__write(record)
+        self.__export(record)
+
+    @staticmethod
+    def __export(record):
+        observe('robot_stage_duration_seconds', record.wall, stage=record.stage)
+        inc('robot_stage_outcomes_total', stage=record.stage, outcome=record.outcome)
+        if record.files:
+            inc('robot_stage_files_total', record.files, stage=record.stage)
+        if record.bytes:
+            inc('robot_stage_bytes_total', record.bytes, stage=record.stage)
+
+    def __write(self, record):
+        try:
+            with _WRITE_LOCK, open(timings_path(self.mig_type), 'a', encoding='utf-8') as timings_file:
+                timings_file.write(json.dumps(record.to_dict()) + '\n')
+        except OSError as err:
+            logging.warning(msg=f' Unable to write stage timings. Error: {err}')
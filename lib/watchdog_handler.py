@@ -0,0 +1,185 @@
+# REF: stefan.mastilak@visma.com
+
+import config as cfg
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from lib.log_handler import get_log_stage
+from lib.metrics_handler import inc
+from lib.miglog_handler import kill_process_tree
+
+_WATCHDOG_CONTEXT = ContextVar('watchdog_context', default=({}, None))  # (stage estimates, archive bytes)
+
+
+def set_watchdog_context(estimates=None, archive_bytes=None):
+    """
+    Set predicted stage durations and archive size of the customer migrated in the current context.
+    :param estimates: {stage: seconds} predicted from the migration history (History.predict)
+    :param archive_bytes: size of customer archives
+    :return: None
+    """
+    _WATCHDOG_CONTEXT.set((estimates or {}, archive_bytes))
+
+
+def stage_timeout(stage=None):
+    """
+    Get timeout of the migration stage subprocess (config.py - WATCHDOG_*).
+    Timeout is the predicted stage duration (migration history) multiplied by WATCHDOG_TIMEOUT_FACTOR.
+    Stages without history get timeout from the archive size and the minimum throughput (WATCHDOG_MIN_THROUGHPUT).
+    Timeout is kept between WATCHDOG_MIN_TIMEOUT and WATCHDOG_MAX_TIMEOUT (maximum if nothing is known).
+    :param stage: stage name (stage of the current context by default)
+    :return: timeout in seconds
+    :rtype: float
+    """
+    estimates, archive_bytes = _WATCHDOG_CONTEXT.get()
+    estimate = estimates.get(stage or get_log_stage())
+    if estimate:
+        timeout = estimate * cfg.WATCHDOG_TIMEOUT_FACTOR
+    elif archive_bytes:
+        timeout = archive_bytes / cfg.WATCHDOG_MIN_THROUGHPUT
+    else:
+        return cfg.WATCHDOG_MAX_TIMEOUT
+    return min(max(timeout, cfg.WATCHDOG_MIN_TIMEOUT), cfg.WATCHDOG_MAX_TIMEOUT)
+
+
+class FolderProgress(object):
+    """
+    Progress of the process extracting files into the folder (Watchdog progress callable).
+    Progress is the size of the file being written (the newest file of the folder tree) and modification times
+    of the folders from its folder up to the extraction folder (new file changes modification time of its folder).
+    The whole tree is scanned again for the files count and the newest file only when neither changes and at most
+    once per WATCHDOG_RESCAN_INTERVAL (config.py), so watching extraction of many small files doesn't compete with
+    it for I/O and other processes writing to the same volume don't hide a stalled extraction.
+    """
+
+    def __init__(self, folder):
+        """
+        :param folder: extraction destination folder
+        """
+        self.folder = os.path.normpath(folder)
+        self.files = 0
+        self.current = None  # (path, size) of the file being written
+        self.folders = ()  # modification times of the folders of the file being written
+        self.scanned = None  # time of the last folder tree scan
+
+    def __call__(self):
+        if self.current:
+            current = (self.current[0], self.__size(self.current[0]))
+            folders = self.__folders(self.current[0])
+            if current != self.current or folders != self.folders:
+                self.current, self.folders = current, folders
+            elif time.monotonic() - self.scanned >= cfg.WATCHDOG_RESCAN_INTERVAL:
+                self.__scan()
+        else:
+            self.__scan()
+        return self.files, self.current, self.folders
+
+    @staticmethod
+    def __size(path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return None
+
+    def __folders(self, path):
+        mtimes = []
+        folder = os.path.dirname(path)
+        while True:
+            try:
+                mtimes.append(os.stat(folder).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+            if len(folder) <= len(self.folder) or os.path.dirname(folder) == folder:
+                return tuple(mtimes)
+            folder = os.path.dirname(folder)
+
+    def __scan(self):
+        self.files, newest = 0, None
+        for root, dirs, files in os.walk(self.folder):
+            for name in files:
+                try:
+                    stats = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                self.files += 1
+                if newest is None or stats.st_mtime > newest[1]:
+                    newest = (os.path.join(root, name), stats.st_mtime, stats.st_size)
+        self.current = (newest[0], newest[2]) if newest else None
+        self.folders = self.__folders(newest[0]) if newest else ()
+        self.scanned = time.monotonic()
+
+
+class Watchdog(threading.Thread):
+    """
+    Watchdog of migration stage subprocess (Kitchen, cmd file, 7-Zip, SFX).
+    Process tree is killed when the process doesn't finish in time (stage_timeout) or when its progress
+    (output lines, logfile or archive growth..) doesn't change for WATCHDOG_STALL_TIMEOUT seconds.
+    The reason is kept in .expired, so the caller can fail the stage and the customer.
+    NOTE: Stall detection needs progress callable, processes without it are watched for timeout only.
+    """
+
+    def __init__(self, process, progress=None, timeout=None, stage=None):
+        """
+        :param process: Popen instance
+        :param progress: callable returning any progress value (compared with the previous one)
+        :param timeout: timeout in seconds (stage_timeout by default)
+        :param stage: stage name (stage of the current context by default)
+        """
+        super().__init__(name=f'watchdog-{process.pid}', daemon=True)
+        self.process = process
+        self.progress = progress
+        self.stage = stage or get_log_stage()
+        self.timeout = timeout or stage_timeout(stage=self.stage)
+        self.stall = cfg.WATCHDOG_STALL_TIMEOUTS.get(self.stage, cfg.WATCHDOG_STALL_TIMEOUT)
+        self.expired = None
+        self.stopped = threading.Event()
+        self.context = contextvars.copy_context()  # customer log context of the calling thread
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def run(self):
+        self.context.run(self.__watch)
+
+    def stop(self):
+        """Stop watching."""
+        self.stopped.set()
+        if self.is_alive():
+            self.join(timeout=30)
+
+    def __measure(self, last):
+        try:
+            return self.progress()
+        except OSError:
+            return last
+
+    def __watch(self):
+        start = changed = time.monotonic()
+        last = self.__measure(None) if self.progress else None
+        while not self.stopped.wait(cfg.WATCHDOG_POLL_INTERVAL):
+            if self.process.poll() is not None:
+                return
+            now = time.monotonic()
+            if now - start > self.timeout:
+                self.__kill(reason=f'not finished in {self.timeout:.0f} seconds', kind='timeout')
+                return
+            if self.progress:
+                value = self.__measure(last)
+                if value != last:
+                    last, changed = value, now
+                elif now - changed > self.stall:
+                    self.__kill(reason=f'no progress for {self.stall:.0f} seconds', kind='stall')
+                    return
+
+    def __kill(self, reason, kind):
+        self.expired = f'{self.stage or "Subprocess"} {reason}'
+        logging.critical(msg=f' Watchdog: {self.expired}, stopping the process')
+        inc('robot_watchdog_kills_total', stage=self.stage, reason=kind)
+        kill_process_tree(self.process)
@@ -7,6 +7,25 @@ import logging
 import subprocess
 import os
 import time
+from lib.disk_handler import DISK, disk_footprint
+from lib.params_handler import read_parameters
+from lib.watchdog_handler import FolderProgress, Watchdog
+
+
+def get_archives_size(customer_dir, mig_type):
+    """
+    Get total size of customer archive files (sfx and split zip files) inside {migration_type} folder.
+    :param customer_dir: customer directory
+    :param mig_type: migration type (PDOL, SDOL, MLM, etc..)
+    :return: archives size in bytes
+    :rtype: int
+    """
+    total = 0
+    with os.scandir(os.path.join(cfg.MIG_ROOT, customer_dir, mig_type)) as entries:
+        for entry in entries:
+            if entry.is_file() and ('.zip' in entry.name.lower() or entry.name.lower().endswith('.exe')):
+                total += entry.stat().st_size
+    return total
 
 
 class Zipper(Migration):
@@ -30,6 +49,32 @@ class Zipper(Migration):
                     total += os.path.getsize(fp)
         return total
 
+    def get_archives_size(self):
+        """
+        Get total size of customer archive files (sfx and split zip files) inside {migration_type} folder.
+        :return: archives size in bytes
+        :rtype: int
+        """
+        return get_archives_size(customer_dir=self.customer_dir, mig_type=self.mig_type)
+
+    def admit_disk_space(self, pwd: str):
+        """
+        Admit the customer migration by free disk space before unpacking (lib/disk_handler.py).
+        Disk footprint is estimated from archive headers (unpacked DOCS, e-dossier copy on the target volume and
+        output .7z archive) and reserved until the customer is finished (lib/scheduler_handler.py).
+        :param pwd: password
+        :return: True if admitted, False if there isn't enough disk space
+        :rtype: bool
+        """
+        if self.mig_type == 'MLM':
+            archives = [self.__find_split_archive_start()]
+        else:
+            archives = self.__find_sfx_files()
+        params = os.path.join(cfg.MIG_ROOT, self.customer_dir, self.mig_type, f'{self.mig_type}_parameters.xlsx')
+        target_path = read_parameters(params).target_path if os.path.exists(params) else None
+        need = disk_footprint(archives=archives, mig_type=self.mig_type, target_path=target_path, pwd=pwd)
+        return DISK.admit(customer_dir=self.customer_dir, need=need)
+
     def __find_sfx_files(self):
         """
         Find SFX files inside customer folder.
@@ -109,8 +154,12 @@ class Zipper(Migration):
                         process.terminate()
                         return None, 'Unzipping process stopped - Wrong password or corrupted file'
 
-            stdout, stderr = process.communicate()
+            # file being written (or files count) of the destination folder is the unzipping progress:
+            with Watchdog(process=process, progress=FolderProgress(out_dir)) as watchdog:
+                stdout, stderr = process.communicate()
 
+        if watchdog.expired:
+            return stdout.decode('utf-8'), f'Unzipping process stopped by the watchdog: {watchdog.expired}'
         return stdout.decode('utf-8'), stderr.decode('utf-8')
 
     def __run_7zip_file(self, file_path: str, out_dir: str, pwd: str, check_progress: bool):
@@ -143,8 +192,12 @@ class Zipper(Migration):
                         process.terminate()
                         return None, 'Unzipping process stopped - Wrong password or corrupted file'
 
-            stdout, stderr = process.communicate()
+            # file being written (or files count) of the destination folder is the unzipping progress:
+            with Watchdog(process=process, progress=FolderProgress(out_dir)) as watchdog:
+                stdout, stderr = process.communicate()
 
+        if watchdog.expired:
+            return stdout.decode('utf-8'), f'Unzipping process stopped by the watchdog: {watchdog.expired}'
         return stdout.decode('utf-8'), stderr.decode('utf-8')
 
     @staticmethod
@@ -158,8 +211,11 @@ class Zipper(Migration):
         """
         cmd = [os.path.join(cfg.SEVEN_ZIP_PATH, '7z'), 'a', f'{folder}.7z', f'{folder}', f'-p{pwd}', '-mhe=on']
         process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        stdout, stderr = process.communicate()
+        with Watchdog(process=process, progress=lambda: os.path.getsize(f'{folder}.7z')) as watchdog:
+            stdout, stderr = process.communicate()
 
+        if watchdog.expired:
+            return stdout.decode('utf-8'), f'Zipping stopped by the watchdog: {watchdog.expired}', f'{folder}.7z'
         return stdout.decode('utf-8'), stderr.decode('utf-8'), f'{folder}.7z'
 
     def unpack_sfx_archive(self, destination: str, pwd: str):
@@ -1,17 +1,32 @@
 # REF: stefan.mastilak@visma.com
 
+import argparse
 import config as cfg
 import logging
 import os
 from mig.mlm_migration import MlmMigration
 from lib.base_migration import get_unprocessed_dirs
-from lib.slack_handler import SlackLogger
-from lib.credentials_handler import get_credentials
+from lib.slack_handler import SlackLogger, SlackNotifier
+from lib.credentials_handler import get_credentials, require_credentials
+from lib.history_handler import History, log_eta
 from lib.kpi_handler import Kpi
+from lib.log_handler import compact_log, set_log_context, setup_logging
+from lib.metrics_handler import MetricsWriter, inc
+from lib.profile_handler import enable_profiling
+from lib.scheduler_handler import run_customers
+from lib.timing_handler import log_timings_summary, reset_timings
+from lib.watchdog_handler import set_watchdog_context
+from lib.zip_handler import get_archives_size
 from datetime import datetime
 
 if __name__ == '__main__':
 
+    # Command line options:
+    parser = argparse.ArgumentParser(description='MLM migration robot')
+    parser.add_argument('--profile', action='store_true',
+                        help='capture cProfile and tracemalloc profiles per customer and migration stage')
+    args = parser.parse_args()
+
     # Enable/Disable features - for Testing purposes:
     slack_prod_logging = True  # True for '#ipa-mig-raet-reports', False for '#ipa-test-reports'
     sftp_prod = True  # True for uploading to 'robot_files' folder, False for 'robot_test_files' folder
@@ -19,10 +34,7 @@ if __name__ == '__main__':
 
     # Create robot logfile:
     mlm_logfile = os.path.join(cfg.ROOT_DIR, cfg.MLM_LOGFILE)
-    logging.basicConfig(filename=mlm_logfile,
-                        filemode='w',
-                        level=logging.INFO,
-                        force=True)
+    setup_logging(logfile=mlm_logfile, mig_type='MLM')  # non-blocking logging (lib/log_handler.py)
     logging.getLogger("paramiko").setLevel(logging.WARNING)
 
     # Robot start:
@@ -30,16 +42,33 @@ if __name__ == '__main__':
     start_time = datetime.now()
     logging.info(msg=f' Start: {start_time}')
 
+    # Start new stage timings file:
+    reset_timings(mig_type='MLM')
+
+    # Enable profiling if requested:
+    if args.profile:
+        enable_profiling(mig_type='MLM')
+
+    # Start periodic metrics snapshots (Prometheus textfile and JSON):
+    metrics = MetricsWriter(mig_type='MLM')
+    metrics.start()
+
     # Fetch Slack OAuth Token from LastPass:
     slack_item = cfg.SLACK_PROD_CREDS if slack_prod_logging else cfg.SLACK_TEST_CREDS
     slack_channel = cfg.SLACK_PROD_CHANNEL if slack_prod_logging else cfg.SLACK_TEST_CHANNEL
 
+    # Validate all needed credentials at robot start:
+    require_credentials(slack_item, cfg.SFTP_CREDS, cfg.GCP_SECRET)
+
     # Slack credentials:
     slack_creds = get_credentials(item=slack_item)
 
-    # Slack instance:
-    slack = SlackLogger(creds=slack_creds,
-                        channel=slack_channel)
+    # Slack instance (notifications are posted asynchronously by the background notifier):
+    slack = SlackNotifier(logger=SlackLogger(creds=slack_creds,
+                                             channel=slack_channel))
+
+    # KPI instance (one BigQuery client per run, TRANSACTION_ITEMS rows are inserted in batches):
+    kpi = Kpi()
 
     # Get unprocessed dirs:
     mlm_folders = get_unprocessed_dirs(mig_type='MLM')
@@ -51,11 +80,25 @@ if __name__ == '__main__':
         failed = []
         processed_with_missing_data = False
 
-        # Processing:
-        for mlm_folder in mlm_folders:
+        # Estimate migration durations from the migration history and order customers:
+        history = History()
+        archives = {folder: get_archives_size(customer_dir=folder, mig_type='MLM') for folder in mlm_folders}
+        mlm_folders, estimates, schedule_warning = history.plan(mig_type='MLM', archives=archives)
+        if schedule_warning:
+            slack.upload_message(msg=f'*MLM migration:* `{schedule_warning}`')
+
+        # Processing (customers are migrated by MIG_CUSTOMER_WORKERS workers - config.py):
+        def migrate_customer(index):
+            global processed_with_missing_data
+            mlm_folder = mlm_folders[index]
             mig_start_time = datetime.now()
             logging.info(msg=f' {cfg.DELIMITER}')
+            set_log_context(customer_dir=mlm_folder)
             logging.info(msg=f' Starting the migration for CustomerID: {mlm_folder}')
+            log_eta(estimates=estimates, customers=mlm_folders[index:])
+            # Subprocess timeouts of the customer stages (lib/watchdog_handler.py):
+            set_watchdog_context(estimates=history.predict(mig_type='MLM', archive_bytes=archives[mlm_folder]),
+                                 archive_bytes=archives[mlm_folder])
             current = MlmMigration(customer_dir=mlm_folder)
             try:
                 # Run migration process for current folder
@@ -73,7 +116,6 @@ if __name__ == '__main__':
 
                     # Log success migration to AutoMate KPI:
                     logging.info(msg=f' Logging successful migration of {mlm_folder} customer to the KPI framework')
-                    kpi = Kpi()
                     kpi.insert(start=mig_start_time,
                                end=mig_end_time,
                                inp='MLM',
@@ -85,6 +127,10 @@ if __name__ == '__main__':
                     # Log success migration to the monitoring table:
                     kpi.insert_to_monitoring(start=mig_start_time, status='GREEN')
 
+                    # Post customer result to Slack:
+                    if cfg.SLACK_CUSTOMER_UPDATES:
+                        slack.upload_message(msg=f'*MLM migration:* `{mlm_folder}: Success`')
+
                 else:
                     # CASE2: Process stopped due to expected error
                     current.rename_if_failed_migration()
@@ -93,7 +139,6 @@ if __name__ == '__main__':
 
                     # Log failed migration due to business exception to AutoMate KPI:
                     logging.info(msg=f' Logging failed migration of {mlm_folder} customer to the KPI framework')
-                    kpi = Kpi()
                     kpi.insert(start=mig_start_time,
                                end=mig_end_time,
                                inp='MLM',
@@ -105,6 +150,10 @@ if __name__ == '__main__':
                     # Log unsuccessful migration to the monitoring table:
                     kpi.insert_to_monitoring(start=mig_start_time, status='YELLOW')
 
+                    # Post customer result to Slack:
+                    if cfg.SLACK_CUSTOMER_UPDATES:
+                        slack.upload_message(msg=f'*MLM migration:* `{mlm_folder}: Failed`')
+
             # CASE3: Process stopped due to unexpected error
             except Exception as error:
                 current.rename_if_failed_migration()
@@ -114,7 +163,6 @@ if __name__ == '__main__':
 
                 # Log failed migration due to application exception to AutoMate KPI:
                 logging.info(msg=f' Logging failed migration of {mlm_folder} customer to the KPI framework')
-                kpi = Kpi()
                 kpi.insert(start=mig_start_time,
                            end=mig_end_time,
                            inp='MLM',
@@ -125,7 +173,30 @@ if __name__ == '__main__':
 
                 # Log failed migration to the monitoring table:
                 kpi.insert_to_monitoring(start=mig_start_time, status='RED')
-                continue
+
+                # Post customer result to Slack:
+                if cfg.SLACK_CUSTOMER_UPDATES:
+                    slack.upload_message(msg=f'*MLM migration:* `{mlm_folder}: Failed`')
+                return
+
+            finally:
+                # Store customer migration into the migration history:
+                history.record(timer=current.timer,
+                               outcome='success' if mlm_folder in processed else 'failed',
+                               start=mig_start_time,
+                               end=datetime.now(),
+                               archive_bytes=archives[mlm_folder])
+
+        run_customers(migrate=migrate_customer, customers=mlm_folders)
+
+        set_log_context(customer_dir=None)
+
+        # Count processed customers in run metrics:
+        inc('robot_customers_total', len(processed), result='success')
+        inc('robot_customers_total', len(failed), result='failed')
+
+        # Flush buffered KPI entries:
+        kpi.flush()
 
         # Robot end:
         end_time = datetime.now()
@@ -145,6 +216,13 @@ if __name__ == '__main__':
                          f'\n End: {end_time}' +
                          f'\n Duration: {duration}\n')
 
+        # Log stage timings summary:
+        log_timings_summary(mig_type='MLM')
+
+        # Write final metrics snapshot:
+        metrics.stop()
+        history.close()
+
         # Termination
         logging.info(msg=f' Terminating MLM migration robot')
 
@@ -161,8 +239,9 @@ if __name__ == '__main__':
                                      else f'\n`Missing documents: No`') +
                                  f'\n`Duration: {duration}`')
 
-        # Upload execution log file to the slack:
-        slack.upload_file(filepath=mlm_logfile)
+        # Upload compacted execution log file to the slack:
+        slack.upload_file(filepath=compact_log(logfile=mlm_logfile))
+        slack.close()
 
     else:
         # Robot end:
@@ -171,10 +250,12 @@ if __name__ == '__main__':
         logging.info(msg=f' Terminating MLM migration robot')
 
         # Log success robot run to the monitoring table:
-        kpi = Kpi()
         kpi.insert_to_monitoring(start=start_time, status='GREEN')
+        kpi.flush()
+        metrics.stop()
 
         # Log to Slack:
         slack.upload_message(msg=f'*MLM migration:*\n\n'
                                  f'`No unprocessed customer files found`\n'
                                  f'\n')
+        slack.close()
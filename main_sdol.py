@@ -1,17 +1,32 @@
 # REF: stefan.mastilak@visma.com
 
+import argparse
 import config as cfg
 import logging
 import os
 from mig.sdol_migration import SdolMigration
 from lib.base_migration import get_unprocessed_dirs
-from lib.slack_handler import SlackLogger
-from lib.credentials_handler import get_credentials
+from lib.slack_handler import SlackLogger, SlackNotifier
+from lib.credentials_handler import get_credentials, require_credentials
+from lib.history_handler import History, log_eta
 from lib.kpi_handler import Kpi
+from lib.log_handler import compact_log, set_log_context, setup_logging
+from lib.metrics_handler import MetricsWriter, inc
+from lib.profile_handler import enable_profiling
+from lib.scheduler_handler import run_customers
+from lib.timing_handler import log_timings_summary, reset_timings
+from lib.watchdog_handler import set_watchdog_context
+from lib.zip_handler import get_archives_size
 from datetime import datetime
 
 if __name__ == "__main__":
 
+    # Command line options:
+    parser = argparse.ArgumentParser(description='SDOL migration robot')
+    parser.add_argument('--profile', action='store_true',
+                        help='capture cProfile and tracemalloc profiles per customer and migration stage')
+    args = parser.parse_args()
+
     # Enable/Disable features - for Testing purposes:
     slack_prod_logging = True  # True for '#ipa-mig-raet-reports', False for '#ipa-test-reports'
     sftp_prod = True  # True for uploading to 'robot_files' folder, False for 'robot_test_files' folder
@@ -19,10 +34,7 @@ if __name__ == "__main__":
 
     # Create robot logfile:
     sdol_logfile = os.path.join(cfg.ROOT_DIR, cfg.SDOL_LOGFILE)
-    logging.basicConfig(filename=sdol_logfile,
-                        filemode='w',
-                        level=logging.INFO,
-                        force=True)
+    setup_logging(logfile=sdol_logfile, mig_type='SDOL')  # non-blocking logging (lib/log_handler.py)
     logging.getLogger("paramiko").setLevel(logging.WARNING)
 
     # Robot start:
@@ -30,16 +42,33 @@ if __name__ == "__main__":
     start_time = datetime.now()
     logging.info(msg=f' Start: {start_time}')
 
+    # Start new stage timings file:
+    reset_timings(mig_type='SDOL')
+
+    # Enable profiling if requested:
+    if args.profile:
+        enable_profiling(mig_type='SDOL')
+
+    # Start periodic metrics snapshots (Prometheus textfile and JSON):
+    metrics = MetricsWriter(mig_type='SDOL')
+    metrics.start()
+
     # Fetch Slack OAuth Token from LastPass:
     slack_item = cfg.SLACK_PROD_CREDS if slack_prod_logging else cfg.SLACK_TEST_CREDS
     slack_channel = cfg.SLACK_PROD_CHANNEL if slack_prod_logging else cfg.SLACK_TEST_CHANNEL
 
+    # Validate all needed credentials at robot start:
+    require_credentials(slack_item, cfg.SFTP_CREDS, cfg.GCP_SECRET)
+
     # Slack credentials:
     slack_creds = get_credentials(item=slack_item)
 
-    # Slack instance:
-    slack = SlackLogger(creds=slack_creds,
-                        channel=slack_channel)
+    # Slack instance (notifications are posted asynchronously by the background notifier):
+    slack = SlackNotifier(logger=SlackLogger(creds=slack_creds,
+                                             channel=slack_channel))
+
+    # KPI instance (one BigQuery client per run, TRANSACTION_ITEMS rows are inserted in batches):
+    kpi = Kpi()
 
     # Get unprocessed dirs:
     sdol_folders = get_unprocessed_dirs(mig_type='SDOL')
@@ -50,11 +79,24 @@ if __name__ == "__main__":
         processed = []
         failed = []
 
-        # Processing:
-        for sdol_folder in sdol_folders:
+        # Estimate migration durations from the migration history and order customers:
+        history = History()
+        archives = {folder: get_archives_size(customer_dir=folder, mig_type='SDOL') for folder in sdol_folders}
+        sdol_folders, estimates, schedule_warning = history.plan(mig_type='SDOL', archives=archives)
+        if schedule_warning:
+            slack.upload_message(msg=f'*SDOL migration:* `{schedule_warning}`')
+
+        # Processing (customers are migrated by MIG_CUSTOMER_WORKERS workers - config.py):
+        def migrate_customer(index):
+            sdol_folder = sdol_folders[index]
             mig_start_time = datetime.now()
             logging.info(msg=f' {cfg.DELIMITER}')
+            set_log_context(customer_dir=sdol_folder)
             logging.info(msg=f' Starting the migration for CustomerID: {sdol_folder}')
+            log_eta(estimates=estimates, customers=sdol_folders[index:])
+            # Subprocess timeouts of the customer stages (lib/watchdog_handler.py):
+            set_watchdog_context(estimates=history.predict(mig_type='SDOL', archive_bytes=archives[sdol_folder]),
+                                 archive_bytes=archives[sdol_folder])
             current = SdolMigration(customer_dir=sdol_folder)
             try:
                 # Run migration process for current folder
@@ -68,7 +110,6 @@ if __name__ == "__main__":
 
                     # Log success migration to AutoMate KPI:
                     logging.info(msg=f' Logging successful migration of {sdol_folder} customer to the KPI framework')
-                    kpi = Kpi()
                     kpi.insert(start=mig_start_time,
                                end=mig_end_time,
                                inp='SDOL',
@@ -80,6 +121,10 @@ if __name__ == "__main__":
                     # Log success migration to the monitoring table:
                     kpi.insert_to_monitoring(start=mig_start_time, status='GREEN')
 
+                    # Post customer result to Slack:
+                    if cfg.SLACK_CUSTOMER_UPDATES:
+                        slack.upload_message(msg=f'*SDOL migration:* `{sdol_folder}: Success`')
+
                 else:
                     # CASE2: Process stopped due to expected error
                     current.rename_if_failed_migration()
@@ -88,7 +133,6 @@ if __name__ == "__main__":
 
                     # Log failed migration due to business exception to AutoMate KPI:
                     logging.info(msg=f' Logging failed migration of {sdol_folder} customer to the KPI framework')
-                    kpi = Kpi()
                     kpi.insert(start=mig_start_time,
                                end=mig_end_time,
                                inp='SDOL',
@@ -100,6 +144,10 @@ if __name__ == "__main__":
                     # Log unsuccessful migration to the monitoring table:
                     kpi.insert_to_monitoring(start=mig_start_time, status='YELLOW')
 
+                    # Post customer result to Slack:
+                    if cfg.SLACK_CUSTOMER_UPDATES:
+                        slack.upload_message(msg=f'*SDOL migration:* `{sdol_folder}: Failed`')
+
             # CASE3: Process stopped due to unexpected error
             except Exception as error:
                 current.rename_if_failed_migration()
@@ -109,7 +157,6 @@ if __name__ == "__main__":
 
                 # Log failed migration due to application exception to AutoMate KPI:
                 logging.info(msg=f' Logging failed migration of {sdol_folder} customer to the KPI framework')
-                kpi = Kpi()
                 kpi.insert(start=mig_start_time,
                            end=mig_end_time,
                            inp='SDOL',
@@ -120,7 +167,30 @@ if __name__ == "__main__":
 
                 # Log failed migration to the monitoring table:
                 kpi.insert_to_monitoring(start=mig_start_time, status='RED')
-                continue
+
+                # Post customer result to Slack:
+                if cfg.SLACK_CUSTOMER_UPDATES:
+                    slack.upload_message(msg=f'*SDOL migration:* `{sdol_folder}: Failed`')
+                return
+
+            finally:
+                # Store customer migration into the migration history:
+                history.record(timer=current.timer,
+                               outcome='success' if sdol_folder in processed else 'failed',
+                               start=mig_start_time,
+                               end=datetime.now(),
+                               archive_bytes=archives[sdol_folder])
+
+        run_customers(migrate=migrate_customer, customers=sdol_folders)
+
+        set_log_context(customer_dir=None)
+
+        # Count processed customers in run metrics:
+        inc('robot_customers_total', len(processed), result='success')
+        inc('robot_customers_total', len(failed), result='failed')
+
+        # Flush buffered KPI entries:
+        kpi.flush()
 
         # Robot end:
         end_time = datetime.now()
@@ -140,6 +210,13 @@ if __name__ == "__main__":
                          f'\n End: {end_time}' +
                          f'\n Duration: {duration}\n')
 
+        # Log stage timings summary:
+        log_timings_summary(mig_type='SDOL')
+
+        # Write final metrics snapshot:
+        metrics.stop()
+        history.close()
+
         # Termination
         logging.info(msg=f' Terminating SDOL migration robot')
 
@@ -153,8 +230,9 @@ if __name__ == "__main__":
                                   else f'\n`Failed: None`') +
                                  f'\n`Duration: {duration}`')
 
-        # Upload execution log file to the slack:
-        slack.upload_file(filepath=sdol_logfile)
+        # Upload compacted execution log file to the slack:
+        slack.upload_file(filepath=compact_log(logfile=sdol_logfile))
+        slack.close()
 
     else:
         # Robot end:
@@ -163,10 +241,12 @@ if __name__ == "__main__":
         logging.info(msg=f' Terminating SDOL migration robot')
 
         # Log success robot run to the monitoring table:
-        kpi = Kpi()
         kpi.insert_to_monitoring(start=start_time, status='GREEN')
+        kpi.flush()
+        metrics.stop()
 
         # Log to Slack:
         slack.upload_message(msg=f'*SDOL migration:*\n\n'
                                  f'`No unprocessed customer files found`\n'
                                  f'\n')
+        slack.close()
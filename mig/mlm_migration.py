@@ -3,12 +3,13 @@
 from lib.base_migration import Migration
 from lib.base_checks import Checks
 from lib.base_actions import Actions
+from lib.cleanup_handler import remove_empty_tree
+from lib.move_handler import bulk_move
 from lib.zip_handler import Zipper
 from pathlib import Path
 import glob
 import logging
 import os
-import shutil
 
 
 class MlmMigration(Checks, Actions, Zipper, Migration):
@@ -23,6 +24,7 @@ class MlmMigration(Checks, Actions, Zipper, Migration):
         self.logs_dir = None
         self.docs_dir = None
         self.password = None
+        self.unpacked_files = []  # unpacked files moved from DOCS to the customer MLM folder
 
     def __find_bestanden(self):
         """
@@ -30,7 +32,7 @@ class MlmMigration(Checks, Actions, Zipper, Migration):
         :return: Bestanden folder path
         :rtype: str
         """
-        bestanden = glob.glob(os.path.join(self.docs_dir, '**\\Bestanden'), recursive=True)
+        bestanden = glob.glob(os.path.join(self.docs_dir, '**', 'Bestanden'), recursive=True)
         if bestanden:
             if len(bestanden) == 1:
                 matched_path = bestanden[0]
@@ -50,6 +52,7 @@ class MlmMigration(Checks, Actions, Zipper, Migration):
     def __move_unzipped_files(self):
         """
         Move everything on the Bestanden folder level to Customer MLM folder.
+        NOTE: Folders are renamed on the same volume, copied by the thread pool otherwise (lib/move_handler.py).
         :return True if all files moved correctly
         :rtype: bool
         """
@@ -57,46 +60,34 @@ class MlmMigration(Checks, Actions, Zipper, Migration):
         source = Path(bestanden_folder).parent
         destination = Path(self.docs_dir).parent
         files_to_move = os.listdir(source)
-        moved = 0
+        self.unpacked_files = [os.path.join(destination, file) for file in files_to_move]
 
-        for file in files_to_move:
-            try:
-                shutil.move(src=os.path.join(source, file), dst=os.path.join(destination, file))
-                moved += 1
-            except Exception as error:
-                logging.critical(msg=f' Error while moving file {file}. Error: {error}')
-                raise
-
-        if moved == len(files_to_move):
-            logging.info(msg=f' Checksum passed: All files successfully moved to the MLM folder')
-            return True
-        else:
-            logging.critical(msg=f' Moving process failed')
-            raise AssertionError(f' Moving process failed')
+        try:
+            files, size = bulk_move(moves=[(os.path.join(source, file), os.path.join(destination, file))
+                                           for file in files_to_move])
+        except Exception as error:
+            logging.critical(msg=f' Moving process failed. Error: {error}')
+            raise
+
+        logging.info(msg=f' Checksum passed: All files successfully moved to the MLM folder '
+                         f'({len(files_to_move)} items, {files} files, {size} bytes)')
+        return True
 
     def __remove_docs_folder(self):
         """
         Delete DOCS dir after all files are moved to the customer MLM folder.
+        NOTE: Empty folders are removed bottom-up in one pass, DOCS containing any file is not removed.
         :return True if DOCS successfully removed
         :rtype: bool
         """
         if os.path.isdir(self.docs_dir):
-            if not os.listdir(self.docs_dir):
-                # CASE 1: DOCS folder is empty
-                shutil.rmtree(self.docs_dir)
-                logging.info(msg=f' Empty DOCS folder removed')
-            else:
-                # CASE 2: DOCS folder is not empty
-                sub_dirs = [x[0] for x in os.walk(self.docs_dir)]
-                for d in reversed(sub_dirs):
-                    if not os.listdir(d):
-                        shutil.rmtree(d)
-                        root_path, dir_name = os.path.split(d)
-                        logging.info(f' Empty folder {dir_name} removed')
-                        return True
-                    else:
-                        logging.critical(msg=' DOCS folder is not empty - some files has not been moved')
-                        raise FileExistsError(' DOCS folder is not empty - some files has not been moved')
+            try:
+                removed = remove_empty_tree(self.docs_dir)
+            except FileExistsError as err:
+                logging.critical(msg=f' DOCS folder is not empty - some files has not been moved. Error: {err}')
+                raise FileExistsError(' DOCS folder is not empty - some files has not been moved')
+            logging.info(msg=f' Empty DOCS folder removed ({removed} folders)')
+            return True
         else:
             logging.critical(msg=f" DOCS folder doesn't exist in {self.docs_dir} folder")
             raise NotADirectoryError(f" DOCS folder doesn't exist in {self.docs_dir} folder")
@@ -130,44 +121,12 @@ class MlmMigration(Checks, Actions, Zipper, Migration):
         :rtype: bool
         """
         while True:
-            # check if Pentaho is installed in the provided path:
-            if not self.pentaho_check():
-                break
-
-            # check is MigVisma root folder exists:
-            if not self.mig_root_check():
-                break
-
-            # check if Kitchen.bat script exists in pentaho dir:
-            if not self.kitchen_check():
-                break
-
-            # check if customer folder path exists:
-            if not self.customer_dir_check():
-                break
-
-            # check if customer folder is not in reserved list:
-            if not self.not_reserved_check():
-                break
-
-            # check if properties file exists in customer folder:
-            if not self.props_check():
-                break
-
-            # check if parameters file exists in customer folder:
-            if not self.params_check():
-                break
-
-            # check if MLM folder exists in customer folder:
-            if not self.mig_type_dir_check():
-                break
-
-            # check if MLM_parameters.xlsx file exists in customer folder:
-            if not self.mig_params_xlsx_check():
+            # run pre-migration checks (config.properties file is mandatory for MLM):
+            if not self.timer.run('checks', self.run_checks, props_mandatory=True):
                 break
 
             # read password for zipped files:
-            self.password = self.get_password()
+            self.password = self.timer.run('get_password', self.get_password)
 
             # create DOCS folder if it doesn't already exist:
             self.docs_dir = self.create_docs_dir()
@@ -175,47 +134,60 @@ class MlmMigration(Checks, Actions, Zipper, Migration):
             # create migration log folder if it doesn't already exist:
             self.logs_dir = self.create_log_dir()
 
+            # check free disk space for unpacked files, e-dossiers and zipped e-dossiers:
+            if not self.timer.run('disk_admission', self.admit_disk_space, pwd=self.password):
+                break
+
             # unpack customer files:
-            if not self.unpack_split_archive(destination=self.docs_dir, pwd=self.password):
+            archives_size = self.get_archives_size()
+            if not self.timer.run('unpack', self.unpack_split_archive, destination=self.docs_dir, pwd=self.password,
+                                  measure=lambda _: (None, archives_size)):
                 break
 
             # move unzipped files to customer root folder:
-            if not self.__move_unzipped_files():
+            if not self.timer.run('move_unzipped', self.__move_unzipped_files):
                 break
 
             # delete empty DOCS folder after files are moved:
-            if not self.__remove_docs_folder():
+            if not self.timer.run('remove_docs', self.__remove_docs_folder):
                 break
 
             # run migration tool:
-            if not self.execute_migration_job():
+            if not self.timer.run('execute_migration_job', self.execute_migration_job):
                 break
 
             # get cmd file (there should always be only one for MLM):
-            cmd_file = self.get_cmd_file()
+            cmd_file = self.timer.run('cmd_parse', self.get_cmd_file)
 
             # execute cmd file:
-            if not self.execute_cmd_file(cmd_file=cmd_file):
+            if not self.timer.run('execute_cmd_file', self.execute_cmd_file, cmd_file=cmd_file,
+                                  measure=lambda _: (self.get_cmd_move_rows_count(cmd_file), None)):
                 break
 
             # checksum cmd move rows count vs e-dossier files count:
-            if not self.__checksum_cmd_vs_dossiers(cmd_file=cmd_file):
+            if not self.timer.run('checksum_cmd_vs_dossiers', self.__checksum_cmd_vs_dossiers, cmd_file=cmd_file):
                 break
 
             # rename dossier folder:
-            renamed = self.rename_dossier_folder(cmd_file=cmd_file)
+            renamed = self.timer.run('rename', self.rename_dossier_folder, cmd_file=cmd_file)
             if not renamed:
                 break
 
             # zip e-dossier folder:
-            zipped = self.zip_single_dossier(folder=renamed, pwd=self.password)
+            zipped = self.timer.run('zip', self.zip_single_dossier, folder=renamed, pwd=self.password,
+                                    measure=lambda result: (1, os.path.getsize(result)))
             if not zipped:
                 break
 
             # Upload zipped folder to sftp:
-            if not self.upload_single_dossier(file=zipped, sftp_prod=sftp_prod):
+            if not self.timer.run('upload', self.upload_single_dossier, file=zipped, sftp_prod=sftp_prod,
+                                  measure=lambda _: (1, os.path.getsize(zipped))):
                 break
 
+            # remove intermediate files after verified upload (retention policy - config.py CLEANUP_POLICY):
+            self.timer.run('cleanup', self.cleanup_after_upload, dossier=renamed, archive=zipped,
+                           unpacked=self.unpacked_files, measure=lambda result: result)
+
             # MLM migration succeeded:
             logging.info(msg=f' Migration for {self.customer_dir} finished successfully')
             return True
@@ -112,44 +112,12 @@ class PdolMigration(Checks, Actions, Zipper, Migration):
         :rtype: bool
         """
         while True:
-            # check if Pentaho is installed in the provided path:
-            if not self.pentaho_check():
-                break
-
-            # check is MigVisma folder exists:
-            if not self.mig_root_check():
-                break
-
-            # check if Kitchen.bat script exists in pentaho dir:
-            if not self.kitchen_check():
-                break
-
-            # check if customer folder path exists:
-            if not self.customer_dir_check():
-                break
-
-            # check if customer folder is not in reserved list:
-            if not self.not_reserved_check():
-                break
-
-            # check if properties file exists in customer folder:
-            if not self.props_check():
-                pass
-
-            # check if parameters file exists in customer folder:
-            if not self.params_check():
-                break
-
-            # check if PDOL folder exists in customer folder:
-            if not self.mig_type_dir_check():
-                break
-
-            # check if PDOL_parameters.xlsx file exists in customer folder:
-            if not self.mig_params_xlsx_check():
+            # run pre-migration checks:
+            if not self.timer.run('checks', self.run_checks):
                 break
 
             # read password for zipped files:
-            self.password = self.get_password()
+            self.password = self.timer.run('get_password', self.get_password)
 
             # create DOCS folder if it doesn't exist:
             self.docs_dir = self.create_docs_dir()
@@ -157,47 +125,60 @@ class PdolMigration(Checks, Actions, Zipper, Migration):
             # create migration log folder if it doesn't already exist:
             self.logs_dir = self.create_log_dir()
 
+            # check free disk space for unpacked files, e-dossiers and zipped e-dossiers:
+            if not self.timer.run('disk_admission', self.admit_disk_space, pwd=self.password):
+                break
+
             # unpack customer files:
-            if not self.unpack_sfx_archive(destination=self.docs_dir, pwd=self.password):
+            archives_size = self.get_archives_size()
+            if not self.timer.run('unpack', self.unpack_sfx_archive, destination=self.docs_dir, pwd=self.password,
+                                  measure=lambda _: (None, archives_size)):
                 break
 
             # move index.xml to the PDOL folder:
-            if not self.__move_index_file():
+            if not self.timer.run('move_index', self.__move_index_file):
                 break
 
             # run Migration:
-            if not self.execute_migration_job():
+            if not self.timer.run('execute_migration_job', self.execute_migration_job):
                 break
 
             # get cmd file (there should always be only one for PDOL):
-            cmd_file = self.get_cmd_file()
+            cmd_file = self.timer.run('cmd_parse', self.get_cmd_file)
 
             # checksum cmd move rows count vs docs files count:
-            if not self.__checksum_cmd_vs_docs(cmd_file=cmd_file):
+            if not self.timer.run('checksum_cmd_vs_docs', self.__checksum_cmd_vs_docs, cmd_file=cmd_file):
                 break
 
             # execute cmd file:
-            if not self.execute_cmd_file(cmd_file=cmd_file):
+            if not self.timer.run('execute_cmd_file', self.execute_cmd_file, cmd_file=cmd_file,
+                                  measure=lambda _: (self.get_cmd_move_rows_count(cmd_file), None)):
                 break
 
             # checksum cmd move rows count vs e-dossier files count:
-            if not self.__checksum_cmd_vs_dossiers(cmd_file=cmd_file):
+            if not self.timer.run('checksum_cmd_vs_dossiers', self.__checksum_cmd_vs_dossiers, cmd_file=cmd_file):
                 break
 
             # rename e-dossier folder:
-            renamed_dir = self.rename_dossier_folder(cmd_file=cmd_file)
+            renamed_dir = self.timer.run('rename', self.rename_dossier_folder, cmd_file=cmd_file)
             if not renamed_dir:
                 break
 
             # zip folder containing all e-dossiers:
-            zipped_folder = self.zip_single_dossier(folder=renamed_dir, pwd=self.password)
+            zipped_folder = self.timer.run('zip', self.zip_single_dossier, folder=renamed_dir, pwd=self.password,
+                                           measure=lambda result: (1, os.path.getsize(result)))
             if not zipped_folder:
                 break
 
             # Upload zipped folder to SFTP:
-            if not self.upload_single_dossier(file=zipped_folder, sftp_prod=sftp_prod):
+            if not self.timer.run('upload', self.upload_single_dossier, file=zipped_folder, sftp_prod=sftp_prod,
+                                  measure=lambda _: (1, os.path.getsize(zipped_folder))):
                 break
 
+            # remove intermediate files after verified upload (retention policy - config.py CLEANUP_POLICY):
+            self.timer.run('cleanup', self.cleanup_after_upload, dossier=renamed_dir, archive=zipped_folder,
+                           measure=lambda result: result)
+
             # PDOL migration succeeded:
             logging.info(msg=f' Migration for {self.customer_dir} finished successfully')
             return True
@@ -5,11 +5,11 @@ import config as cfg
 import glob
 import logging
 import os
-import shutil
 import zipfile
 from lib.base_migration import Migration
 from lib.base_checks import Checks
 from lib.base_actions import Actions
+from lib.move_handler import bulk_move
 from lib.zip_handler import Zipper
 
 
@@ -26,6 +26,8 @@ class SdolMigration(Checks, Actions, Zipper, Migration):
         self.docs_dir = None
         self.idx_dir = None
         self.password = None
+        self.index_files = None  # index.xml paths listed by unzipped DOCS archives
+        self.archive_dirs = set()  # folders the DOCS archives were unzipped to (covered by their listing)
 
     def __unzip_docs_files(self):
         """
@@ -40,10 +42,17 @@ class SdolMigration(Checks, Actions, Zipper, Migration):
 
             if zip_files:
                 logging.info(msg=f' Unzipping archives inside DOCS folder')
+                self.index_files = []
                 for file in zip_files:
                     root, ext = os.path.splitext(file)
                     with zipfile.ZipFile(file, "r") as zip_ref:
                         zip_ref.extractall(path=root)
+                        self.archive_dirs.add(os.path.normcase(os.path.normpath(root)))
+                        # archive listing is the index of extracted files (no need to search DOCS tree later),
+                        # names are compared case-insensitively like the Windows glob did (Index.xml, INDEX.XML):
+                        self.index_files.extend(os.path.normpath(os.path.join(root, name))
+                                                for name in zip_ref.namelist()
+                                                if name.rsplit('/', 1)[-1].lower() == 'index.xml')
 
                 logging.info(msg=f' All archives unzipped successfully')
                 return True
@@ -52,36 +61,45 @@ class SdolMigration(Checks, Actions, Zipper, Migration):
                 logging.critical(msg=f' No zip files found in {self.docs_dir} folder')
                 raise FileNotFoundError(f' No zip files found in {self.docs_dir} folder')
 
+    def __find_index_files(self):
+        """
+        Get index files of the customer (index.xml matched case-insensitively like the Windows glob did).
+        Index files of the unzipped DOCS archives are taken from their listing, the rest of DOCS tree (folders
+        which were not unzipped from the archives in this run) is searched.
+        :return: index file paths
+        :rtype: list
+        """
+        found = []
+        for root, dirs, files in os.walk(self.docs_dir):
+            dirs[:] = [i for i in dirs
+                       if os.path.normcase(os.path.normpath(os.path.join(root, i))) not in self.archive_dirs]
+            found.extend(os.path.join(root, name) for name in files if name.lower() == 'index.xml')
+        listed = [file for file in self.index_files or [] if os.path.isfile(file)]
+        return found + listed
+
     def __move_index_files(self):
         """
         Rename and move all index files from DOCS folder into the index folder.
+        Every index file is renamed directly to its target name '<folder>-index.xml' inside index folder
+        (one rename per file, executed by the thread pool - lib/move_handler.py). Target names are checked
+        for collisions before any file is moved.
         :return: True if all files moved
         :rtype: bool
         """
         if self.mig_type_dir_check():
-            index_files = glob.glob(os.path.join(self.docs_dir, '**', 'index.xml'), recursive=True)
+            index_files = self.__find_index_files()
 
             if index_files:
-                counter = 0
-                for file in index_files:
-                    root_path, file_name = os.path.split(file)
-                    new_file_name = os.path.join(root_path, f'{os.path.basename(os.path.dirname(file))}-index.xml')
-
-                    # rename index file:
-                    try:
-                        os.rename(src=file, dst=new_file_name)
-                    except Exception as err:
-                        logging.critical(f' Renaming process failed for {file}. Error: {err}')
-                        raise OSError(f' Renaming process failed for {file}')
-
-                    # move index file:
-                    try:
-                        shutil.move(src=new_file_name, dst=self.idx_dir)
-                    except Exception as err:
-                        logging.critical(f' Moving of {file} failed. Error: {err}')
-                        raise OSError(f' Moving of {file} failed')
-                    counter += 1
-
+                moves = [(file, os.path.join(self.idx_dir, f'{os.path.basename(os.path.dirname(file))}-index.xml'))
+                         for file in index_files]
+                try:
+                    # index files are counted by index vs zip checksum, no need to verify sizes:
+                    bulk_move(moves=moves, verify=False)
+                except Exception as err:
+                    logging.critical(f' Moving of index files failed. Error: {err}')
+                    raise OSError(f' Moving of index files failed')
+
+                counter = len(moves)
                 if counter != 1:
                     logging.info(f' {counter} index files renamed and moved to index folder')
                 else:
@@ -213,44 +231,12 @@ class SdolMigration(Checks, Actions, Zipper, Migration):
         :rtype: bool
         """
         while True:
-            # check if Pentaho is installed in the provided path:
-            if not self.pentaho_check():
-                break
-
-            # check is MigVisma root folder exists:
-            if not self.mig_root_check():
-                break
-
-            # check if Kitchen.bat script exists in pentaho dir:
-            if not self.kitchen_check():
-                break
-
-            # check if customer folder path exists:
-            if not self.customer_dir_check():
-                break
-
-            # check if customer folder is not in reserved list:
-            if not self.not_reserved_check():
-                break
-
-            # check if properties file exists in customer folder:
-            if not self.props_check():
-                pass
-
-            # check if parameters file exists in customer folder:
-            if not self.params_check():
-                break
-
-            # check if SDOL folder exists in customer folder:
-            if not self.mig_type_dir_check():
-                break
-
-            # check if SDOL_parameters.xlsx file exists in customer folder:
-            if not self.mig_params_xlsx_check():
+            # run pre-migration checks:
+            if not self.timer.run('checks', self.run_checks):
                 break
 
             # read password for zipped files:
-            self.password = self.get_password()
+            self.password = self.timer.run('get_password', self.get_password)
 
             # create DOCS folder if it doesn't already exist:
             self.docs_dir = self.create_docs_dir()
@@ -261,55 +247,71 @@ class SdolMigration(Checks, Actions, Zipper, Migration):
             # create migration log folder if it doesn't already exist:
             self.logs_dir = self.create_log_dir()
 
+            # check free disk space for unpacked files, e-dossiers and zipped e-dossiers:
+            if not self.timer.run('disk_admission', self.admit_disk_space, pwd=self.password):
+                break
+
             # unpack customer files to DOCS folder:
-            if not self.unpack_sfx_archive(destination=self.docs_dir, pwd=self.password):
+            archives_size = self.get_archives_size()
+            if not self.timer.run('unpack', self.unpack_sfx_archive, destination=self.docs_dir, pwd=self.password,
+                                  measure=lambda _: (None, archives_size)):
                 break
 
             # unzip files inside DOCS folder:
-            if not self.__unzip_docs_files():
+            if not self.timer.run('unzip_docs', self.__unzip_docs_files,
+                                  measure=lambda _: (self.__get_zip_files_count(), None)):
                 break
 
             # rename and move index files to index folder:
-            if not self.__move_index_files():
+            if not self.timer.run('move_index', self.__move_index_files,
+                                  measure=lambda _: (self.__get_index_files_count(), None)):
                 break
 
             # checksum - index files count vs zip files count in DOCS:
-            if not self.__checksum_index_vs_zip():
+            if not self.timer.run('checksum_index_vs_zip', self.__checksum_index_vs_zip):
                 break
 
             # run Migration:
-            if not self.execute_migration_job():
+            if not self.timer.run('execute_migration_job', self.execute_migration_job):
                 break
 
             # get cmd file (there should always be only one for SDOL):
-            cmd_file = self.get_cmd_file()
+            cmd_file = self.timer.run('cmd_parse', self.get_cmd_file)
 
             # checksum counters vs cmd file move rows:
-            if not self.__checksum_counters_vs_cmd(cmd_file=cmd_file):
+            if not self.timer.run('checksum_counters_vs_cmd', self.__checksum_counters_vs_cmd, cmd_file=cmd_file):
                 break
 
             # execute cmd file:
-            if not self.execute_cmd_file(cmd_file=cmd_file):
+            if not self.timer.run('execute_cmd_file', self.execute_cmd_file, cmd_file=cmd_file,
+                                  measure=lambda _: (self.get_cmd_move_rows_count(cmd_file), None)):
                 break
 
             # checksum counters vs e-dossier files:
-            if not self.__checksum_counters_vs_dossiers(cmd_file=cmd_file):
+            if not self.timer.run('checksum_counters_vs_dossiers', self.__checksum_counters_vs_dossiers,
+                                  cmd_file=cmd_file):
                 break
 
             # rename e-dossier folder:
-            renamed_dir = self.rename_dossier_folder(cmd_file=cmd_file)
+            renamed_dir = self.timer.run('rename', self.rename_dossier_folder, cmd_file=cmd_file)
             if not renamed_dir:
                 break
 
             # zip folder containing all e-dossiers:
-            zipped_folder = self.zip_single_dossier(folder=renamed_dir, pwd=self.password)
+            zipped_folder = self.timer.run('zip', self.zip_single_dossier, folder=renamed_dir, pwd=self.password,
+                                           measure=lambda result: (1, os.path.getsize(result)))
             if not zipped_folder:
                 break
 
             # Upload zipped folder to SFTP:
-            if not self.upload_single_dossier(file=zipped_folder, sftp_prod=sftp_prod):
+            if not self.timer.run('upload', self.upload_single_dossier, file=zipped_folder, sftp_prod=sftp_prod,
+                                  measure=lambda _: (1, os.path.getsize(zipped_folder))):
                 break
 
+            # remove intermediate files after verified upload (retention policy - config.py CLEANUP_POLICY):
+            self.timer.run('cleanup', self.cleanup_after_upload, dossier=renamed_dir, archive=zipped_folder,
+                           measure=lambda result: result)
+
             # SDOL migration succeeded:
             logging.info(msg=f' Migration for {self.customer_dir} finished successfully')
             return True
@@ -0,0 +1 @@
+# REF: stefan.mastilak@visma.com
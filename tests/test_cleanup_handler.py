@@ -0,0 +1,61 @@
+# REF: stefan.mastilak@visma.com
+
+import config as cfg
+import os
+import tempfile
+import unittest
+from unittest import mock
+from lib.cleanup_handler import cleanup, remove_empty_tree, remove_tree
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as file:
+        file.write(data)
+
+
+class CleanupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        self.docs = os.path.join(self.folder.name, 'DOCS')
+        self.index = os.path.join(self.folder.name, 'index.xml')
+        _write(os.path.join(self.docs, 'a.pdf'), 'aaaa')
+        _write(os.path.join(self.docs, 'sub', 'b.pdf'), 'bb')
+        _write(self.index, 'i')
+        patch = mock.patch.object(cfg, 'CLEANUP_POLICY', {'docs': True, 'index': True, 'dossier': False})
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_remove_tree(self):
+        self.assertEqual(remove_tree(self.docs, workers=2), (2, 6))
+        self.assertFalse(os.path.exists(self.docs))
+        self.assertEqual(remove_tree(self.index), (1, 1))
+
+    def test_remove_empty_tree(self):
+        with self.assertRaises(FileExistsError):
+            remove_empty_tree(self.docs)
+        empty = os.path.join(self.folder.name, 'empty', 'sub')
+        os.makedirs(empty)
+        self.assertEqual(remove_empty_tree(os.path.dirname(empty)), 2)
+
+    def test_cleanup_by_policy(self):
+        dossier = os.path.join(self.folder.name, 'dossier')
+        _write(os.path.join(dossier, 'c.pdf'), 'c')
+        self.assertEqual(cleanup({'docs': [self.docs, None], 'index': self.index, 'dossier': dossier,
+                                  'dossier_archive': os.path.join(self.folder.name, 'missing.7z')}), (3, 7))
+        self.assertFalse(os.path.exists(self.docs))
+        self.assertFalse(os.path.exists(self.index))
+        self.assertTrue(os.path.isdir(dossier))
+
+    def test_cleanup_never_raises(self):
+        errors = [ValueError('unexpected'), OSError('locked')]
+        with mock.patch('lib.cleanup_handler.remove_tree', side_effect=errors) as remove:
+            with self.assertLogs(level='WARNING'):
+                self.assertIsNone(cleanup({'docs': self.docs, 'index': self.index}))
+        self.assertEqual(remove.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+# REF: stefan.mastilak@visma.com
+
+import config as cfg
+import os
+import tempfile
+import threading
+import types
+import unittest
+from unittest import mock
+from lib.disk_handler import DiskAdmission, disk_footprint
+
+VOLUME = os.path.abspath(os.sep)
+
+
+def _need(size, device=1):
+    return {device: [VOLUME, size]}
+
+
+class DiskAdmissionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.free = 100
+        patches = [mock.patch('lib.disk_handler.shutil.disk_usage',
+                              side_effect=lambda volume: types.SimpleNamespace(free=self.free)),
+                   mock.patch.object(cfg, 'DISK_RESERVE_BYTES', 0),
+                   mock.patch.object(cfg, 'DISK_DEFER_POLL', 0.05),
+                   mock.patch.object(cfg, 'DISK_DEFER_TIMEOUT', 0)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.disk = DiskAdmission()
+
+    def test_admitted(self):
+        self.assertTrue(self.disk.admit('A', _need(60)))
+        self.assertEqual(self.disk.reserved, {'A': {1: [VOLUME, 60]}})
+
+    def test_reserve_bytes_kept(self):
+        with mock.patch.object(cfg, 'DISK_RESERVE_BYTES', 50):
+            self.assertFalse(self.disk.admit('A', _need(60)))
+
+    def test_rejected_without_other_reservations(self):
+        self.assertFalse(self.disk.admit('A', _need(101)))
+        self.assertEqual(self.disk.reserved, {})
+
+    def test_rejected_after_defer_timeout(self):
+        self.assertTrue(self.disk.admit('A', _need(60)))
+        self.assertFalse(self.disk.admit('B', _need(50)))
+
+    def test_deferred_until_release(self):
+        self.assertTrue(self.disk.admit('A', _need(60)))
+        threading.Timer(0.1, self.disk.release, args=('A',)).start()
+        with mock.patch.object(cfg, 'DISK_DEFER_TIMEOUT', 10):
+            self.assertTrue(self.disk.admit('B', _need(50)))
+        self.assertEqual(list(self.disk.reserved), ['B'])
+
+    def test_written_bytes_deducted_from_reservations(self):
+        self.assertTrue(self.disk.admit('A', _need(60)))
+        self.free = 50  # A has written 50 of its 60 bytes
+        self.assertTrue(self.disk.admit('B', _need(35)))
+        self.assertEqual(self.disk.reserved['A'][1][1], 10)
+        self.assertFalse(self.disk.admit('C', _need(10)))
+
+    def test_written_bytes_split_by_reservations_rest(self):
+        self.assertTrue(self.disk.admit('A', _need(30)))
+        self.assertTrue(self.disk.admit('B', _need(10)))
+        self.free = 80
+        self.assertTrue(self.disk.admit('C', _need(10)))
+        self.assertEqual((self.disk.reserved['A'][1][1], self.disk.reserved['B'][1][1]), (15, 5))
+
+    def test_need_not_shared_with_reservation(self):
+        need = _need(60)
+        self.assertTrue(self.disk.admit('A', need))
+        self.free = 50
+        self.disk.admit('B', _need(10))
+        self.assertEqual(need[1][1], 60)
+
+    def test_release(self):
+        self.assertTrue(self.disk.admit('A', _need(60)))
+        self.disk.release('A')
+        self.disk.release('A')
+        self.assertEqual((self.disk.reserved, self.disk.free), ({}, {}))
+
+
+class DiskFootprintTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        patches = [mock.patch.object(cfg, 'MIG_ROOT', self.folder.name),
+                   mock.patch.object(cfg, 'DISK_UNPACK_COPIES', {'SDOL': 2}),
+                   mock.patch.object(cfg, 'DISK_ARCHIVE_RATIO', 0.5),
+                   mock.patch('lib.disk_handler.archive_uncompressed_size', return_value=100)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.device = os.stat(self.folder.name).st_dev
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_same_volume(self):
+        need = disk_footprint(['a.exe'], mig_type='PDOL')
+        self.assertEqual(need, {self.device: [self.folder.name, 100 + 50]})
+
+    def test_unpack_copies(self):
+        need = disk_footprint(['a.zip', 'b.zip'], mig_type='SDOL',
+                              target_path=os.path.join(self.folder.name, 'C1', 'SDOL', 'Edossier'))
+        self.assertEqual(need, {self.device: [self.folder.name, 2 * 200 + 100]})
+
+    def test_headers_not_readable(self):
+        with open(os.path.join(self.folder.name, 'a.exe'), 'wb') as archive:
+            archive.write(b'0' * 100)
+        with mock.patch('lib.disk_handler.archive_uncompressed_size', return_value=None), \
+                mock.patch.object(cfg, 'DISK_UNPACK_RATIO', 2):
+            need = disk_footprint([os.path.join(self.folder.name, 'a.exe')], mig_type='MLM')
+        self.assertEqual(need[self.device][1], 200 + 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+# REF: stefan.mastilak@visma.com
+
+import config as cfg
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+from lib import kpi_handler
+from lib.health_handler import HealthWindow
+from lib.local_bigquery import LocalBigQueryClient
+from lib.spool_handler import Spool
+
+
+class HealthWindowTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, 'health.json')
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_health(self):
+        window = HealthWindow(path=self.path, size=3)
+        window.statuses = ['GREEN', 'RED', 'green']
+        self.assertEqual(window.health('GREEN'), 3)
+        self.assertEqual(window.health('YELLOW'), 2)
+
+    def test_record_keeps_window_size(self):
+        window = HealthWindow(path=self.path, size=3)
+        for status in ('GREEN', 'GREEN', 'RED', 'YELLOW'):
+            window.record(status)
+        self.assertEqual(window.statuses, ['YELLOW', 'RED', 'GREEN'])
+        self.assertEqual(window.recorded, 4)
+
+    def test_state_persisted(self):
+        window = HealthWindow(path=self.path, size=3)
+        window.reconcile(statuses=['GREEN', 'RED'])
+        window.record('YELLOW')
+        loaded = HealthWindow(path=self.path, size=3)
+        self.assertTrue(loaded.loaded)
+        self.assertEqual(loaded.statuses, ['YELLOW', 'GREEN', 'RED'])
+        self.assertFalse(loaded.needs_reconcile())
+
+    def test_needs_reconcile(self):
+        self.assertTrue(HealthWindow(path=self.path).needs_reconcile())
+        with open(self.path, 'w') as state_file:
+            json.dump({'statuses': ['GREEN'],
+                       'reconciled': (datetime.now() - timedelta(hours=cfg.HEALTH_RECONCILE_HOURS + 1)).isoformat()},
+                      state_file)
+        self.assertTrue(HealthWindow(path=self.path).needs_reconcile())
+
+    def test_corrupted_state_file(self):
+        with open(self.path, 'w') as state_file:
+            state_file.write('{not json')
+        with self.assertLogs(level='WARNING'):
+            window = HealthWindow(path=self.path)
+        self.assertFalse(window.loaded)
+        self.assertEqual(window.statuses, [])
+
+    def test_reconcile_keeps_statuses_recorded_during_query(self):
+        window = HealthWindow(path=self.path, size=4)
+        window.record('GREEN')
+        since = window.recorded
+        window.record('RED')  # recorded while the monitoring table was queried
+        window.reconcile(statuses=['YELLOW', 'GREEN', 'GREEN', 'GREEN'], since=since)
+        self.assertEqual(window.statuses, ['RED', 'YELLOW', 'GREEN', 'GREEN'])
+
+
+class MonitoringHealthTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        patches = [mock.patch.object(cfg, 'ROOT_DIR', self.folder.name),
+                   mock.patch.object(kpi_handler, '_RECONCILED', False)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.kpi = None
+
+    def tearDown(self):
+        self.kpi.flusher.stop()
+        self.kpi.flusher.join()
+        if self.kpi.reconciler:
+            self.kpi.reconciler.join()
+        self.kpi.spool.close()
+        self.folder.cleanup()
+
+    def start(self, latency):
+        client = LocalBigQueryClient(latency=latency)
+        # monitoring table rows (oldest first):
+        client.tables[cfg.TABLE_MONITORING] = [{'STATUS': 'RED'}, {'STATUS': 'GREEN'}, {'STATUS': 'GREEN'}]
+        self.kpi = kpi_handler.Kpi(client=client, spool=Spool(path=os.path.join(self.folder.name, 'spool.sqlite')))
+
+    def test_waits_for_reconciliation(self):
+        self.start(latency=0.2)
+        self.assertIsNotNone(self.kpi.reconciler)
+        row = self.kpi.insert_to_monitoring(start=datetime.now(), status='GREEN')
+        self.assertEqual(row['HEALTH'], 3)
+        self.assertEqual(self.kpi.health.statuses[:4], ['GREEN', 'GREEN', 'GREEN', 'RED'])
+
+    def test_reconciliation_wait_bounded(self):
+        with mock.patch.object(cfg, 'HEALTH_RECONCILE_TIMEOUT', 0.05):
+            self.start(latency=1.0)
+            with self.assertLogs(level='WARNING') as logs:
+                row = self.kpi.insert_to_monitoring(start=datetime.now(), status='GREEN')
+        self.assertEqual(row['HEALTH'], 1)
+        self.assertIn('Health reconciliation not finished', logs.output[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+# REF: stefan.mastilak@visma.com
+
+import config as cfg
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+from lib.history_handler import MIB, History, _fit, _solve, batch_duration
+from lib.timing_handler import StageRecord
+
+
+def _timer(customer_dir, walls, mig_type='PDOL'):
+    """Finished StageTimer stand-in with 'ok' records of the given {stage: wall} durations."""
+    records = []
+    for stage, wall in walls.items():
+        record = StageRecord(stage=stage, customer_dir=customer_dir, mig_type=mig_type)
+        record.wall = wall
+        records.append(record)
+    return mock.Mock(customer_dir=customer_dir, mig_type=mig_type, records=records)
+
+
+class SolveTest(unittest.TestCase):
+
+    def test_solves_system(self):
+        # 2x + y = 5, x + 3y = 10:
+        x, y = _solve([[2.0, 1.0], [1.0, 3.0]], [5.0, 10.0])
+        self.assertAlmostEqual(x, 1.0)
+        self.assertAlmostEqual(y, 3.0)
+
+    def test_pivots_zero_diagonal(self):
+        x, y = _solve([[0.0, 1.0], [1.0, 0.0]], [2.0, 3.0])
+        self.assertAlmostEqual(x, 3.0)
+        self.assertAlmostEqual(y, 2.0)
+
+    def test_singular_system(self):
+        self.assertIsNone(_solve([[1.0, 2.0], [2.0, 4.0]], [1.0, 2.0]))
+
+
+class FitTest(unittest.TestCase):
+
+    def test_recovers_linear_weights(self):
+        features = [(1.0, m, d) for m, d in ((1, 5), (2, 1), (3, 7), (4, 2), (5, 9))]
+        targets = [10 + 2 * m + 0.5 * d for _, m, d in features]
+        for weight, expected in zip(_fit(features, targets), (10, 2, 0.5)):
+            self.assertAlmostEqual(weight, expected, places=3)
+
+
+class BatchDurationTest(unittest.TestCase):
+
+    def test_first_free_worker(self):
+        # worker 1: 4 + 1, worker 2: 3 + 2
+        self.assertEqual(batch_duration([4, 3, 2, 1], workers=2), 5)
+
+    def test_single_worker_is_sum(self):
+        self.assertEqual(batch_duration([4, 3, 2, 1], workers=1), 10)
+
+    def test_more_workers_than_customers(self):
+        self.assertEqual(batch_duration([4, 3], workers=8), 4)
+
+    def test_empty_batch(self):
+        self.assertEqual(batch_duration([], workers=2), 0.0)
+
+
+class HistoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.history = History(path=os.path.join(self.folder.name, 'history.sqlite'))
+
+    def tearDown(self):
+        self.history.close()
+        self.folder.cleanup()
+
+    def record(self, customer_dir, mib, walls):
+        now = datetime.now()
+        self.history.record(_timer(customer_dir, walls), outcome='success', start=now, end=now,
+                            archive_bytes=int(mib * MIB))
+
+    def test_no_history(self):
+        self.assertEqual(self.history.predict('PDOL', archive_bytes=MIB), {})
+        self.assertIsNone(self.history.estimate('PDOL', archive_bytes=MIB))
+
+    def test_mean_with_too_few_samples(self):
+        for idx, wall in enumerate((1.0, 2.0, 6.0)):
+            self.record(f'C{idx}', mib=idx + 1, walls={'unpack': wall})
+        self.assertLess(3, cfg.HISTORY_MIN_SAMPLES)
+        self.assertAlmostEqual(self.history.predict('PDOL', archive_bytes=100 * MIB)['unpack'], 3.0)
+
+    def test_linear_fit_on_archive_size(self):
+        for mib in range(1, cfg.HISTORY_MIN_SAMPLES + 2):
+            self.record(f'C{mib}', mib=mib, walls={'unpack': 2 + 3 * mib, 'zip': 1 + mib})
+        prediction = self.history.predict('PDOL', archive_bytes=10 * MIB)
+        self.assertAlmostEqual(prediction['unpack'], 32, places=2)
+        self.assertAlmostEqual(prediction['zip'], 11, places=2)
+        self.assertAlmostEqual(self.history.estimate('PDOL', archive_bytes=10 * MIB), 43, places=2)
+
+    def test_other_migration_type_ignored(self):
+        self.record('C1', mib=1, walls={'unpack': 5.0})
+        self.assertEqual(self.history.predict('SDOL', archive_bytes=MIB), {})
+
+    def test_plan_shortest_first(self):
+        estimates = {'big': 300.0, 'unknown': None, 'small': 100.0, 'medium': 200.0}
+        with mock.patch.object(History, 'estimate', side_effect=lambda mig_type, archive_bytes: estimates[
+                               {1: 'big', 2: 'unknown', 3: 'small', 4: 'medium'}[archive_bytes]]), \
+                mock.patch.object(cfg, 'HISTORY_SHORTEST_FIRST', True), \
+                mock.patch('lib.history_handler.next_scheduled_run', return_value=None):
+            ordered, planned, warning = self.history.plan('PDOL', {'big': 1, 'unknown': 2, 'small': 3, 'medium': 4},
+                                                          workers=1)
+        self.assertEqual(ordered, ['small', 'medium', 'big', 'unknown'])
+        self.assertEqual(planned, estimates)
+        self.assertIsNone(warning)
+
+    def test_plan_keeps_order(self):
+        with mock.patch.object(History, 'estimate', side_effect=[300.0, 100.0]), \
+                mock.patch.object(cfg, 'HISTORY_SHORTEST_FIRST', False), \
+                mock.patch('lib.history_handler.next_scheduled_run', return_value=None):
+            ordered, _, _ = self.history.plan('PDOL', {'big': 1, 'small': 2}, workers=1)
+        self.assertEqual(ordered, ['big', 'small'])
+
+    def test_plan_warns_before_next_run(self):
+        next_run = datetime.now() + timedelta(hours=1)
+        with mock.patch.object(History, 'estimate', return_value=2000.0), \
+                mock.patch('lib.history_handler.next_scheduled_run', return_value=next_run):
+            _, _, sequential = self.history.plan('PDOL', {'a': 1, 'b': 2}, workers=1)
+            _, _, concurrent = self.history.plan('PDOL', {'a': 1, 'b': 2}, workers=2)
+        self.assertIn('PDOL batch is not expected to finish', sequential)
+        self.assertIsNone(concurrent)
+
+
+if __name__ == '__main__':
+    unittest.main()
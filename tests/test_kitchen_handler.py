@@ -0,0 +1,65 @@
+# REF: stefan.mastilak@visma.com
+
+import config as cfg
+import os
+import subprocess
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+from lib.kitchen_handler import _join_pumps, _pump
+from lib.miglog_handler import JobProcess, kill_process_tree
+
+# job process starting a child which keeps the output pipes open (like Kitchen JVM started by kitchen.sh):
+_ORPHAN = ('import subprocess, sys, time; '
+           'subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"]); '
+           'print("started", flush=True); time.sleep({parent})')
+
+
+def _job(parent):
+    return JobProcess([sys.executable, '-c', _ORPHAN.format(parent=parent)],
+                      stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+@unittest.skipIf(os.name == 'nt', 'process groups are killed outside Windows only')
+class KillProcessTreeTest(unittest.TestCase):
+
+    def test_children_killed(self):
+        process = _job(parent=30)
+        self.assertEqual(process.stdout.readline().strip(), b'started')
+        kill_process_tree(process)
+        start = time.monotonic()
+        self.assertEqual(process.stdout.read(), b'')  # EOF - no process holds the pipe anymore
+        self.assertLess(time.monotonic() - start, 5)
+        process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+    def test_finished_process(self):
+        process = JobProcess([sys.executable, '-c', 'pass'])
+        process.wait()
+        kill_process_tree(process)  # nothing to kill
+
+
+@unittest.skipIf(os.name == 'nt', 'process groups are killed outside Windows only')
+class JoinPumpsTest(unittest.TestCase):
+
+    def test_orphaned_children_killed(self):
+        stdout, stderr = [], []
+        process = _job(parent=0)
+        pumps = [threading.Thread(target=_pump, args=(process.stdout, stdout), daemon=True),
+                 threading.Thread(target=_pump, args=(process.stderr, stderr), daemon=True)]
+        for pump in pumps:
+            pump.start()
+        process.wait()
+        start = time.monotonic()
+        with mock.patch.object(cfg, 'KITCHEN_PUMP_TIMEOUT', 0.5), self.assertLogs(level='WARNING'):
+            _join_pumps(pumps, process)
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertFalse(any(pump.is_alive() for pump in pumps))
+        self.assertEqual(stdout, ['started'])
+
+
+if __name__ == '__main__':
+    unittest.main()
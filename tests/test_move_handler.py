@@ -0,0 +1,81 @@
+# REF: stefan.mastilak@visma.com
+
+import errno
+import os
+import tempfile
+import unittest
+from unittest import mock
+from lib.move_handler import bulk_move, check_collisions
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as file:
+        file.write(data)
+
+
+def _read(path):
+    with open(path) as file:
+        return file.read()
+
+
+class CheckCollisionsTest(unittest.TestCase):
+
+    def test_same_destination(self):
+        with self.assertRaises(FileExistsError):
+            check_collisions([('a', os.path.join('dst', 'x')), ('b', os.path.join('dst', '.', 'x'))])
+
+    def test_existing_destination_allowed(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            check_collisions([('a', tmp)])
+
+
+class BulkMoveTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.src = os.path.join(tmp.name, 'src')
+        self.dst = os.path.join(tmp.name, 'dst')
+        _write(os.path.join(self.src, 'a.txt'), 'aaa')
+        _write(os.path.join(self.src, 'folder', 'b.txt'), 'bb')
+        _write(os.path.join(self.src, 'folder', 'sub', 'c.txt'), 'c')
+        os.makedirs(self.dst)
+
+    def __moves(self):
+        return [(os.path.join(self.src, name), os.path.join(self.dst, name)) for name in ('a.txt', 'folder')]
+
+    def test_move(self):
+        self.assertEqual(bulk_move(self.__moves(), workers=2), (3, 6))
+        self.assertEqual(_read(os.path.join(self.dst, 'folder', 'sub', 'c.txt')), 'c')
+        self.assertEqual(os.listdir(self.src), [])
+
+    def test_rerun_overwrites_existing_destinations(self):
+        _write(os.path.join(self.dst, 'a.txt'), 'old')
+        _write(os.path.join(self.dst, 'folder', 'b.txt'), 'old')
+        _write(os.path.join(self.dst, 'folder', 'kept.txt'), 'kept')
+        self.assertEqual(bulk_move(self.__moves()), (3, 6))
+        self.assertEqual(_read(os.path.join(self.dst, 'a.txt')), 'aaa')
+        self.assertEqual(_read(os.path.join(self.dst, 'folder', 'b.txt')), 'bb')
+        self.assertEqual(_read(os.path.join(self.dst, 'folder', 'sub', 'c.txt')), 'c')
+        self.assertEqual(_read(os.path.join(self.dst, 'folder', 'kept.txt')), 'kept')
+        self.assertEqual(os.listdir(self.src), [])
+
+    def test_cross_volume_copy(self):
+        def rename(src, dst, folder, overwrite):
+            raise OSError(errno.EXDEV, 'Invalid cross-device link')
+
+        with mock.patch('lib.move_handler.rename_path', side_effect=rename):
+            self.assertEqual(bulk_move(self.__moves()), (3, 6))
+        self.assertEqual(_read(os.path.join(self.dst, 'folder', 'b.txt')), 'bb')
+        self.assertEqual(os.listdir(self.src), [])
+
+    def test_other_error_raised(self):
+        with mock.patch('lib.move_handler.rename_path', side_effect=PermissionError(errno.EACCES, 'Denied')):
+            with self.assertRaises(PermissionError):
+                bulk_move(self.__moves())
+        self.assertTrue(os.path.isfile(os.path.join(self.src, 'a.txt')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+# REF: stefan.mastilak@visma.com
+
+import openpyxl
+import os
+import tempfile
+import unittest
+from unittest import mock
+from lib import params_handler
+from lib.params_handler import _read_workbook, _unique_names, read_parameters
+
+
+def _workbook(path, rows):
+    workbook = openpyxl.Workbook()
+    for row in rows:
+        workbook.active.append(row)
+    workbook.save(path)
+
+
+class ReadWorkbookTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        self.path = os.path.join(self.folder.name, 'PDOL_parameters.xlsx')
+        patch = mock.patch.object(params_handler, '_CACHE', {})
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_columns(self):
+        _workbook(self.path, [('CustomerID', None, 'Note'), (1, 'x', None), (None, None, None), (2, None, 'n')])
+        self.assertEqual(_read_workbook(self.path), {'CustomerID': [1, 2], 'Unnamed: 1': ['x', None],
+                                                     'Note': [None, 'n']})
+
+    def test_duplicate_headers(self):
+        _workbook(self.path, [('Name', 'Name', 'Name.1', 'Name'), ('a', 'b', 'c', 'd')])
+        self.assertEqual(_read_workbook(self.path), {'Name': ['a'], 'Name.1': ['b'], 'Name.1.1': ['c'],
+                                                     'Name.2': ['d']})
+
+    def test_unique_names(self):
+        self.assertEqual(_unique_names(['a', 'b', 'a', 'a']), ['a', 'b', 'a.1', 'a.2'])
+        self.assertEqual(_unique_names(['a', 'a.1', 'a']), ['a', 'a.1', 'a.2'])
+
+    def test_parameters(self):
+        _workbook(self.path, [('Customer ID', 'TargetPath'),
+                              (' 1001 ', r'D:\MigVisma\1001'),
+                              (1002, None)])
+        params = read_parameters(self.path)
+        self.assertEqual(params.customer_ids, ['1001', '1002'])
+        self.assertEqual(params.customer_id, '1001')
+        self.assertEqual(params.target_path, r'D:\MigVisma\1001')
+        self.assertEqual(params.rows[1].values, {'Customer ID': 1002, 'TargetPath': None})
+        self.assertEqual(params.get('Missing'), [])
+
+    def test_cached_until_modified(self):
+        _workbook(self.path, [('CustomerID',), (1,)])
+        params = read_parameters(self.path)
+        self.assertIs(read_parameters(self.path), params)
+
+        _workbook(self.path, [('CustomerID',), (2,)])
+        mtime = os.path.getmtime(self.path) + 10
+        os.utime(self.path, (mtime, mtime))
+        self.assertEqual(read_parameters(self.path).customer_id, '2')
+
+
+if __name__ == '__main__':
+    unittest.main()
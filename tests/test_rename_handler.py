@@ -0,0 +1,91 @@
+# REF: stefan.mastilak@visma.com
+
+import config as cfg
+import errno
+import os
+import unittest
+from unittest import mock
+from lib.rename_handler import _inside, is_sharing_violation, rename_path
+
+
+def _busy():
+    return OSError(errno.EBUSY, 'Device or resource busy')
+
+
+class RenamePathTest(unittest.TestCase):
+
+    def setUp(self):
+        patches = [mock.patch.object(cfg, 'RENAME_RETRIES', 3),
+                   mock.patch.object(cfg, 'RENAME_BACKOFF_START', 0.1),
+                   mock.patch.object(cfg, 'RENAME_BACKOFF_MAX', 5)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.sleep = self.__patch('lib.rename_handler.time.sleep')
+        self.holders = self.__patch('lib.rename_handler.lock_holders', return_value=['explorer.exe (42)'])
+
+    def __patch(self, target, **kwargs):
+        patch = mock.patch(target, **kwargs)
+        self.addCleanup(patch.stop)
+        return patch.start()
+
+    def test_immediate_rename(self):
+        with mock.patch('lib.rename_handler.os.rename') as rename:
+            self.assertEqual(rename_path('src', 'dst'), 'dst')
+        rename.assert_called_once_with(src='src', dst='dst')
+        self.sleep.assert_not_called()
+
+    def test_overwrite_replaces(self):
+        with mock.patch('lib.rename_handler.os.replace') as replace:
+            self.assertEqual(rename_path('src', 'dst', overwrite=True), 'dst')
+        replace.assert_called_once_with(src='src', dst='dst')
+
+    def test_retries_while_locked(self):
+        with mock.patch('lib.rename_handler.os.rename', side_effect=[_busy(), _busy(), None]) as rename:
+            self.assertEqual(rename_path('src', 'dst'), 'dst')
+        self.assertEqual(rename.call_count, 3)
+        self.assertEqual([i.args[0] for i in self.sleep.call_args_list], [0.1, 0.2])
+        self.holders.assert_not_called()
+
+    def test_backoff_capped(self):
+        with mock.patch.object(cfg, 'RENAME_BACKOFF_MAX', 0.15), \
+                mock.patch('lib.rename_handler.os.rename', side_effect=[_busy(), _busy(), _busy(), None]):
+            rename_path('src', 'dst')
+        self.assertEqual([i.args[0] for i in self.sleep.call_args_list], [0.1, 0.15, 0.15])
+
+    def test_gives_up_with_lock_holders(self):
+        with mock.patch('lib.rename_handler.os.rename', side_effect=_busy()) as rename, \
+                self.assertLogs(level='WARNING') as logs:
+            with self.assertRaises(OSError):
+                rename_path('src', 'dst')
+        self.assertEqual(rename.call_count, 4)
+        self.assertEqual(self.sleep.call_count, 3)
+        self.holders.assert_called_once_with('src')
+        self.assertIn('explorer.exe (42)', logs.output[-1])
+
+    def test_other_errors_not_retried(self):
+        missing = FileNotFoundError(errno.ENOENT, 'No such file or directory')
+        with mock.patch('lib.rename_handler.os.rename', side_effect=missing) as rename:
+            with self.assertRaises(FileNotFoundError):
+                rename_path('src', 'dst')
+        rename.assert_called_once()
+        self.sleep.assert_not_called()
+        self.holders.assert_not_called()
+
+
+class HelpersTest(unittest.TestCase):
+
+    def test_sharing_violation(self):
+        self.assertTrue(is_sharing_violation(_busy()))
+        self.assertFalse(is_sharing_violation(OSError(errno.ENOENT, 'No such file or directory')))
+
+    def test_inside(self):
+        folder = os.path.join(os.sep, 'MigVisma', 'C1')
+        self.assertTrue(_inside(folder, folder))
+        self.assertTrue(_inside(os.path.join(folder, 'DOCS', 'a.pdf'), folder))
+        self.assertTrue(_inside(os.path.join(folder, 'a.pdf'), folder + os.sep))
+        self.assertFalse(_inside(folder + '_processed_robot', folder))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+# REF: stefan.mastilak@visma.com
+
+import config as cfg
+import os
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+from mig.sdol_migration import SdolMigration
+
+
+def _touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'w').close()
+
+
+class FindIndexFilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        patch = mock.patch.object(cfg, 'MIG_ROOT', self.folder.name)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.migration = SdolMigration(customer_dir='C1')
+        self.docs = os.path.join(self.folder.name, 'C1', 'SDOL', 'DOCS')
+        os.makedirs(self.docs)
+        self.migration.docs_dir = self.docs
+        with zipfile.ZipFile(os.path.join(self.docs, 'A.zip'), 'w') as archive:
+            archive.writestr('100/Index.xml', '<index/>')
+            archive.writestr('100/doc.pdf', '')
+            archive.writestr('200/INDEX.XML', '<index/>')
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def find(self):
+        return sorted(os.path.relpath(i, self.docs) for i in self.migration._SdolMigration__find_index_files())
+
+    def test_archive_listing_and_other_folders(self):
+        _touch(os.path.join(self.docs, 'index.xml'))
+        _touch(os.path.join(self.docs, 'manual', '300', 'index.xml'))
+        self.migration._SdolMigration__unzip_docs_files()
+        # stale file of the unzipped folder which is not in the archive listing:
+        _touch(os.path.join(self.docs, 'A', 'stale', 'index.xml'))
+        self.assertEqual(self.find(), sorted([
+            'index.xml',
+            os.path.join('manual', '300', 'index.xml'),
+            os.path.join('A', '100', 'Index.xml'),
+            os.path.join('A', '200', 'INDEX.XML')]))
+
+    def test_archives_not_unzipped_in_this_run(self):
+        _touch(os.path.join(self.docs, 'A', '100', 'Index.xml'))
+        _touch(os.path.join(self.docs, 'B', '200', 'index.xml'))
+        self.assertEqual(self.find(), [os.path.join('A', '100', 'Index.xml'), os.path.join('B', '200', 'index.xml')])
+
+    def test_other_files_ignored(self):
+        _touch(os.path.join(self.docs, 'manual', 'index.xml.bak'))
+        _touch(os.path.join(self.docs, 'manual', 'old-index.xml'))
+        self.assertEqual(self.find(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+# REF: stefan.mastilak@visma.com
+
+import config as cfg
+import os
+import tempfile
+import unittest
+from unittest import mock
+from lib.spool_handler import Spool, SpoolFlusher, rejected_rows
+
+TABLE = 'project.dataset.TRANSACTION_ITEMS'
+
+
+class FakeSink(object):
+    """BigQuery insert stand-in rejecting rows with 'bad' key (the other rows of the request are 'stopped')."""
+
+    def __init__(self, fail=None):
+        self.fail = fail
+        self.calls = []
+
+    def __call__(self, target, rows, row_ids):
+        self.calls.append((target, rows, row_ids))
+        if self.fail:
+            raise self.fail
+        if not any('bad' in row for row in rows):
+            return []
+        return [{'index': idx, 'errors': [{'reason': 'invalid' if 'bad' in row else 'stopped'}]}
+                for idx, row in enumerate(rows)]
+
+
+class RejectedRowsTest(unittest.TestCase):
+
+    def test_only_permanent_errors(self):
+        errors = [{'index': 0, 'errors': [{'reason': 'stopped'}]},
+                  {'index': 1, 'errors': [{'reason': 'invalid'}]},
+                  {'index': 2, 'errors': [{'reason': 'backendError'}]},
+                  'request timed out']
+        self.assertEqual(rejected_rows(errors), {1})
+
+    def test_no_errors(self):
+        self.assertEqual(rejected_rows([]), set())
+
+
+class SpoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.spool = Spool(path=os.path.join(self.folder.name, 'spool.sqlite'))
+
+    def tearDown(self):
+        self.spool.close()
+        self.folder.cleanup()
+
+    def test_take_in_order_with_stable_row_ids(self):
+        first = self.spool.put(TABLE, {'n': 1})
+        self.spool.put(TABLE, {'n': 2})
+        events = self.spool.take(limit=10)
+        self.assertEqual([(i[0], i[2]) for i in events], [(first, {'n': 1}), (first + 1, {'n': 2})])
+        self.assertEqual([i[3] for i in events], [i[3] for i in self.spool.take(limit=10)])
+        self.assertEqual(len({i[3] for i in events}), 2)
+
+    def test_ack_removes_events(self):
+        ids = [self.spool.put(TABLE, {'n': n}) for n in range(3)]
+        self.spool.ack(ids[:2])
+        self.assertEqual(self.spool.pending(), 1)
+
+    def test_nack_moves_event_to_dead_events(self):
+        _id = self.spool.put(TABLE, {'n': 1})
+        with mock.patch.object(cfg, 'SPOOL_MAX_ATTEMPTS', 2):
+            self.assertEqual(self.spool.nack([_id], error='invalid'), [])
+            self.assertEqual(self.spool.pending(), 1)
+            self.assertEqual(self.spool.nack([_id], error='invalid'), [_id])
+        self.assertEqual(self.spool.pending(), 0)
+        self.assertEqual(self.spool.dead(), 1)
+
+
+class ShipBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.spool = Spool(path=os.path.join(self.folder.name, 'spool.sqlite'))
+
+    def tearDown(self):
+        self.spool.close()
+        self.folder.cleanup()
+
+    def test_ships_batch(self):
+        for n in range(3):
+            self.spool.put(TABLE, {'n': n})
+        sink = FakeSink()
+        self.assertEqual(SpoolFlusher(self.spool, sink=sink).ship_batch(), 3)
+        self.assertEqual(self.spool.pending(), 0)
+        self.assertEqual(len(sink.calls), 1)
+
+    def test_rejected_row_split_from_batch(self):
+        self.spool.put(TABLE, {'n': 1})
+        self.spool.put(TABLE, {'bad': True})
+        self.spool.put(TABLE, {'n': 3})
+        sink = FakeSink()
+        self.assertEqual(SpoolFlusher(self.spool, sink=sink).ship_batch(), 3)
+        # the other rows are shipped again without the rejected one (with the same row ids):
+        self.assertEqual(sink.calls[1][1], [{'n': 1}, {'n': 3}])
+        self.assertEqual(sink.calls[1][2], [sink.calls[0][2][0], sink.calls[0][2][2]])
+        self.assertEqual([i[2] for i in self.spool.take(limit=10)], [{'bad': True}])
+
+    def test_rejected_row_dead_after_max_attempts(self):
+        self.spool.put(TABLE, {'bad': True})
+        flusher = SpoolFlusher(self.spool, sink=FakeSink())
+        with mock.patch.object(cfg, 'SPOOL_MAX_ATTEMPTS', 3):
+            for _ in range(3):
+                self.assertEqual(flusher.ship_batch(), 1)
+        self.assertEqual(self.spool.pending(), 0)
+        self.assertEqual(self.spool.dead(), 1)
+        self.assertEqual(flusher.ship_batch(), 0)
+
+    def test_failed_batch_stays_in_spool(self):
+        self.spool.put(TABLE, {'n': 1})
+        flusher = SpoolFlusher(self.spool, sink=FakeSink(fail=ConnectionError('BigQuery unavailable')))
+        self.assertIsNone(flusher.ship_batch())
+        self.assertEqual(self.spool.pending(), 1)
+        self.assertEqual(self.spool.dead(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+# REF: stefan.mastilak@visma.com
+
+import config as cfg
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+from lib.watchdog_handler import FolderProgress, Watchdog, set_watchdog_context, stage_timeout
+
+
+def _write(path, size):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'ab') as file:
+        file.write(b'0' * size)
+
+
+def _sleeper(seconds=30):
+    return subprocess.Popen([sys.executable, '-c', f'import time; time.sleep({seconds})'])
+
+
+class FolderProgressTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.root = self.folder.name
+        patch = mock.patch.object(cfg, 'WATCHDOG_RESCAN_INTERVAL', 3600)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.walk = mock.patch('lib.watchdog_handler.os.walk', wraps=os.walk)
+        self.walk_calls = self.walk.start()
+        self.addCleanup(self.walk.stop)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_empty_folder(self):
+        self.assertEqual(FolderProgress(self.root)(), (0, None, ()))
+
+    def test_newest_file(self):
+        _write(os.path.join(self.root, 'a', '1.pdf'), 10)
+        time.sleep(0.01)
+        _write(os.path.join(self.root, 'b', '2.pdf'), 20)
+        files, current, folders = FolderProgress(self.root)()
+        self.assertEqual((files, current), (2, (os.path.join(self.root, 'b', '2.pdf'), 20)))
+        self.assertEqual(len(folders), 2)
+
+    def test_growing_file_without_rescan(self):
+        path = os.path.join(self.root, 'a', '1.pdf')
+        _write(path, 10)
+        progress = FolderProgress(self.root)
+        first = progress()
+        _write(path, 10)
+        self.assertNotEqual(progress(), first)
+        self.assertEqual(self.walk_calls.call_count, 1)
+
+    def test_new_file_in_folder_without_rescan(self):
+        _write(os.path.join(self.root, 'a', '1.pdf'), 10)
+        progress = FolderProgress(self.root)
+        first = progress()
+        time.sleep(0.01)
+        _write(os.path.join(self.root, 'a', '2.pdf'), 10)
+        self.assertNotEqual(progress(), first)
+        self.assertEqual(self.walk_calls.call_count, 1)
+
+    def test_rescans_throttled(self):
+        _write(os.path.join(self.root, 'a', '1.pdf'), 10)
+        os.makedirs(os.path.join(self.root, 'b'))
+        progress = FolderProgress(self.root)
+        first = progress()
+        # file written outside the folders of the current file is found by the next rescan only:
+        _write(os.path.join(self.root, 'b', '2.pdf'), 10)
+        self.assertEqual(progress(), first)
+        self.assertEqual(self.walk_calls.call_count, 1)
+        with mock.patch.object(cfg, 'WATCHDOG_RESCAN_INTERVAL', 0):
+            files, current, _ = progress()
+        self.assertEqual((files, current[0]), (2, os.path.join(self.root, 'b', '2.pdf')))
+        self.assertEqual(self.walk_calls.call_count, 2)
+
+
+class WatchdogTest(unittest.TestCase):
+
+    def setUp(self):
+        patch = mock.patch.object(cfg, 'WATCHDOG_POLL_INTERVAL', 0.05)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.process = None
+
+    def tearDown(self):
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+
+    def test_timeout_kill(self):
+        self.process = _sleeper()
+        with Watchdog(process=self.process, timeout=0.2, stage='unpack') as watchdog:
+            self.process.wait(timeout=10)
+        self.assertEqual(watchdog.expired, 'unpack not finished in 0 seconds')
+
+    def test_stall_kill(self):
+        self.process = _sleeper()
+        with mock.patch.dict(cfg.WATCHDOG_STALL_TIMEOUTS, {'unpack': 0.2}):
+            with Watchdog(process=self.process, timeout=60, stage='unpack', progress=lambda: 1) as watchdog:
+                self.process.wait(timeout=10)
+        self.assertEqual(watchdog.expired, 'unpack no progress for 0 seconds')
+
+    def test_progress_prevents_stall_kill(self):
+        self.process = _sleeper(seconds=0.6)
+        ticks = iter(range(10 ** 6))
+        with mock.patch.dict(cfg.WATCHDOG_STALL_TIMEOUTS, {'unpack': 0.2}):
+            with Watchdog(process=self.process, timeout=60, stage='unpack', progress=lambda: next(ticks)) as watchdog:
+                self.process.wait(timeout=10)
+        self.assertIsNone(watchdog.expired)
+        self.assertEqual(self.process.returncode, 0)
+
+    def test_finished_process(self):
+        self.process = _sleeper(seconds=0)
+        self.process.wait()
+        with Watchdog(process=self.process, timeout=0.01, stage='unpack') as watchdog:
+            time.sleep(0.2)
+        self.assertIsNone(watchdog.expired)
+
+
+class StageTimeoutTest(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(set_watchdog_context)
+
+    def test_from_estimate(self):
+        set_watchdog_context(estimates={'unpack': 1000}, archive_bytes=1)
+        self.assertEqual(stage_timeout('unpack'), min(max(1000 * cfg.WATCHDOG_TIMEOUT_FACTOR,
+                                                          cfg.WATCHDOG_MIN_TIMEOUT), cfg.WATCHDOG_MAX_TIMEOUT))
+
+    def test_from_archive_size(self):
+        set_watchdog_context(archive_bytes=cfg.WATCHDOG_MIN_THROUGHPUT * (cfg.WATCHDOG_MIN_TIMEOUT + 100))
+        self.assertEqual(stage_timeout('unpack'), cfg.WATCHDOG_MIN_TIMEOUT + 100)
+
+    def test_bounds(self):
+        set_watchdog_context(estimates={'unpack': 0.001, 'zip': 10 ** 9})
+        self.assertEqual(stage_timeout('unpack'), cfg.WATCHDOG_MIN_TIMEOUT)
+        self.assertEqual(stage_timeout('zip'), cfg.WATCHDOG_MAX_TIMEOUT)
+        self.assertEqual(stage_timeout('upload'), cfg.WATCHDOG_MAX_TIMEOUT)
+
+
+if __name__ == '__main__':
+    unittest.main()